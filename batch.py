@@ -0,0 +1,180 @@
+"""
+Headless batch runner for ELS JUDGE.
+
+Reads submissions (one JSON object per line with `target_files` and `prompt`),
+runs them through the dispatcher with bounded concurrency and streams one
+FinalVerdictResponse per line to the output file as tasks complete.
+
+Progress is tracked in `<output>.progress`, so re-running the same command
+after a crash only processes the submissions that have not finished yet.
+Submissions that were running resume their task (same task_id) from its last
+completed stage, reusing the model responses it already received.
+
+    python batch.py submissions.jsonl -o results.jsonl -j 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from core.persistence import persistence_queue
+from core.retention import retention
+from engine.dispatcher import new_task_id, process_submission
+from schemas.api import SubmissionRequest, FinalVerdictResponse, verdict_from_result
+
+logger = logging.getLogger("llm_consensus_engine.batch")
+
+
+def _line_digest(line: str) -> str:
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+
+def load_progress(progress_path: str) -> Tuple[Dict[int, str], Dict[int, Tuple[str, str]]]:
+    """
+    Return {line_number: line_digest} for every submission already finished,
+    and {line_number: (line_digest, task_id)} for those started but not finished.
+    """
+    done = {}
+    started = {}
+    if not os.path.exists(progress_path):
+        return done, started
+    with open(progress_path, "r", encoding="utf-8") as f:
+        for raw in f:
+            try:
+                entry = json.loads(raw)
+            except json.JSONDecodeError:
+                # A crash can leave a partially written last line
+                continue
+            if entry["status"] == "started":
+                started[entry["line"]] = (entry["digest"], entry["task_id"])
+            else:
+                done[entry["line"]] = entry["digest"]
+    return done, started
+
+
+def read_pending(input_path: str, done: Dict[int, str]) -> List[Tuple[int, str]]:
+    """Return (line_number, line) pairs that still have to be processed."""
+    pending = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, raw in enumerate(f, start=1):
+            line = raw.strip()
+            if not line:
+                continue
+            if done.get(line_no) == _line_digest(line):
+                continue
+            pending.append((line_no, line))
+    return pending
+
+
+class BatchRunner:
+    def __init__(self, output_path: str, progress_path: str, concurrency: int, started: Dict[int, Tuple[str, str]] = None):
+        self.output_path = output_path
+        self.progress_path = progress_path
+        self.concurrency = max(1, concurrency)
+        self.started = started or {}
+        self._write_lock = asyncio.Lock()
+        self.succeeded = 0
+        self.failed = 0
+
+    async def _record(self, line_no: int, line: str, status: str, verdict: FinalVerdictResponse = None, task_id: str = None):
+        # Output first, progress second: a crash in between re-runs the submission
+        # instead of silently losing it.
+        async with self._write_lock:
+            if verdict is not None:
+                with open(self.output_path, "a", encoding="utf-8") as out:
+                    out.write(verdict.model_dump_json() + "\n")
+                    out.flush()
+            with open(self.progress_path, "a", encoding="utf-8") as progress:
+                progress.write(json.dumps({
+                    "line": line_no,
+                    "digest": _line_digest(line),
+                    "status": status,
+                    "task_id": verdict.task_id if verdict else task_id,
+                }) + "\n")
+                progress.flush()
+                os.fsync(progress.fileno())
+
+    async def _run_one(self, line_no: int, line: str):
+        try:
+            request = SubmissionRequest.model_validate_json(line)
+        except ValidationError as e:
+            logger.error(f"Line {line_no}: invalid submission: {e}")
+            self.failed += 1
+            # Invalid input will not become valid on retry, so mark it as handled
+            await self._record(line_no, line, "invalid")
+            return
+
+        # A submission interrupted by a crash resumes its task
+        digest, task_id = self.started.get(line_no, (None, None))
+        if task_id is None or digest != _line_digest(line):
+            task_id = new_task_id()
+            await self._record(line_no, line, "started", task_id=task_id)
+        else:
+            print(f"[BATCH] line {line_no} resuming task {task_id}")
+
+        try:
+            result = await process_submission(request.target_files, request.prompt, task_id=task_id)
+        except Exception as e:
+            logger.error(f"Line {line_no}: submission failed: {type(e).__name__}: {e}")
+            self.failed += 1
+            return
+
+        verdict = verdict_from_result(result)
+        await self._record(line_no, line, "done", verdict)
+        self.succeeded += 1
+        print(f"[BATCH] line {line_no} -> task {verdict.task_id}")
+
+    async def run(self, pending: List[Tuple[int, str]]):
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    line_no, line = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._run_one(line_no, line)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)) or 1)))
+        await persistence_queue.close()
+        await retention.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run ELS JUDGE submissions from a JSONL file without the TUI.")
+    parser.add_argument("input", help="JSONL file with one {\"target_files\": [...], \"prompt\": \"...\"} per line")
+    parser.add_argument("-o", "--output", help="JSONL file for FinalVerdictResponse records (default: <input>.results.jsonl)")
+    parser.add_argument("-j", "--concurrency", type=int, default=2, help="Number of submissions processed at the same time")
+    parser.add_argument("--fresh", action="store_true", help="Ignore previous progress and start over")
+    args = parser.parse_args(argv)
+
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    progress_path = f"{output_path}.progress"
+
+    if args.fresh:
+        for path in (output_path, progress_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    done, started = load_progress(progress_path)
+    pending = read_pending(args.input, done)
+    print(f"[BATCH] {len(pending)} submission(s) to run, {len(done)} already finished")
+    if not pending:
+        return 0
+
+    runner = BatchRunner(output_path, progress_path, args.concurrency, started)
+    asyncio.run(runner.run(pending))
+    print(f"[BATCH] {runner.succeeded} succeeded, {runner.failed} failed -> {output_path}")
+    return 0 if runner.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the dispatcher.
+
+Runs process_submission against synthetic git repositories with a local stub
+LLM backend (or replayed recordings of real responses), so throughput and
+latency can be measured without API keys. See `python -m bench --help`.
+"""
@@ -0,0 +1,204 @@
+"""
+Offline benchmark harness.
+
+    python -m bench                                # every scenario, stub backend
+    python -m bench -s single_task -s many_models --latency 0.5
+    python -m bench --quick -o bench.json --baseline previous.json
+
+Each scenario builds a synthetic repository, runs process_submission in a
+fresh subprocess against a stub (or replayed) LLM backend and collects
+latency, throughput and per-stage timings. Reports are JSON so two runs can
+be compared; with --baseline the exit code is 1 when a metric regressed by
+more than --max-regression.
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from bench.scenarios import BASE_ENV, QUICK_OVERRIDES, SCENARIOS
+from bench.synthetic_repo import make_synthetic_repo
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics compared against a baseline, and whether lower values are better
+COMPARED_METRICS = {
+    "latency_p50": True,
+    "latency_p95": True,
+    "wall_seconds": True,
+    "import_seconds": True,
+    "throughput_tps": False,
+}
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PACKAGE_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scenario(name: str, scenario: Dict[str, Any], backend: Dict[str, Any], workdir: str, verbose: bool) -> Dict[str, Any]:
+    repo_path = os.path.join(workdir, name, "repo")
+    files = make_synthetic_repo(repo_path, seed=0, **scenario["repo"])
+
+    spec = dict(scenario, files=files, backend=backend, seed=0)
+    spec_path = os.path.join(workdir, name, "spec.json")
+    result_path = os.path.join(workdir, name, "result.json")
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+
+    env = dict(os.environ)
+    env.update(BASE_ENV)
+    env.update(scenario.get("env", {}))
+    env["JUDGE_MODELS"] = json.dumps(scenario["models"])
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, name, 'bench.db')}"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_ROOT, env.get("PYTHONPATH")]))
+
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench.worker", spec_path, result_path],
+        cwd=repo_path,
+        env=env,
+        stdout=None if verbose else subprocess.PIPE,
+        stderr=None if verbose else subprocess.STDOUT,
+        text=True,
+    )
+    if proc.returncode != 0:
+        output = proc.stdout or ""
+        raise RuntimeError(f"Scenario {name} failed (exit {proc.returncode}):\n{output[-4000:]}")
+
+    with open(result_path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    result["config"] = {
+        "repo": scenario["repo"],
+        "models": len(scenario["models"]),
+        "tasks": scenario["tasks"],
+        "concurrency": scenario["concurrency"],
+        "files_per_task": scenario["files_per_task"],
+        "env": scenario.get("env", {}),
+    }
+    return result
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[Tuple[str, str, float, float, float]]:
+    """Return (scenario, metric, baseline, current, relative change) for every regression."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, lower_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change if lower_is_better else -change
+            if worse > max_regression:
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Benchmark {report['meta']['timestamp']} (rev {report['meta']['revision']}, backend {report['meta']['backend']['kind']})",
+        "",
+        f"{'scenario':<24}{'tasks':>6}{'err':>5}{'p50 s':>9}{'p95 s':>9}{'tasks/s':>9}{'import s':>10}{'rss MB':>9}",
+    ]
+    for name, r in report["scenarios"].items():
+        lines.append(
+            f"{name:<24}{r['tasks']:>6}{r['errors']:>5}{r['latency_p50']:>9.3f}{r['latency_p95']:>9.3f}"
+            f"{r['throughput_tps']:>9.2f}{r['import_seconds']:>10.3f}{r['peak_rss_mb']:>9.1f}"
+        )
+    for name, r in report["scenarios"].items():
+        top = sorted(r["stages"].items(), key=lambda item: item[1], reverse=True)[:6]
+        lines.append(f"  {name}: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in top))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ELS JUDGE benchmarks")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--quick", action="store_true", help="Smaller repositories and fewer tasks")
+    parser.add_argument("--backend", choices=["stub", "record", "replay"], default="stub")
+    parser.add_argument("--recording", help="Recording file for --backend record/replay")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random stub latency, up to this many seconds")
+    parser.add_argument("--output-lines", type=int, default=20, help="Lines the stub adds to every file")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of stub calls that fail")
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative slowdown before failing (default 0.2)")
+    parser.add_argument("--workdir", help="Where to build the synthetic repositories (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic repositories")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show engine output")
+    args = parser.parse_args()
+
+    if args.backend != "stub" and not args.recording:
+        parser.error("--recording is required with --backend record/replay")
+
+    backend = {"kind": args.backend}
+    if args.backend == "stub":
+        backend.update(latency=args.latency, jitter=args.jitter, output_lines=args.output_lines, failure_rate=args.failure_rate)
+    else:
+        backend["path"] = os.path.abspath(args.recording)
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="els-bench-")
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "backend": backend,
+        },
+        "scenarios": {},
+    }
+
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            scenario = SCENARIOS[name]
+            if args.quick and name in QUICK_OVERRIDES:
+                scenario = _merge(scenario, QUICK_OVERRIDES[name])
+            print(f"[BENCH] {name}...", flush=True)
+            report["scenarios"][name] = run_scenario(name, scenario, backend, workdir, args.verbose)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        for name, metric, old, new, change in regressions:
+            print(f"[BENCH] REGRESSION {name}.{metric}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"[BENCH] No regressions above {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
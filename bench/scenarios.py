@@ -0,0 +1,71 @@
+"""
+Benchmark scenarios.
+
+Each scenario describes a synthetic repository, the models to judge with,
+how many tasks to run and how many run at once, plus any settings overrides.
+"""
+from typing import Any, Dict
+
+DEFAULT_MODELS = ["stub/alpha", "stub/beta"]
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    # One task at a time: end-to-end latency of a single judgement
+    "single_task": {
+        "repo": {"n_files": 20, "file_lines": 200, "history_depth": 10},
+        "models": DEFAULT_MODELS,
+        "tasks": 5,
+        "concurrency": 1,
+        "files_per_task": 3,
+    },
+    # Same, without worktrees
+    "single_task_in_memory": {
+        "repo": {"n_files": 20, "file_lines": 200, "history_depth": 10},
+        "models": DEFAULT_MODELS,
+        "tasks": 5,
+        "concurrency": 1,
+        "files_per_task": 3,
+        "env": {"EVALUATION_MODE": "in_memory"},
+    },
+    # Many submissions in flight, as in batch.py
+    "batch_throughput": {
+        "repo": {"n_files": 50, "file_lines": 300, "history_depth": 20},
+        "models": DEFAULT_MODELS,
+        "tasks": 24,
+        "concurrency": 6,
+        "files_per_task": 2,
+    },
+    # Wide fan-out: every task goes to eight models
+    "many_models": {
+        "repo": {"n_files": 20, "file_lines": 200, "history_depth": 10},
+        "models": [f"stub/model-{i}" for i in range(8)],
+        "tasks": 3,
+        "concurrency": 1,
+        "files_per_task": 2,
+    },
+    # Big files and deep history
+    "large_repo": {
+        "repo": {"n_files": 300, "file_lines": 2000, "history_depth": 60},
+        "models": DEFAULT_MODELS,
+        "tasks": 3,
+        "concurrency": 1,
+        "files_per_task": 4,
+    },
+}
+
+# Smaller variants for a quick smoke run (--quick)
+QUICK_OVERRIDES: Dict[str, Dict[str, Any]] = {
+    "batch_throughput": {"tasks": 8, "concurrency": 4},
+    "large_repo": {"repo": {"n_files": 60, "file_lines": 1000, "history_depth": 20}, "tasks": 2},
+}
+
+# Settings applied to every scenario: stub providers are not rate limited and
+# results are neither cached nor persisted between runs
+BASE_ENV = {
+    "LLM_CACHE_ENABLED": "false",
+    "PERSIST_RESULTS": "false",
+    "PROVIDER_RATE_LIMITS": '{"stub": 0}',
+    "PROVIDER_MAX_CONCURRENCY": '{"stub": 64}',
+    "LLM_HEDGE_ENABLED": "false",
+    "TELEMETRY_ENABLED": "true",
+    "RETENTION_ENABLED": "false",
+}
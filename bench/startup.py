@@ -0,0 +1,97 @@
+"""
+Cold-start budget check.
+
+Imports each entry point in a fresh interpreter several times and fails
+(exit code 1) when the median import time exceeds its budget, or when a
+module that must stay lazy (litellm, SQLAlchemy) is imported eagerly.
+
+    python -m bench.startup
+    python -m bench.startup --budget cli=0.5 --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> (default budget in seconds, modules it must not import eagerly)
+ENTRY_POINTS: Dict[str, Tuple[float, List[str]]] = {
+    "cli": (1.0, ["litellm", "sqlalchemy", "engine.dispatcher"]),
+    "engine.dispatcher": (1.5, ["litellm"]),
+    "batch": (1.5, ["litellm"]),
+}
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str, runs: int) -> Tuple[float, List[str]]:
+    """Median import time of `module` over `runs` fresh interpreters, and the modules it loaded."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_ROOT, env.get("PYTHONPATH")]))
+    # Bytecode caches are warm after the first run; measure import work, not compilation
+    timings = []
+    loaded: List[str] = []
+    for _ in range(runs + 1):
+        proc = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module)],
+            cwd=PACKAGE_ROOT, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["modules"]
+    return statistics.median(timings[1:]), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when cold start exceeds its import-time budget")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point (median is used)")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=SECONDS", help="Override a budget, e.g. cli=0.5")
+    parser.add_argument("-o", "--output", help="Write the measurements as JSON")
+    args = parser.parse_args()
+
+    budgets = {module: budget for module, (budget, _) in ENTRY_POINTS.items()}
+    for item in args.budget:
+        module, _, seconds = item.partition("=")
+        if module not in ENTRY_POINTS or not seconds:
+            parser.error(f"--budget expects one of {', '.join(ENTRY_POINTS)}=SECONDS, got {item!r}")
+        budgets[module] = float(seconds)
+
+    failures = []
+    results = {}
+    for module, (_, forbidden) in ENTRY_POINTS.items():
+        seconds, loaded = measure(module, args.runs)
+        eager = [name for name in forbidden if name in loaded]
+        results[module] = {"seconds": seconds, "budget": budgets[module], "eager_imports": eager}
+        status = "ok"
+        if seconds > budgets[module]:
+            status = "OVER BUDGET"
+            failures.append(f"import {module} took {seconds:.3f}s (budget {budgets[module]:.3f}s)")
+        if eager:
+            status = "EAGER IMPORT"
+            failures.append(f"import {module} eagerly loads {', '.join(eager)}")
+        print(f"{module:<20} {seconds:7.3f}s  budget {budgets[module]:.3f}s  {status}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        for failure in failures:
+            print(f"[STARTUP] {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Completion backends that stand in for litellm.acompletion.
+
+StubBackend answers locally with configurable latency, output size and
+failure rate. RecordingBackend wraps a real backend and saves every
+response, and ReplayBackend plays those recordings back.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+_FILE_HEADER_RE = re.compile(r"^--- (.+) ---$", re.MULTILINE)
+
+# Characters per streamed chunk, roughly one token
+STREAM_CHUNK_CHARS = 4
+
+# Shortest sleep issued while streaming
+MIN_SLEEP_SECONDS = 0.005
+
+
+class ServiceUnavailableError(Exception):
+    """Injected failure; named like the LiteLLM error so the scheduler retries it."""
+    status_code = 503
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Identify a request by model and messages, ignoring timeouts and API keys."""
+    payload = json.dumps({"model": kwargs.get("model"), "messages": kwargs.get("messages")}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _response(content: str, prompt_chars: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4),
+    )
+
+
+async def _stream(content: str, chunk_delay: float):
+    owed = 0.0
+    for i in range(0, len(content), STREAM_CHUNK_CHARS):
+        # Sleep in steps of at least MIN_SLEEP_SECONDS; tiny sleeps cost more than they wait
+        owed += chunk_delay
+        if owed >= MIN_SLEEP_SECONDS:
+            await asyncio.sleep(owed)
+            owed = 0.0
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + STREAM_CHUNK_CHARS]))])
+
+
+def _prompt_chars(kwargs: Dict[str, Any]) -> int:
+    return sum(len(m.get("content") or "") for m in kwargs.get("messages", []))
+
+
+class StubBackend:
+    """
+    Local fake of litellm.acompletion.
+
+    Every request sleeps for `latency` seconds (plus up to `jitter`, or the
+    per-model override in `model_latency`), fails with `failure_rate`
+    probability, and otherwise rewrites each input file in full: the original
+    lines plus `output_lines` appended lines. Streamed responses spread the
+    latency across the chunks.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, output_lines: int = 20, failure_rate: float = 0.0, model_latency: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.output_lines = output_lines
+        self.failure_rate = failure_rate
+        self.model_latency = model_latency or {}
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    def _content(self, model: str, user_prompt: str) -> str:
+        """A full-file answer for every file in the prompt."""
+        headers = list(_FILE_HEADER_RE.finditer(user_prompt))
+        parts = [f"Stub answer from {model}.\n"]
+        for i, header in enumerate(headers):
+            path = header.group(1)
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(user_prompt)
+            body = user_prompt[header.end() + 1:end].rstrip("\n")
+            if body == "(File does not exist yet)":
+                body = ""
+            added = "\n".join(f"# stub edit {n} by {model}" for n in range(self.output_lines))
+            parts.append(f'<file path="{path}">\n{body}\n{added}\n</file>\n')
+        return "".join(parts)
+
+    async def __call__(self, stream: bool = False, **kwargs):
+        self.calls += 1
+        model = kwargs.get("model", "")
+        latency = self.model_latency.get(model, self.latency) + self._random.uniform(0, self.jitter)
+        if self._random.random() < self.failure_rate:
+            self.failures += 1
+            await asyncio.sleep(latency / 2)
+            raise ServiceUnavailableError(f"stub failure for {model}")
+
+        messages = kwargs.get("messages", [])
+        user_prompt = messages[-1]["content"] if messages else ""
+        content = self._content(model, user_prompt)
+        if stream:
+            chunks = max(1, len(content) // STREAM_CHUNK_CHARS)
+            # First-chunk latency is most of the wait, like a real provider
+            await asyncio.sleep(latency * 0.5)
+            return _stream(content, latency * 0.5 / chunks)
+        await asyncio.sleep(latency)
+        return _response(content, _prompt_chars(kwargs))
+
+
+class RecordingBackend:
+    """Calls `inner` (litellm.acompletion by default) and appends every response to `path` for replay."""
+
+    def __init__(self, path: str, inner: Optional[Callable] = None):
+        self.path = path
+        self.inner = inner
+
+    async def __call__(self, stream: bool = False, **kwargs):
+        inner = self.inner
+        if inner is None:
+            from litellm import acompletion
+            inner = acompletion
+        # Recordings hold the complete text, so always ask for a non-streamed answer
+        response = await inner(**kwargs)
+        content = response.choices[0].message.content
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": request_key(kwargs), "model": kwargs.get("model"), "content": content}) + "\n")
+        if stream:
+            return _stream(content, 0.0)
+        return response
+
+
+class ReplayBackend:
+    """
+    Answers from a RecordingBackend file. Requests are matched by model and
+    messages; unmatched requests fall back to the most recent recording for the
+    same model (so replays survive small prompt changes), or raise KeyError.
+    Recorded latency is not reproduced unless `latency` is given.
+    """
+
+    def __init__(self, path: str, latency: float = 0.0):
+        self.latency = latency
+        self._by_key: Dict[str, str] = {}
+        self._by_model: Dict[str, List[str]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for raw in f:
+                if not raw.strip():
+                    continue
+                entry = json.loads(raw)
+                self._by_key[entry["key"]] = entry["content"]
+                self._by_model.setdefault(entry["model"], []).append(entry["content"])
+        self.misses = 0
+
+    async def __call__(self, stream: bool = False, **kwargs):
+        content = self._by_key.get(request_key(kwargs))
+        if content is None:
+            self.misses += 1
+            recorded = self._by_model.get(kwargs.get("model"))
+            if not recorded:
+                raise KeyError(f"No recording for model {kwargs.get('model')}")
+            content = recorded[-1]
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if stream:
+            return _stream(content, 0.0)
+        return _response(content, _prompt_chars(kwargs))
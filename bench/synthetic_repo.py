@@ -0,0 +1,75 @@
+"""Deterministic synthetic git repositories for benchmarks."""
+import os
+import random
+import subprocess
+from typing import List
+
+_GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+}
+
+
+def _git(repo_path: str, *args: str):
+    env = dict(os.environ, **_GIT_ENV)
+    subprocess.run(["git", *args], cwd=repo_path, env=env, check=True, capture_output=True)
+
+
+def _python_file(rng: random.Random, index: int, lines: int) -> str:
+    """Plausible Python source: a module docstring and functions of ~10 lines each."""
+    out = [f'"""Synthetic module {index}."""', "import os", ""]
+    fn = 0
+    while len(out) < lines:
+        out += [
+            "",
+            f"def function_{index}_{fn}(value, scale={rng.randint(1, 9)}):",
+            f'    """Compute step {fn} of module {index}."""',
+            "    total = 0",
+            f"    for i in range({rng.randint(2, 50)}):",
+            "        total += value * i * scale",
+            f"    if total > {rng.randint(100, 10000)}:",
+            "        return os.sep.join([str(total), str(value)])",
+            "    return total",
+        ]
+        fn += 1
+    return "\n".join(out[:lines]) + "\n"
+
+
+def make_synthetic_repo(repo_path: str, n_files: int = 20, file_lines: int = 200, history_depth: int = 10, seed: int = 0) -> List[str]:
+    """
+    Create a git repository at `repo_path` on branch `main` with `n_files`
+    Python files of about `file_lines` lines, spread over nested packages,
+    and `history_depth` commits that each modify a few files.
+    Returns the file paths relative to the repository root.
+    """
+    rng = random.Random(seed)
+    os.makedirs(repo_path, exist_ok=True)
+    _git(repo_path, "init", "-q", "-b", "main")
+    # The engine commits in worktrees of this repo, so it needs an identity too
+    _git(repo_path, "config", "user.name", _GIT_ENV["GIT_AUTHOR_NAME"])
+    _git(repo_path, "config", "user.email", _GIT_ENV["GIT_AUTHOR_EMAIL"])
+
+    with open(os.path.join(repo_path, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write(".ai_worktrees/\n")
+
+    paths = []
+    for i in range(n_files):
+        directory = os.path.join("pkg", f"sub{i % 5}", f"mod{i % 3}")
+        path = os.path.join(directory, f"module_{i}.py")
+        os.makedirs(os.path.join(repo_path, directory), exist_ok=True)
+        with open(os.path.join(repo_path, path), "w", encoding="utf-8") as f:
+            f.write(_python_file(rng, i, file_lines))
+        paths.append(path)
+
+    _git(repo_path, "add", "-A")
+    _git(repo_path, "commit", "-q", "-m", "Initial synthetic tree")
+
+    for depth in range(1, history_depth):
+        for path in rng.sample(paths, min(3, len(paths))):
+            with open(os.path.join(repo_path, path), "a", encoding="utf-8") as f:
+                f.write(f"\n# revision {depth}\nREVISION_{depth} = {rng.randint(0, 1000)}\n")
+        _git(repo_path, "commit", "-q", "-am", f"Revision {depth}")
+
+    return paths
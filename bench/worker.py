@@ -0,0 +1,121 @@
+"""
+Runs one benchmark scenario inside its synthetic repository.
+
+Started by `python -m bench` as a subprocess with the repository as working
+directory, so module-level state (worktree paths, pools, schedulers) is
+fresh for every scenario. Writes its measurements as JSON to the given path.
+
+    python -m bench.worker spec.json result.json
+"""
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from typing import Any, Dict, List
+
+# Imported first and timed: the cold-start cost of the engine
+_import_started = time.perf_counter()
+from core.telemetry import telemetry
+from engine import reviewers
+from engine.dispatcher import process_submission
+_import_seconds = time.perf_counter() - _import_started
+
+from bench.stub_backend import StubBackend, RecordingBackend, ReplayBackend
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _make_backend(spec: Dict[str, Any]):
+    backend = spec.get("backend", {})
+    kind = backend.get("kind", "stub")
+    if kind == "replay":
+        return ReplayBackend(backend["path"], latency=backend.get("latency", 0.0))
+    if kind == "record":
+        return RecordingBackend(backend["path"])
+    return StubBackend(
+        latency=backend.get("latency", 0.2),
+        jitter=backend.get("jitter", 0.0),
+        output_lines=backend.get("output_lines", 20),
+        failure_rate=backend.get("failure_rate", 0.0),
+        seed=spec.get("seed", 0),
+    )
+
+
+async def _run(spec: Dict[str, Any]) -> Dict[str, Any]:
+    backend = _make_backend(spec)
+    reviewers.set_completion_backend(backend)
+
+    # Load litellm before timing so the first task doesn't carry it
+    warm_up_started = time.perf_counter()
+    await reviewers.load_litellm()
+    warm_up_seconds = time.perf_counter() - warm_up_started
+
+    rng = random.Random(spec.get("seed", 0))
+    files = spec["files"]
+    submissions = [
+        (rng.sample(files, min(spec["files_per_task"], len(files))), f"Add type hints and docstrings ({i})")
+        for i in range(spec["tasks"])
+    ]
+
+    semaphore = asyncio.Semaphore(spec["concurrency"])
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(target_files: List[str], prompt: str):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await process_submission(target_files, prompt)
+                if not result["model_results"]:
+                    errors += 1
+            except Exception as e:
+                print(f"[BENCH] task failed: {type(e).__name__}: {e}")
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(t, p) for t, p in submissions))
+    wall = time.perf_counter() - started
+
+    # Seconds per stage summed over every task and model
+    stages: Dict[str, float] = {}
+    for s in telemetry.spans():
+        stages[s.name] = stages.get(s.name, 0.0) + s.duration
+
+    return {
+        "tasks": len(submissions),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_tps": len(submissions) / wall if wall else 0.0,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_max": max(latencies) if latencies else 0.0,
+        "import_seconds": _import_seconds,
+        "warm_up_seconds": warm_up_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "llm_calls": getattr(backend, "calls", None),
+        "stages": {name: round(seconds, 6) for name, seconds in sorted(stages.items())},
+    }
+
+
+def main():
+    spec_path, result_path = sys.argv[1], sys.argv[2]
+    with open(spec_path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    result = asyncio.run(_run(spec))
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,37 @@ import os
 import asyncio
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical
-from textual.widgets import Header, Footer, TextArea, Input, Button, Static, Markdown, LoadingIndicator
+from textual.widgets import Header, Footer, TextArea, Input, Button, Static, Markdown, LoadingIndicator, ContentSwitcher
 from textual.reactive import reactive
 
-# Import processing logic directly
-from engine.dispatcher import process_submission
+from core.file_catalog import FileCatalog
+from ui.diff_viewer import DiffViewer
+from ui.file_picker import FileSetField
+
+# The engine (litellm, SQLAlchemy, git layer) is not imported here: it takes
+# seconds to load, so the UI starts first and loads it in the background.
+
+# Rows shown in the latency breakdown panel
+LATENCY_PANEL_ROWS = 12
+
+def _load_engine():
+    """Import the processing logic and warm up its dependencies. Runs in a worker thread."""
+    from engine import dispatcher, reviewers
+    from core.database import init_db
+
+    reviewers.completion_backend()
+    try:
+        init_db()
+    except Exception as e:
+        # Only persistence and the task journal need the database; analysis can still run
+        print(f"Database warm-up failed: {e}")
+    return dispatcher.process_submission
+
+def _analyze_label() -> str:
+    """The submit button label, naming how many models a run uses."""
+    # Only the settings are needed, not the engine
+    from core.config import judge_models
+    return f"Analyze with {len(judge_models())} AI Models"
 
 class ResultView(Static):
     """A widget to display the analysis results."""
@@ -103,6 +129,15 @@ class AICodeJudgeApp(App):
         margin-top: 1;
     }
     
+    #result_views {
+        height: 1fr;
+    }
+
+    #diff_viewer {
+        border: solid #d6336c;
+        background: $surface;
+    }
+
     #results_container {
         height: 100%;
         overflow-y: scroll;
@@ -114,6 +149,19 @@ class AICodeJudgeApp(App):
     LoadingIndicator {
         color: #f06595;
     }
+
+    #progress_status {
+        color: #f06595;
+        padding: 0 1;
+    }
+
+    #latency_panel {
+        height: auto;
+        max-height: 16;
+        border: solid #d6336c;
+        background: $surface;
+        padding: 0 1;
+    }
     
     MarkdownH2 {
         color: #d6336c;
@@ -129,7 +177,9 @@ class AICodeJudgeApp(App):
     
     BINDINGS = [
         ("q", "quit", "Quit"),
-        ("ctrl+r", "analyze", "Analyze Code")
+        ("ctrl+r", "analyze", "Analyze Code"),
+        ("ctrl+t", "toggle_diff_view", "Report/Diffs"),
+        ("ctrl+o", "export_report", "Export Report")
     ]
     
     def compose(self) -> ComposeResult:
@@ -139,27 +189,62 @@ class AICodeJudgeApp(App):
         with Container(id="main_container"):
             # Left Pane: Inputs
             with Vertical(id="left_pane"):
-                yield Static("Target Files (space separated):", classes="label")
-                yield Input(id="files_input", placeholder="e.g. core/config.py engine/reviewers.py")
+                yield Static("Target Files (paths, directories or globs):", classes="label")
+                yield FileSetField(FileCatalog(), placeholder="e.g. core/config.py engine/ ui/*.py")
                 
                 yield Static("What should be improved?", classes="label")
                 yield Input(id="prompt_input", placeholder="e.g. Add type hints and error handling")
                 
-                yield Button("Analyze with 2 AI Models", id="submit_btn", variant="primary")
+                yield Button(_analyze_label(), id="submit_btn", variant="primary")
                 yield Static("Built by codedbyelif", id="branding_footer")
                 
             # Right Pane: Results
             with Vertical(id="right_pane"):
                 yield Static("Analysis Report:", classes="label")
-                with Container(id="results_container"):
-                    yield Markdown("## Welcome to ELS JUDGE\n\n1. List target files on the left.\n2. Enter your instructions.\n3. Press **Analyze** to submit.", id="markdown_result")
-                    yield LoadingIndicator(id="loading", classes="hidden")
+                yield Static("", id="progress_status")
+                with ContentSwitcher(initial="results_container", id="result_views"):
+                    with Container(id="results_container"):
+                        yield Markdown("## Welcome to ELS JUDGE\n\n1. List target files on the left.\n2. Enter your instructions.\n3. Press **Analyze** to submit.", id="markdown_result")
+                        yield LoadingIndicator(id="loading", classes="hidden")
+                    yield DiffViewer(id="diff_viewer")
+                yield Static("", id="latency_panel")
                 
         yield Footer()
 
     def on_mount(self) -> None:
         self.title = "ELS JUDGE"
         self.query_one("#loading").display = False
+        self.query_one("#progress_status").display = False
+        self.query_one("#latency_panel").display = False
+        self.model_progress = {}
+        self.model_status = {}
+        self.pending_models = []
+        self.live_report = None
+        self.last_result = None
+        # Input whose untracked paths were already pointed out; analyzing it again submits it as is
+        self._confirmed_files = None
+        self._engine_loading = None
+        # Load the engine once the first frame is on screen
+        self.call_after_refresh(self._start_engine_warm_up)
+
+    def _start_engine_warm_up(self) -> None:
+        if self._engine_loading is None:
+            self._engine_loading = asyncio.ensure_future(asyncio.to_thread(_load_engine))
+
+    async def _process_submission(self):
+        """The dispatcher's process_submission, waiting for the background warm-up if needed."""
+        self._start_engine_warm_up()
+        return await self._engine_loading
+
+    async def on_unmount(self) -> None:
+        # Write any results still waiting in the write-behind queue before exiting
+        persistence = sys.modules.get("core.persistence")
+        if persistence is not None:
+            await persistence.persistence_queue.close()
+        # Let a branch collection that is already running finish
+        retention = sys.modules.get("core.retention")
+        if retention is not None:
+            await retention.retention.close()
 
     async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "submit_btn":
@@ -175,16 +260,41 @@ class AICodeJudgeApp(App):
 
         target_files = [f.strip() for f in files_input.split() if f.strip()]
 
+        # Expand directories and globs, and catch typos before paying for a model call
+        md_view = self.query_one("#markdown_result", Markdown)
+        selection = await self.query_one(FileSetField).selection()
+        if selection is not None:
+            if not selection.files:
+                md_view.update("### Error\nNo files match: " + ", ".join(f"`{t}`" for t in selection.empty))
+                return
+            if (selection.unknown or selection.empty) and self._confirmed_files != files_input:
+                self._confirmed_files = files_input
+                problems = [f"- `{p}` is not tracked in this repository; the models would create it" for p in selection.unknown]
+                problems += [f"- `{p}` matches no files" for p in selection.empty]
+                md_view.update("### Check the target files\n" + "\n".join(problems) + "\n\nPress **Analyze** again to submit anyway.")
+                return
+            target_files = selection.files
+
         # Show loading
         btn = self.query_one("#submit_btn", Button)
         btn.disabled = True
         btn.label = "Analyzing..."
         
-        md_view = self.query_one("#markdown_result", Markdown)
         loading = self.query_one("#loading", LoadingIndicator)
         
         md_view.display = False
         loading.display = True
+        self.query_one("#result_views", ContentSwitcher).current = "results_container"
+        self.query_one("#latency_panel").display = False
+        self.query_one("#diff_viewer", DiffViewer).load([])
+
+        self.model_progress = {}
+        self.model_status = {}
+        self.pending_models = []
+        self.live_report = None
+        progress = self.query_one("#progress_status", Static)
+        progress.update("Waiting for models...")
+        progress.display = True
         
         # Call processing logic directly
         self.run_worker(self.fetch_analysis(target_files, prompt_input), exclusive=True)
@@ -192,32 +302,130 @@ class AICodeJudgeApp(App):
     async def fetch_analysis(self, target_files: list[str], prompt: str) -> None:
         try:
             # Process submission directly through the dispatcher
-            result = await process_submission(target_files, prompt)
-            md_report = result.get("report", "No report generated.")
+            process_submission = await self._process_submission()
+            result = await process_submission(
+                target_files, prompt,
+                on_progress=self.update_progress,
+                on_result=lambda event: self.show_model_result(event, prompt),
+            )
+            self.last_result = result
+
+            # Diffs go to the diff viewer; the on-screen report only summarizes them.
+            # The full report (with diffs) stays in result["report"] for export.
+            # Every finished model is already in the viewer, so it isn't reloaded.
+            from engine.reporter import generate_markdown_report
+            md_report = generate_markdown_report(result["task_id"], prompt, result["model_results"], include_diffs=False)
             self.update_success(md_report)
+            self.update_latency_panel(result.get("task_id"))
             
         except Exception as e:
             self.update_error(str(e))
 
+    def update_progress(self, model_name: str, tokens: int, files_completed: int) -> None:
+        """Called by the reviewers while a model's response streams in."""
+        self.model_progress[model_name] = (tokens, files_completed)
+        self._show_progress()
+
+    def _show_progress(self) -> None:
+        lines = []
+        for name in dict.fromkeys([*self.model_progress, *self.model_status, *self.pending_models]):
+            if name in self.model_status:
+                lines.append(f"{name}: {self.model_status[name]}")
+            elif name not in self.model_progress:
+                lines.append(f"{name}: running...")
+            else:
+                n_tokens, n_files = self.model_progress[name]
+                lines.append(f"{name}: {n_tokens} tokens received, {n_files} file(s) written")
+        self.query_one("#progress_status", Static).update("\n".join(lines))
+
+    def show_model_result(self, event: dict, prompt: str) -> None:
+        """Called by the dispatcher as each model finishes; shows it while the others keep running."""
+        model = event["model_name"]
+        if event["status"] == "completed":
+            self.model_status[model] = f"done in {event['seconds']:.1f}s"
+        else:
+            self.model_status[model] = f"failed after {event['seconds']:.1f}s ({event['error']})"
+        self.pending_models = event["pending"]
+        self._show_progress()
+        if event["status"] != "completed":
+            return
+
+        md_view = self.query_one("#markdown_result", Markdown)
+        if self.live_report is None:
+            # First model in: replace the loading indicator with its section
+            from engine.reporter import ReportBuilder
+            self.live_report = ReportBuilder(event["task_id"], prompt, include_diffs=False)
+            section = self.live_report.add(event["result"])
+            md_view.update(self.live_report.header() + section)
+            self.query_one("#loading").display = False
+            md_view.display = True
+        else:
+            md_view.append(self.live_report.add(event["result"]))
+        self.query_one("#diff_viewer", DiffViewer).add(event["result"])
+
+    def action_toggle_diff_view(self) -> None:
+        switcher = self.query_one("#result_views", ContentSwitcher)
+        if switcher.current == "diff_viewer":
+            switcher.current = "results_container"
+        else:
+            switcher.current = "diff_viewer"
+            self.call_after_refresh(self.query_one("#diff_tree").focus)
+
+    def action_export_report(self) -> None:
+        """Write the full Markdown report, diffs included, next to the repository."""
+        if not self.last_result:
+            self.notify("Nothing to export yet.")
+            return
+        path = os.path.abspath(f"report-{self.last_result['task_id']}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.last_result.get("report", ""))
+        self.notify(f"Report written to {path}")
+
+    def update_latency_panel(self, task_id: str) -> None:
+        """Show where the task's time went, per stage and model."""
+        from core.telemetry import telemetry
+
+        panel = self.query_one("#latency_panel", Static)
+        rows = telemetry.task_breakdown(task_id) if task_id else []
+        total = next((seconds for stage, _, seconds, _ in rows if stage == "task.total"), 0.0)
+        if not rows or total <= 0:
+            panel.display = False
+            return
+
+        lines = [f"Latency breakdown (task {task_id}, {total:.2f}s)"]
+        for stage, model, seconds, count in rows:
+            if stage == "task.total":
+                continue
+            if len(lines) > LATENCY_PANEL_ROWS:
+                break
+            share = min(seconds / total, 1.0)
+            bar = "█" * int(share * 20)
+            calls = f" x{count}" if count > 1 else ""
+            lines.append(f"{stage + calls:<22} {(model or '-')[:28]:<28} {seconds:7.2f}s {bar}")
+        panel.update("\n".join(lines))
+        panel.display = True
+
     def update_success(self, markdown_text: str) -> None:
         self.query_one("#loading").display = False
+        self.query_one("#progress_status").display = False
         md_view = self.query_one("#markdown_result", Markdown)
         md_view.update(markdown_text)
         md_view.display = True
         
         btn = self.query_one("#submit_btn", Button)
         btn.disabled = False
-        btn.label = "Analyze with 2 AI Models"
+        btn.label = _analyze_label()
 
     def update_error(self, error_msg: str) -> None:
         self.query_one("#loading").display = False
+        self.query_one("#progress_status").display = False
         md_view = self.query_one("#markdown_result", Markdown)
         md_view.update(f"### Engine Error\nAn error occurred during analysis.\n\nDetails: `{error_msg}`")
         md_view.display = True
         
         btn = self.query_one("#submit_btn", Button)
         btn.disabled = False
-        btn.label = "Analyze with 2 AI Models"
+        btn.label = _analyze_label()
 
 if __name__ == "__main__":
     app = AICodeJudgeApp()
@@ -0,0 +1,410 @@
+"""
+Async counterpart of core/git_manager.py.
+
+Git runs in subprocesses created with asyncio.create_subprocess_exec, so the
+event loop (Textual UI, other models, LLM streaming) keeps running while git works.
+Operations that mutate shared state of the main repository (branch refs,
+worktree registry, the main index) are serialized with a per-repo asyncio lock;
+work inside a model's own worktree and read-only commands like diff run freely.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.git_manager import (
+    PINNED_REF_PREFIX,
+    UNOWNED_GRACE_SECONDS,
+    WORKTREE_BASE_DIR,
+    WorktreeSlots,
+    clean_model_name_for_ref,
+    mark_worktree_owner,
+    setup_worktree_dir,
+    worktree_orphaned,
+)
+from core.telemetry import span
+
+_repo_locks: Dict[str, asyncio.Lock] = {}
+
+def _repo_lock(repo_path: str = None) -> asyncio.Lock:
+    """Return the lock guarding the main repository (the working directory by default)."""
+    key = os.path.realpath(repo_path or os.getcwd())
+    lock = _repo_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _repo_locks[key] = lock
+    return lock
+
+async def _run_git_command(args: List[str], cwd: str = None, lock: bool = False, input_data: bytes = None) -> str:
+    """
+    Run a git command without blocking the event loop and return its output.
+    With lock=True the command holds the main repository lock, even when it
+    runs inside a worktree (worktrees share refs and the worktree registry).
+    Raises subprocess.CalledProcessError on failure, like the sync version.
+    """
+    if cwd is None:
+        cwd = os.getcwd()
+
+    if lock:
+        lock_obj = _repo_lock()
+        with span("git.lock_wait"):
+            await lock_obj.acquire()
+        try:
+            return await _exec_git(args, cwd, input_data)
+        finally:
+            lock_obj.release()
+    return await _exec_git(args, cwd, input_data)
+
+async def _exec_git(args: List[str], cwd: str, input_data: bytes = None) -> str:
+    with span(f"git.{args[0]}", bytes_in=len(input_data or b"")) as s:
+        proc = await asyncio.create_subprocess_exec(
+            "git", *args,
+            cwd=cwd,
+            stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await proc.communicate(input_data)
+        except asyncio.CancelledError:
+            # Don't leave a git process running behind a cancelled task
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        s.attrs["bytes_out"] = len(stdout)
+
+    out = stdout.decode("utf-8", errors="replace")
+    err = stderr.decode("utf-8", errors="replace")
+    if proc.returncode != 0:
+        print(f"Git command failed: git {' '.join(args)}")
+        print(f"Error output: {err}")
+        raise subprocess.CalledProcessError(proc.returncode, ["git"] + args, output=out, stderr=err)
+    return out.strip()
+
+async def create_task_branch(task_id: str, base_branch: str = "main") -> str:
+    """Create a base branch for the entire task (reset to HEAD if an interrupted run left it behind)."""
+    task_branch = f"task-{task_id}"
+    await _run_git_command(["branch", "-f", task_branch], lock=True)
+    return task_branch
+
+async def create_model_worktree(task_id: str, model_name: str, sparse_args: Optional[List[str]] = None, base_branch: Optional[str] = None) -> dict:
+    """
+    Create a git worktree for a specific model to work in isolation.
+    Returns the path to the worktree and the name of the branch.
+    With sparse_args (see sparse_checkout_args) only those paths are checked
+    out; the worktree shares the main repository's objects either way.
+    The branch starts at `base_branch` (HEAD by default); a branch left over
+    from an interrupted run of the same task is reset to it.
+    """
+    setup_worktree_dir()
+
+    clean_model_name = clean_model_name_for_ref(model_name)
+    branch_name = f"task-{task_id}-{clean_model_name}"
+
+    worktree_path = os.path.abspath(os.path.join(WORKTREE_BASE_DIR, branch_name))
+
+    # Branch creation and worktree registration both write to the main repo
+    async with _repo_lock():
+        await _exec_git(["branch", "-f", branch_name, base_branch or "HEAD"], os.getcwd())
+        if sparse_args:
+            # Register it without a checkout and narrow it (sparse config may enable
+            # extensions.worktreeConfig in the main repo, so this stays under the lock)
+            await _exec_git(["worktree", "add", "--no-checkout", worktree_path, branch_name], os.getcwd())
+            await _exec_git(sparse_args, worktree_path)
+        else:
+            await _exec_git(["worktree", "add", worktree_path, branch_name], os.getcwd())
+    if sparse_args:
+        # Check out only what the sparse definition kept; worktree-local, no lock
+        await _run_git_command(["reset", "--hard"], cwd=worktree_path)
+    mark_worktree_owner(worktree_path)
+
+    return {
+        "branch_name": branch_name,
+        "worktree_path": worktree_path
+    }
+
+async def commit_worktree_changes(worktree_path: str, commit_message: str):
+    """Stage and commit all changes in the given worktree."""
+    # Each worktree has its own index and branch, so no repo lock is needed here
+    # --sparse: new files may land outside a sparse worktree's checkout
+    await _run_git_command(["add", "-A", "--sparse", "."], cwd=worktree_path)
+
+    try:
+        await _run_git_command(["commit", "-m", commit_message], cwd=worktree_path)
+    except subprocess.CalledProcessError as e:
+        if "nothing to commit" in e.stderr or "nothing to commit" in e.stdout:
+            print(f"No changes made in {worktree_path}")
+        else:
+            raise
+
+async def get_branch_diff(base_branch: str, target_branch: str) -> str:
+    """Get the diff between the base branch and the target model branch."""
+    return await _run_git_command(["diff", f"{base_branch}..{target_branch}"])
+
+async def merge_model_branch(target_branch: str, base_branch: str = "main"):
+    """Merge the selected model's branch back into the base directory/branch."""
+    async with _repo_lock():
+        await _exec_git(["checkout", base_branch], os.getcwd())
+        await _exec_git(["merge", "--squash", target_branch], os.getcwd())
+        await _exec_git(["commit", "-m", f"Merged AI solution from {target_branch}"], os.getcwd())
+        # A squash merge leaves no ancestry behind, so keep the result branch explicitly
+        await _exec_git(["update-ref", PINNED_REF_PREFIX + target_branch, target_branch], os.getcwd())
+
+async def pin_branch(branch_name: str):
+    """Keep a (selected) result branch and the rest of its task out of retention."""
+    await _run_git_command(["update-ref", PINNED_REF_PREFIX + branch_name, branch_name], lock=True)
+
+async def unpin_branch(branch_name: str):
+    await _run_git_command(["update-ref", "-d", PINNED_REF_PREFIX + branch_name], lock=True)
+
+async def delete_branches(branch_names: List[str]):
+    """Force-delete local branches, e.g. those of models that were cancelled."""
+    if branch_names:
+        await _run_git_command(["branch", "-D"] + list(branch_names), lock=True)
+
+async def list_refs(patterns: List[str]) -> List[Tuple[str, str, int]]:
+    """(refname, object id, commit time) of every ref matching the for-each-ref patterns."""
+    output = await _run_git_command(["for-each-ref", "--format=%(refname) %(objectname) %(committerdate:unix)"] + patterns)
+    refs = []
+    for line in output.split("\n"):
+        if not line:
+            continue
+        refname, oid, committed = line.split(" ", 2)
+        refs.append((refname, oid, int(committed) if committed.isdigit() else 0))
+    return refs
+
+async def ref_creation_times(refnames: List[str]) -> Dict[str, int]:
+    """
+    Unix time each ref was created at, from its oldest reflog entry, read for
+    all refs in one `git log -g` run. Refs without a reflog are left out.
+    """
+    if not refnames:
+        return {}
+    try:
+        output = await _run_git_command(
+            ["log", "-g", "--stdin", "--date=unix", "--format=%gD"],
+            input_data=("\n".join(refnames) + "\n").encode("utf-8"),
+        )
+    except subprocess.CalledProcessError:
+        return {}
+    created: Dict[str, int] = {}
+    for line in output.split("\n"):
+        # refs/heads/task-1a2b3c4d@{1700000000}, newest entry first
+        refname, _, stamp = line.rpartition("@{")
+        if refname and stamp.endswith("}") and stamp[:-1].isdigit():
+            created[refname] = int(stamp[:-1])
+    return created
+
+async def checked_out_branches() -> Set[str]:
+    """Refs checked out in any worktree; deleting them would break that worktree."""
+    output = await _run_git_command(["worktree", "list", "--porcelain"])
+    return {line[len("branch "):] for line in output.split("\n") if line.startswith("branch ")}
+
+async def delete_refs(refs: Dict[str, str], batch_size: int = 500) -> int:
+    """
+    Delete refs ({refname: expected object id}) with `git update-ref --stdin`,
+    one transaction per batch. A ref that moved since it was listed fails its
+    batch instead of being deleted. The repo lock is held per batch only, so
+    other tasks' ref updates interleave. Returns the number of refs deleted.
+    """
+    deleted = 0
+    items = list(refs.items())
+    for i in range(0, len(items), batch_size):
+        batch = items[i:i + batch_size]
+        commands = "".join(f"delete {refname} {oid}\n" for refname, oid in batch)
+        try:
+            await _run_git_command(["update-ref", "--stdin"], lock=True, input_data=commands.encode("utf-8"))
+            deleted += len(batch)
+        except subprocess.CalledProcessError:
+            pass
+    return deleted
+
+async def pack_refs():
+    """Move loose refs into packed-refs so ref lookups stay fast."""
+    await _run_git_command(["pack-refs", "--all", "--prune"], lock=True)
+
+async def prune_worktrees():
+    """Forget worktrees whose directories no longer exist."""
+    await _run_git_command(["worktree", "prune"], lock=True)
+
+async def cleanup_task_worktrees(task_id: str):
+    """Remove all worktrees associated with a task_id."""
+    output = await _run_git_command(["worktree", "list"])
+
+    for line in output.split('\n'):
+        if not line.strip():
+            continue
+        wt_path = line.split()[0]
+
+        if f"task-{task_id}" in wt_path and WORKTREE_BASE_DIR in wt_path:
+            print(f"Removing worktree {wt_path}")
+            await _run_git_command(["worktree", "remove", "-f", wt_path], lock=True)
+
+async def reconcile_worktrees() -> Dict[str, int]:
+    """
+    Clean up .ai_worktrees after a crash: task worktrees of processes that no
+    longer run are removed (their branches stay), directories git doesn't know
+    about are deleted, and registrations of missing directories are pruned.
+    Pool slots are left to AsyncWorktreePool, which adopts the orphaned ones.
+    Worktrees of other live processes are not touched. Returns counts.
+    """
+    summary = {"removed": 0, "deleted_dirs": 0}
+    if not os.path.isdir(WORKTREE_BASE_DIR):
+        return summary
+    registered = set()
+    for line in (await _run_git_command(["worktree", "list", "--porcelain"])).split("\n"):
+        if line.startswith("worktree "):
+            registered.add(os.path.abspath(line[len("worktree "):].strip()))
+
+    for name in sorted(os.listdir(WORKTREE_BASE_DIR)):
+        wt_path = os.path.abspath(os.path.join(WORKTREE_BASE_DIR, name))
+        if not os.path.isdir(wt_path):
+            continue
+        if wt_path not in registered:
+            # Half-created or half-removed; nothing in it can be resumed
+            if os.path.getmtime(wt_path) < time.time() - UNOWNED_GRACE_SECONDS:
+                print(f"Deleting unregistered worktree directory {wt_path}")
+                await asyncio.to_thread(shutil.rmtree, wt_path, True)
+                summary["deleted_dirs"] += 1
+        elif not name.startswith("pool-") and worktree_orphaned(wt_path):
+            print(f"Removing worktree {wt_path} left by a stopped process")
+            try:
+                await _run_git_command(["worktree", "remove", "-f", wt_path], lock=True)
+            except subprocess.CalledProcessError:
+                await asyncio.to_thread(shutil.rmtree, wt_path, True)
+            summary["removed"] += 1
+    await prune_worktrees()
+    return summary
+
+
+class AsyncWorktreePool:
+    """
+    Keeps pre-checked-out worktrees per model under .ai_worktrees and reuses them
+    across tasks, so a task only pays for a reset/clean/checkout instead of a
+    full `git worktree add` + `git worktree remove`. Git runs on the event loop;
+    the slots are tracked by a WorktreeSlots.
+    With sparse=True new slots are created without a checkout; acquire() then
+    checks out only the paths of the task's sparse_args.
+    """
+
+    def __init__(self, size_per_model: int = 2, max_size: int = 8, max_idle_seconds: int = 3600, sparse: bool = False):
+        self.slots = WorktreeSlots(size_per_model, max_size, max_idle_seconds)
+        self.sparse = sparse
+        self._adopted = False
+
+    async def _adopt_existing(self):
+        if self._adopted:
+            return
+        self._adopted = True
+        if os.path.isdir(WORKTREE_BASE_DIR):
+            await reconcile_worktrees()
+            adopted = self.slots.adopt_from_listing(await _run_git_command(["worktree", "list", "--porcelain"]))
+            # A slot a dead process was using still has that task's branch checked out,
+            # which would keep a resumed run of the task from checking it out again
+            for wt_path in adopted:
+                try:
+                    await _run_git_command(["checkout", "--detach"], cwd=wt_path)
+                except subprocess.CalledProcessError:
+                    pass
+
+    async def _create_slot(self, model_key: str) -> str:
+        wt_path = self.slots.new_slot_path(model_key)
+        for args in self.slots.slot_add_commands(wt_path, self.sparse):
+            if args[0] == "worktree":
+                await _run_git_command(args, lock=True)
+            else:
+                await _run_git_command(args, cwd=wt_path, lock=args[0] == "sparse-checkout")
+        mark_worktree_owner(wt_path)
+        return wt_path
+
+    async def _remove_slot(self, wt_path: str):
+        try:
+            await _run_git_command(["worktree", "remove", "-f", wt_path], lock=True)
+        except subprocess.CalledProcessError:
+            await asyncio.to_thread(shutil.rmtree, wt_path, True)
+            await _run_git_command(["worktree", "prune"], lock=True)
+
+    async def _is_healthy(self, wt_path: str) -> bool:
+        if not os.path.isdir(wt_path):
+            return False
+        try:
+            await _run_git_command(["rev-parse", "--is-inside-work-tree"], cwd=wt_path)
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    async def reconcile(self):
+        """Clean up what crashed runs left in .ai_worktrees and adopt their idle pool slots (once per process)."""
+        await self._adopt_existing()
+
+    async def warm(self, model_names: List[str]):
+        """Pre-create worktrees so the first tasks don't pay the checkout cost."""
+        await self._adopt_existing()
+        for model_name in model_names:
+            model_key = clean_model_name_for_ref(model_name)
+            for _ in range(self.slots.missing_slots(model_key)):
+                self.slots.add_idle(model_key, await self._create_slot(model_key))
+
+    async def evict_stale(self):
+        """Remove idle worktrees that have not been used for max_idle_seconds."""
+        for wt_path in self.slots.pop_stale():
+            print(f"Evicting stale pooled worktree {wt_path}")
+            await self._remove_slot(wt_path)
+
+    async def acquire(self, task_id: str, model_name: str, base_branch: str, sparse_args: Optional[List[str]] = None) -> dict:
+        """
+        Hand out a worktree reset to `base_branch` with a fresh task/model branch checked out.
+        With sparse_args only those paths are checked out, otherwise the whole tree.
+        Returns the same shape as create_model_worktree.
+        """
+        model_key = clean_model_name_for_ref(model_name)
+        branch_name = f"task-{task_id}-{model_key}"
+        await self._adopt_existing()
+        await self.evict_stale()
+
+        wt_path = self.slots.take_idle(model_key)
+        while wt_path is not None and not await self._is_healthy(wt_path):
+            print(f"Pooled worktree {wt_path} failed health check, removing")
+            await self._remove_slot(wt_path)
+            wt_path = self.slots.take_idle(model_key)
+        if wt_path is None:
+            wt_path = await self._create_slot(model_key)
+
+        self.slots.mark_in_use(wt_path, model_key)
+        try:
+            for args in self.slots.reset_commands(branch_name, base_branch, wt_path, sparse_args):
+                # checkout -B writes a ref in the main repo and sparse-checkout may write
+                # its config; the rest is worktree-local
+                await _run_git_command(args, cwd=wt_path, lock=args[0] in ("checkout", "sparse-checkout"))
+        except (subprocess.CalledProcessError, asyncio.CancelledError):
+            self.slots.unmark_in_use(wt_path)
+            await self._remove_slot(wt_path)
+            raise
+
+        return {
+            "branch_name": branch_name,
+            "worktree_path": wt_path
+        }
+
+    async def release(self, worktree_path: str):
+        """Return a worktree to the pool, or remove it if the pool is already full."""
+        model_key = self.slots.unmark_in_use(worktree_path)
+        if model_key is None:
+            return
+
+        try:
+            await _run_git_command(["checkout", "--detach"], cwd=worktree_path)
+        except subprocess.CalledProcessError:
+            await self._remove_slot(worktree_path)
+            return
+
+        if not self.slots.return_slot(model_key, worktree_path):
+            await self._remove_slot(worktree_path)
+
+    async def shutdown(self):
+        """Remove every idle pooled worktree."""
+        for wt_path in self.slots.pop_all_idle():
+            await self._remove_slot(wt_path)
@@ -1,5 +1,6 @@
 import logging
 import sys
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Setup minimal logging
@@ -13,6 +14,16 @@ logger = logging.getLogger("llm_consensus_engine")
 class Settings(BaseSettings):
     project_name: str = "ELS JUDGE"
     database_url: str = "sqlite:///./consensus.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle_seconds: int = 30 * 60
+    db_busy_timeout_seconds: int = 30
+
+    # Write-behind persistence of submissions and model suggestions
+    persist_results: bool = True
+    persist_batch_size: int = 100
+    persist_flush_interval_seconds: float = 1.0
+    persist_queue_max_size: int = 10000
     
     # Optional LLM API keys. LiteLLM picks these up automatically if set in ENV,
     # but having them in settings is good practice to ensure they exist or log warnings.
@@ -22,7 +33,125 @@ class Settings(BaseSettings):
     # Models to use
     primary_model: str = "zai/glm-4.5-flash"
     secondary_model: str = "gemini/gemini-flash-latest"
+    # Any number of models to judge with, e.g. ["zai/glm-4.5-flash", "gemini/gemini-flash-latest", "openai/gpt-4o-mini"].
+    # Empty means [primary_model, secondary_model].
+    judge_models: List[str] = []
+
+    # When a task stops waiting for models: "all", "first_k" (FANOUT_K successes)
+    # or "quorum" (FANOUT_QUORUM successes, 0 = a majority of the models).
+    # Models still running once the policy is met are cancelled.
+    fanout_policy: str = "all"
+    fanout_k: int = 1
+    fanout_quorum: int = 0
+    # Hard deadline for a task's model calls in seconds (0 = none); whatever finished by then is used
+    fanout_deadline_seconds: float = 0
+
+    # Request scheduling per provider prefix (the part before "/" in the model name)
+    llm_timeout_seconds: int = 120
+    provider_rate_limits: Dict[str, float] = {}  # requests per second, e.g. {"zai": 1.0}
+    provider_max_concurrency: Dict[str, int] = {}
+    default_provider_rate_limit: float = 2.0
+    default_provider_max_concurrency: int = 4
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 1.0
+    llm_backoff_max_seconds: float = 30.0
+    # Hedging: fire a second request once the first exceeds this latency percentile
+    llm_hedge_enabled: bool = False
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_samples: int = 20
+
+    # Context packing: file contents are sliced down when they exceed the budget.
+    # 0 means "derive from the model's context window" (times the fraction below).
+    context_token_budget: int = 0
+    context_token_budgets: Dict[str, int] = {}
+    context_budget_fraction: float = 0.5
+    context_fallback_token_budget: int = 32000
+
+    # How models return edits: "full" files, "search_replace" blocks or "udiff" hunks.
+    # OUTPUT_PROTOCOLS overrides it per model, e.g. {"zai/glm-4.5-flash": "search_replace"}
+    output_protocol: str = "full"
+    output_protocols: Dict[str, str] = {}
+
+    # Map-reduce sharding: submissions with more than SHARD_MAX_FILES files or
+    # SHARD_MAX_TOKENS tokens (0 = the model's context budget) are split into
+    # shards reviewed by concurrent model calls, then merged into one commit.
+    # SHARD_STRATEGY groups files by "size", "directory" or "imports".
+    shard_enabled: bool = True
+    shard_strategy: str = "imports"
+    shard_max_files: int = 8
+    shard_max_tokens: int = 0
+
+    # Stream completions and write each <file> block as soon as it is complete
+    llm_streaming: bool = True
+
+    # LLM response cache (in-memory LRU backed by the database)
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 24 * 60 * 60
+    llm_cache_max_entries: int = 256
+    llm_cache_max_bytes: int = 32 * 1024 * 1024
+    llm_cache_max_entry_bytes: int = 2 * 1024 * 1024
+    llm_cache_max_db_entries: int = 5000
+
+    # "worktree" checks out a worktree per model; "in_memory" reads files via
+    # git cat-file and diffs in memory (review-only runs, no checkouts)
+    evaluation_mode: str = "worktree"
+    # In in_memory mode, also write each model's result as a task branch commit
+    in_memory_create_branches: bool = False
+    # Line diff algorithm of in_memory mode (engine/line_diff.py):
+    # "histogram" (like git diff --histogram), "patience" or "myers"
+    diff_algorithm: str = "histogram"
+
+    # Per-stage spans and metrics (wall time, bytes, tokens per stage and model).
+    # Set the paths to export them after every task as JSON lines / Prometheus text.
+    telemetry_enabled: bool = True
+    telemetry_max_spans: int = 10000
+    telemetry_jsonl_path: str = ""
+    telemetry_prometheus_path: str = ""
+
+    # Pre-warmed git worktree pool (reused across tasks instead of add/remove per task)
+    worktree_pool_enabled: bool = True
+    worktree_pool_size_per_model: int = 2
+    worktree_pool_max_size: int = 8
+    worktree_pool_max_idle_seconds: int = 60 * 60
+
+    # Sparse worktrees: "off" checks out the whole repository, "cone" only the
+    # target files' directories (with a sparse index), "pattern" only the target
+    # files themselves. Context paths are always added: directories in cone mode,
+    # gitignore-style patterns in pattern mode, e.g. ["config", "/pyproject.toml"].
+    worktree_sparse_mode: str = "off"
+    worktree_sparse_context_paths: List[str] = []
+
+    # Crash-safe tasks: every stage and raw model response is recorded in the
+    # database, so a task interrupted by a crash resumes where it stopped
+    # without calling the models again (core/task_state.py).
+    task_journal_enabled: bool = True
+
+    # HTTP service (server.py): submissions are queued in the jobs table and run
+    # by SERVER_WORKERS concurrent workers. A job interrupted by a crash is
+    # queued again on restart, at most JOB_MAX_ATTEMPTS times in total.
+    # Workers refresh their running jobs every poll interval; a job not refreshed
+    # for JOB_LEASE_SECONDS (its server died, on any host) is queued again.
+    server_host: str = "127.0.0.1"
+    server_port: int = 8000
+    server_workers: int = 2
+    server_poll_interval_seconds: float = 2.0
+    server_keepalive_seconds: float = 15.0
+    job_max_attempts: int = 3
+    job_lease_seconds: float = 60.0
+
+    # Task branch retention: a background collector deletes the branches of tasks
+    # older than RETENTION_MAX_AGE_DAYS or beyond the newest RETENTION_MAX_TASKS
+    # (0 = no limit), then packs refs and prunes worktrees. Pinned results are kept.
+    retention_enabled: bool = True
+    retention_max_age_days: float = 30
+    retention_max_tasks: int = 1000
+    retention_interval_seconds: int = 600
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
 settings = Settings()
+
+def judge_models() -> List[str]:
+    """The configured models, in order and without duplicates."""
+    models = settings.judge_models or [settings.primary_model, settings.secondary_model]
+    return list(dict.fromkeys(models))
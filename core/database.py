@@ -1,20 +1,85 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker
 from core.config import settings
 
-# Depending on the connection string, we might need special args for SQLite
-connect_args = {}
-if settings.database_url.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
+is_sqlite = settings.database_url.startswith("sqlite")
 
-engine = create_engine(
-    settings.database_url, connect_args=connect_args
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bound to the engine on first use (see get_engine), so importing this module
+# does not open a connection pool or touch the database file.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def _create_engine():
+    # Depending on the connection string, we might need special args for SQLite
+    connect_args = {}
+    engine_kwargs = {}
+    if is_sqlite:
+        connect_args["check_same_thread"] = False
+        connect_args["timeout"] = settings.db_busy_timeout_seconds
+    else:
+        # Sized for the persistence writer plus concurrent history queries
+        engine_kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle_seconds,
+            pool_pre_ping=True,
+        )
+
+    engine = create_engine(
+        settings.database_url, connect_args=connect_args, **engine_kwargs
+    )
+
+    if is_sqlite:
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL lets readers (TUI history, cache lookups) run while the writer commits
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+    return engine
+
+def get_engine():
+    """The SQLAlchemy engine, created (and bound to SessionLocal) on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_engine()
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def __getattr__(name):
+    # `from core.database import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
+_tables_created = False
+_init_lock = threading.Lock()
+
+def init_db():
+    """Create database tables if they do not exist yet."""
+    global _tables_created
+    if _tables_created:
+        return
+    # Called from worker threads, so make sure only one of them runs create_all
+    with _init_lock:
+        if _tables_created:
+            return
+        # Import models so they register themselves on Base.metadata
+        import models.domain  # noqa: F401
+        Base.metadata.create_all(bind=get_engine())
+        _tables_created = True
+
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -0,0 +1,368 @@
+"""
+In-memory catalog of the repository's tracked files.
+
+Built from a single `git ls-files -z` and refreshed only when HEAD or the
+index changes (a few stat calls decide). A refresh patches the added and
+removed paths into the sorted path list instead of rebuilding it. Lookups
+stay cheap on repositories with 100k+ files: completion and directory
+expansion bisect the sorted list, and globs and fuzzy matches search one
+string of every path joined by newlines.
+
+    catalog = FileCatalog()
+    catalog.refresh()
+    catalog.expand(["engine/", "core/*.py", "README.md"])
+"""
+import bisect
+import os
+import posixpath
+import re
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+GLOB_CHARS = "*?["
+
+# Above this many added + removed paths the sorted list is rebuilt instead of patched
+INCREMENTAL_LIMIT = 1000
+
+# Matches ranked per fuzzy query; the first ones in path order are taken
+FUZZY_CANDIDATES = 2000
+
+# Sorts after every path that starts with a given prefix
+_PREFIX_END = "\U0010ffff"
+
+
+@dataclass
+class FileSelection:
+    """What a list of paths, directories and globs expands to."""
+    files: List[str] = field(default_factory=list)
+    # Literal paths the catalog doesn't know: new files, or typos
+    unknown: List[str] = field(default_factory=list)
+    # Globs and directories that matched nothing
+    empty: List[str] = field(default_factory=list)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Regex source matching one line of the path blob: `*`, `?` and `[...]`
+    stay within a directory, `**` crosses directories.
+    """
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:[^\n]*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append("[^\n]*")
+            i += 2
+            continue
+        c = pattern[i]
+        if c == "*":
+            out.append("[^/\n]*")
+        elif c == "?":
+            out.append("[^/\n]")
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            # A negated class must not match the blob's separators either
+            out.append(f"[^/\n{body[1:]}]" if body[:1] in ("!", "^") else f"[{body}]")
+            i = end + 1
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def _parent_dirs(path: str) -> List[str]:
+    parts = path.split("/")[:-1]
+    return ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _count_dirs(paths: List[str]) -> Dict[str, int]:
+    """Directory -> number of files below it."""
+    dirs: Dict[str, int] = {}
+    for path in paths:
+        for d in _parent_dirs(path):
+            dirs[d] = dirs.get(d, 0) + 1
+    return dirs
+
+
+class FileCatalog:
+    """
+    Tracked files of the repository at `repo_path` (the working directory by
+    default), as paths relative to it. refresh() may run in a worker thread
+    while other threads look up: it swaps in new structures instead of
+    changing the ones readers hold.
+    """
+
+    def __init__(self, repo_path: Optional[str] = None):
+        self.repo_path = os.path.abspath(repo_path or os.getcwd())
+        self.paths: List[str] = []
+        # False until the first refresh succeeds (e.g. outside a git repository)
+        self.ready = False
+        self._path_set: Set[str] = set()
+        self._dirs: Dict[str, int] = {}
+        # Search structures derived from one `paths` list, built on first use:
+        # "blob" ("\n".join(paths)), "folded" (its lower-case copy) and "starts"
+        # (the offset each path starts at). Keyed by the list, so a reader
+        # racing a refresh never caches structures of the old list as new.
+        self._derived: Dict[str, object] = {"paths": self.paths}
+        self._git_dir: Optional[str] = None
+        self._common_dir: Optional[str] = None
+        self._stamp: Optional[Tuple] = None
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._path_set
+
+    def is_dir(self, path: str) -> bool:
+        return path.rstrip("/") in self._dirs
+
+    # --- Refreshing ---
+
+    def _locate(self) -> bool:
+        try:
+            out = subprocess.run(
+                ["git", "rev-parse", "--absolute-git-dir", "--git-common-dir"],
+                cwd=self.repo_path, capture_output=True, text=True, check=True,
+            ).stdout.split("\n")
+        except (OSError, subprocess.CalledProcessError):
+            return False
+        self._git_dir = out[0]
+        self._common_dir = os.path.join(self.repo_path, out[1]) if not os.path.isabs(out[1]) else out[1]
+        return True
+
+    def _current_stamp(self) -> Tuple:
+        """Changes whenever HEAD moves or the index is rewritten."""
+        stamp = []
+        files = [os.path.join(self._git_dir, "HEAD"), os.path.join(self._git_dir, "index")]
+        try:
+            with open(files[0], "r") as f:
+                head = f.read().strip()
+            if head.startswith("ref: "):
+                files.append(os.path.join(self._common_dir, head[len("ref: "):]))
+                files.append(os.path.join(self._common_dir, "packed-refs"))
+        except OSError:
+            pass
+        for path in files:
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _ls_files(self) -> List[str]:
+        out = subprocess.run(
+            ["git", "ls-files", "-z"], cwd=self.repo_path, capture_output=True, check=True,
+        ).stdout
+        return [p for p in out.decode("utf-8", "surrogateescape").split("\0") if p]
+
+    def refresh(self) -> bool:
+        """Re-read the file list if HEAD or the index changed. Returns whether anything changed."""
+        with self._refresh_lock:
+            if self._git_dir is None and not self._locate():
+                return False
+            stamp = self._current_stamp()
+            if self.ready and stamp == self._stamp:
+                return False
+            try:
+                listed = self._ls_files()
+            except (OSError, subprocess.CalledProcessError):
+                return False
+            self._stamp = stamp
+
+            new_set = set(listed)
+            if not self.ready:
+                self._swap(sorted(new_set), new_set, _count_dirs(listed))
+                return True
+            added = new_set - self._path_set
+            removed = self._path_set - new_set
+            if not added and not removed:
+                return False
+            if len(added) + len(removed) > INCREMENTAL_LIMIT:
+                self._swap(sorted(new_set), new_set, _count_dirs(listed))
+                return True
+
+            paths = list(self.paths)
+            dirs = dict(self._dirs)
+            for path in removed:
+                del paths[bisect.bisect_left(paths, path)]
+                for d in _parent_dirs(path):
+                    dirs[d] -= 1
+                    if not dirs[d]:
+                        del dirs[d]
+            for path in added:
+                bisect.insort(paths, path)
+                for d in _parent_dirs(path):
+                    dirs[d] = dirs.get(d, 0) + 1
+            self._swap(paths, new_set, dirs)
+            return True
+
+    def _swap(self, paths: List[str], path_set: Set[str], dirs: Dict[str, int]):
+        self.paths, self._path_set, self._dirs = paths, path_set, dirs
+        self.ready = True
+
+    def _view(self) -> Dict[str, object]:
+        derived = self._derived
+        paths = self.paths
+        if derived["paths"] is not paths:
+            derived = self._derived = {"paths": paths}
+        return derived
+
+    def _get_blob(self, view: Dict[str, object]) -> str:
+        if "blob" not in view:
+            view["blob"] = "\n".join(view["paths"])
+        return view["blob"]
+
+    def _get_folded(self, view: Dict[str, object]) -> Optional[str]:
+        """The lower-case blob, or None if lower-casing changed its length (offsets would not line up)."""
+        if "folded" not in view:
+            blob = self._get_blob(view)
+            folded = blob.lower()
+            view["folded"] = folded if len(folded) == len(blob) else None
+        return view["folded"]
+
+    def _get_starts(self, view: Dict[str, object]) -> List[int]:
+        if "starts" not in view:
+            starts, offset = [], 0
+            for path in view["paths"]:
+                starts.append(offset)
+                offset += len(path) + 1
+            view["starts"] = starts
+        return view["starts"]
+
+    def _search_lines(self, view: Dict[str, object], find, limit: int) -> List[str]:
+        """
+        Paths of the first `limit` lines of the view's blob in which find(pos)
+        locates a match at or after pos (returning its offset, or -1).
+        """
+        paths, starts = view["paths"], self._get_starts(view)
+        found = []
+        pos = 0
+        while len(found) < limit:
+            offset = find(pos)
+            if offset < 0:
+                break
+            i = bisect.bisect_right(starts, offset) - 1
+            found.append(paths[i])
+            # Continue on the next line so each path is reported once
+            if i + 1 >= len(starts):
+                break
+            pos = starts[i + 1]
+        return found
+
+    # --- Lookups ---
+
+    def normalize(self, token: str) -> str:
+        """A user-typed path relative to the repository: `./a//b` -> `a/b`, absolute paths inside it made relative."""
+        path = token.strip().replace(os.sep, "/")
+        if os.path.isabs(path):
+            rel = os.path.relpath(path, self.repo_path).replace(os.sep, "/")
+            if not rel.startswith(".."):
+                path = rel
+        trailing = "/" if path.endswith("/") and len(path) > 1 else ""
+        path = posixpath.normpath(path) if path else path
+        return "" if path == "." else path + trailing
+
+    def under(self, directory: str) -> List[str]:
+        """Every file below `directory` ("" for the whole repository)."""
+        paths = self.paths
+        directory = directory.strip("/")
+        if not directory:
+            return list(paths)
+        prefix = directory + "/"
+        return paths[bisect.bisect_left(paths, prefix):bisect.bisect_left(paths, prefix + _PREFIX_END)]
+
+    def complete(self, prefix: str) -> Optional[str]:
+        """The longest path prefix that every file starting with `prefix` shares, like a shell's completion."""
+        paths = self.paths
+        lo = bisect.bisect_left(paths, prefix)
+        hi = bisect.bisect_left(paths, prefix + _PREFIX_END)
+        if lo == hi:
+            return None
+        return os.path.commonprefix([paths[lo], paths[hi - 1]])
+
+    def glob(self, pattern: str) -> List[str]:
+        # Only the files below the pattern's literal directories can match
+        literal = re.split(r"[*?\[]", pattern, 1)[0]
+        directory = literal.rsplit("/", 1)[0] if "/" in literal else ""
+        blob = "\n".join(self.under(directory)) if directory else self._get_blob(self._view())
+        return re.findall(f"^{glob_to_regex(pattern)}$", blob, re.M)
+
+    def fuzzy(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Paths matching `query` best: the query in the file name, then anywhere
+        in the path, then its characters in order (`dsptch` finds
+        engine/dispatcher.py). Case-insensitive unless the query has capitals.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        view = self._view()
+        case_sensitive = any(c.isupper() for c in query)
+        blob = None if case_sensitive else self._get_folded(view)
+        if blob is None:
+            blob = self._get_blob(view)
+            case_sensitive = True
+        fold = (lambda s: s) if case_sensitive else str.lower
+        q = fold(query)
+
+        candidates = self._search_lines(view, lambda pos: blob.find(q, pos), FUZZY_CANDIDATES)
+        if len(candidates) < limit and len(q) > 1:
+            scattered = re.compile("[^\n]*?".join(re.escape(c) for c in q))
+
+            def find_scattered(pos: int) -> int:
+                m = scattered.search(blob, pos)
+                return m.start() if m else -1
+
+            seen = set(candidates)
+            candidates += [p for p in self._search_lines(view, find_scattered, FUZZY_CANDIDATES) if p not in seen]
+
+        def rank(path: str):
+            name = fold(posixpath.basename(path))
+            return (not name.startswith(q), q not in name, q not in fold(path), path.count("/"), len(path), path)
+
+        return sorted(candidates, key=rank)[:limit]
+
+    def expand(self, tokens: List[str]) -> FileSelection:
+        """
+        Expand paths, directories (`engine/`) and globs (`core/*.py`,
+        `**/test_*.py`) into files, keeping their order without duplicates.
+        """
+        selection = FileSelection()
+        seen = set()
+
+        def add(paths: List[str]):
+            for path in paths:
+                if path not in seen:
+                    seen.add(path)
+                    selection.files.append(path)
+
+        for token in tokens:
+            path = self.normalize(token)
+            if not path and token.strip() not in (".", "./"):
+                continue
+            if any(c in path for c in GLOB_CHARS):
+                matched = self.glob(path)
+                if not matched:
+                    selection.empty.append(token)
+                add(matched)
+            elif path in self._path_set:
+                add([path])
+            elif path.endswith("/") or not path or self.is_dir(path):
+                matched = self.under(path)
+                if not matched:
+                    selection.empty.append(token)
+                add(matched)
+            else:
+                selection.unknown.append(path)
+                add([path])
+        return selection
@@ -1,25 +1,35 @@
 import os
+import socket
 import subprocess
 import shutil
+import threading
+import time
 import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from core.telemetry import span
 
 # We will use /tmp or a dedicated hidden folder for worktrees
 WORKTREE_BASE_DIR = os.path.join(os.getcwd(), ".ai_worktrees")
 
+# Pinned results: refs/pinned/<branch> keeps a task's branches out of retention (core/retention.py)
+PINNED_REF_PREFIX = "refs/pinned/"
+
 def _run_git_command(args: List[str], cwd: str = None) -> str:
     """Run a git command and return its output."""
     if cwd is None:
         cwd = os.getcwd()
     
     try:
-        result = subprocess.run(
-            ["git"] + args,
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        with span(f"git.{args[0]}") as s:
+            result = subprocess.run(
+                ["git"] + args,
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            s.attrs["bytes_out"] = len(result.stdout)
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
         print(f"Git command failed: git {' '.join(args)}")
@@ -52,15 +62,103 @@ def create_task_branch(task_id: str, base_branch: str = "main") -> str:
     _run_git_command(["branch", task_branch])
     return task_branch
 
-def create_model_worktree(task_id: str, model_name: str) -> dict:
+def clean_model_name_for_ref(model_name: str) -> str:
+    """Turn a LiteLLM model name into something usable in branch and directory names."""
+    return model_name.replace("/", "-").replace(":", "-")
+
+SPARSE_MODES = ("off", "cone", "pattern")
+
+def sparse_checkout_args(target_files: List[str], context_paths: List[str], mode: str) -> List[str]:
+    """
+    `git sparse-checkout set` arguments that limit a worktree to the target files.
+    "cone" checks out the target files' directories (plus the files at the
+    repository root) and keeps a sparse index, so the index doesn't list every
+    file of the repository; "pattern" checks out exactly the target files.
+    context_paths are added as directories (cone) or as patterns (pattern).
+    """
+    paths = [os.path.normpath(p).lstrip("/") for p in target_files]
+    paths = [p for p in paths if p != "." and not p.startswith("..")]
+    if mode == "cone":
+        dirs = {os.path.dirname(p) for p in paths}
+        dirs.update(os.path.normpath(p).strip("/") for p in context_paths)
+        return ["sparse-checkout", "set", "--cone", "--sparse-index"] + sorted(d for d in dirs if d and d != ".")
+    return ["sparse-checkout", "set", "--no-cone"] + ["/" + p for p in paths] + list(context_paths)
+
+def _worktree_gitdir(wt_path: str) -> str:
+    """The administrative directory of a linked worktree (.git/worktrees/<name>), read from its .git file."""
+    with open(os.path.join(wt_path, ".git"), "r") as f:
+        return f.read().strip()[len("gitdir: "):]
+
+def _is_sparse_worktree(wt_path: str) -> bool:
+    """Whether a linked worktree has sparse checkout enabled (read from its config, no git call)."""
+    try:
+        gitdir = _worktree_gitdir(wt_path)
+        with open(os.path.join(gitdir, "config.worktree"), "r") as f:
+            config = f.read().lower()
+    except OSError:
+        return False
+    return "sparsecheckout = true" in config
+
+# Worktrees under .ai_worktrees record the process that owns them, so a restart
+# can tell the leftovers of a dead process from those of another live one
+WORKTREE_OWNER_FILE = "els-owner"
+
+# Worktrees without an owner that are younger than this may still be being set up
+UNOWNED_GRACE_SECONDS = 60
+
+def process_owner() -> str:
+    """`<host>:<pid>` of this process."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """
+    Whether the process recorded as `owner` (see process_owner) still runs.
+    Processes on other hosts can't be checked and count as alive.
+    """
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def mark_worktree_owner(wt_path: str):
+    """Record this process as the owner of a linked worktree (next to its index, not in the checkout)."""
+    try:
+        with open(os.path.join(_worktree_gitdir(wt_path), WORKTREE_OWNER_FILE), "w") as f:
+            f.write(process_owner())
+    except OSError:
+        pass
+
+def worktree_orphaned(wt_path: str) -> bool:
+    """Whether a linked worktree was left behind by a process that no longer runs."""
+    try:
+        with open(os.path.join(_worktree_gitdir(wt_path), WORKTREE_OWNER_FILE), "r") as f:
+            return not owner_alive(f.read().strip())
+    except OSError:
+        pass
+    # No owner recorded (created by an older version, or a crash right after `worktree add`)
+    try:
+        return time.time() - os.path.getmtime(wt_path) > UNOWNED_GRACE_SECONDS
+    except OSError:
+        return True
+
+def create_model_worktree(task_id: str, model_name: str, sparse_args: Optional[List[str]] = None) -> dict:
     """
     Create a git worktree for a specific model to work in isolation.
     Returns the path to the worktree and the name of the branch.
+    With sparse_args (see sparse_checkout_args) only those paths are checked out.
     """
     setup_worktree_dir()
     
     # Clean up model name for branch branch
-    clean_model_name = model_name.replace("/", "-").replace(":", "-")
+    clean_model_name = clean_model_name_for_ref(model_name)
     branch_name = f"task-{task_id}-{clean_model_name}"
     
     worktree_path = os.path.abspath(os.path.join(WORKTREE_BASE_DIR, branch_name))
@@ -69,7 +167,14 @@ def create_model_worktree(task_id: str, model_name: str) -> dict:
     _run_git_command(["branch", branch_name])
     
     # Add the worktree
-    _run_git_command(["worktree", "add", worktree_path, branch_name])
+    if sparse_args:
+        # Register it without a checkout, narrow it, then check out only what's left
+        _run_git_command(["worktree", "add", "--no-checkout", worktree_path, branch_name])
+        _run_git_command(sparse_args, cwd=worktree_path)
+        _run_git_command(["reset", "--hard"], cwd=worktree_path)
+    else:
+        _run_git_command(["worktree", "add", worktree_path, branch_name])
+    mark_worktree_owner(worktree_path)
     
     return {
         "branch_name": branch_name,
@@ -78,7 +183,8 @@ def create_model_worktree(task_id: str, model_name: str) -> dict:
 
 def commit_worktree_changes(worktree_path: str, commit_message: str):
     """Stage and commit all changes in the given worktree."""
-    _run_git_command(["add", "."], cwd=worktree_path)
+    # --sparse: new files may land outside a sparse worktree's checkout
+    _run_git_command(["add", "-A", "--sparse", "."], cwd=worktree_path)
     
     # Only commit if there are changes
     try:
@@ -99,6 +205,8 @@ def merge_model_branch(target_branch: str, base_branch: str = "main"):
     _run_git_command(["checkout", base_branch])
     _run_git_command(["merge", "--squash", target_branch])
     _run_git_command(["commit", "-m", f"Merged AI solution from {target_branch}"])
+    # A squash merge leaves no ancestry behind, so keep the result branch explicitly
+    _run_git_command(["update-ref", PINNED_REF_PREFIX + target_branch, target_branch])
 
 def cleanup_task_worktrees(task_id: str):
     """Remove all worktrees associated with a task_id."""
@@ -121,3 +229,124 @@ def cleanup_task_worktrees(task_id: str):
             # We'll keep the branches for now so the user can inspect them if needed
             # branch_name = parts[2].strip("[]")
             # _run_git_command(["branch", "-D", branch_name])
+
+
+class WorktreeSlots:
+    """
+    Bookkeeping of a worktree pool (core/async_git_manager.AsyncWorktreePool):
+    idle and handed-out slots per model, and the git commands that create and
+    reset them. Nothing here runs git.
+    Pool worktrees are named `pool-<model>-<id>` so cleanup_task_worktrees never touches them.
+    """
+
+    def __init__(self, size_per_model: int = 2, max_size: int = 8, max_idle_seconds: int = 3600):
+        self.size_per_model = size_per_model
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        # clean model name -> idle slots ({"worktree_path", "last_used"})
+        self._idle: Dict[str, List[dict]] = {}
+        # worktree path -> clean model name, for slots handed out by acquire()
+        self._in_use: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def slot_count(self) -> int:
+        return len(self._in_use) + sum(len(slots) for slots in self._idle.values())
+
+    def adopt_from_listing(self, porcelain_output: str) -> List[str]:
+        """Pick up pool worktrees left behind by a previous run (not those of other live processes)."""
+        adopted = []
+        for line in porcelain_output.split("\n"):
+            if not line.startswith("worktree "):
+                continue
+            wt_path = line[len("worktree "):].strip()
+            name = os.path.basename(wt_path)
+            if os.path.dirname(wt_path) != WORKTREE_BASE_DIR or not name.startswith("pool-"):
+                continue
+            if not worktree_orphaned(wt_path):
+                continue
+            mark_worktree_owner(wt_path)
+            model_key = name[len("pool-"):].rsplit("-", 1)[0]
+            with self._lock:
+                self._idle.setdefault(model_key, []).append({"worktree_path": wt_path, "last_used": time.time()})
+            adopted.append(wt_path)
+        return adopted
+
+    def new_slot_path(self, model_key: str) -> str:
+        setup_worktree_dir()
+        return os.path.abspath(os.path.join(WORKTREE_BASE_DIR, f"pool-{model_key}-{uuid.uuid4().hex[:6]}"))
+
+    def missing_slots(self, model_key: str) -> int:
+        with self._lock:
+            missing = self.size_per_model - len(self._idle.get(model_key, []))
+            return max(min(missing, self.max_size - self.slot_count()), 0)
+
+    def add_idle(self, model_key: str, wt_path: str):
+        with self._lock:
+            self._idle.setdefault(model_key, []).append({"worktree_path": wt_path, "last_used": time.time()})
+
+    def pop_stale(self) -> List[str]:
+        now = time.time()
+        stale = []
+        with self._lock:
+            for model_key, slots in self._idle.items():
+                fresh = []
+                for slot in slots:
+                    if now - slot["last_used"] > self.max_idle_seconds:
+                        stale.append(slot["worktree_path"])
+                    else:
+                        fresh.append(slot)
+                self._idle[model_key] = fresh
+        return stale
+
+    def take_idle(self, model_key: str) -> Optional[str]:
+        with self._lock:
+            slots = self._idle.get(model_key, [])
+            return slots.pop()["worktree_path"] if slots else None
+
+    def mark_in_use(self, wt_path: str, model_key: str):
+        with self._lock:
+            self._in_use[wt_path] = model_key
+
+    def unmark_in_use(self, wt_path: str) -> Optional[str]:
+        with self._lock:
+            return self._in_use.pop(wt_path, None)
+
+    def return_slot(self, model_key: str, wt_path: str) -> bool:
+        """Put a released slot back; returns False when the pool is full and it should be removed."""
+        with self._lock:
+            slots = self._idle.setdefault(model_key, [])
+            if len(slots) < self.size_per_model and self.slot_count() < self.max_size:
+                slots.append({"worktree_path": wt_path, "last_used": time.time()})
+                return True
+            return False
+
+    def pop_all_idle(self) -> List[str]:
+        with self._lock:
+            paths = [slot["worktree_path"] for slots in self._idle.values() for slot in slots]
+            self._idle.clear()
+        return paths
+
+    @staticmethod
+    def reset_commands(branch_name: str, base_branch: str, wt_path: str, sparse_args: Optional[List[str]] = None) -> List[List[str]]:
+        commands = [
+            ["reset", "--hard"],
+            ["clean", "-ffdx"],
+        ]
+        # Narrow (or widen) the checkout before switching, so only the new paths are written
+        if sparse_args:
+            commands.append(sparse_args)
+        elif _is_sparse_worktree(wt_path):
+            commands.append(["sparse-checkout", "disable"])
+        commands.append(["checkout", "-B", branch_name, base_branch])
+        return commands
+
+    @staticmethod
+    def slot_add_commands(wt_path: str, sparse: bool) -> List[List[str]]:
+        if not sparse:
+            return [["worktree", "add", "--detach", wt_path, "HEAD"]]
+        # Nothing but the root files until a task narrows it to its own paths
+        return [
+            ["worktree", "add", "--no-checkout", "--detach", wt_path, "HEAD"],
+            ["sparse-checkout", "set", "--cone", "--sparse-index"],
+            ["reset", "--hard"],
+        ]
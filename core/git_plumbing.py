@@ -0,0 +1,141 @@
+"""
+Git plumbing for worktree-less evaluation.
+
+Files are read straight from the object database through one long-lived
+`git cat-file --batch` process, and results are turned into commits with
+hash-object / mktree / commit-tree, so no checkout is ever written to disk.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from core.async_git_manager import _run_git_command
+
+
+class CatFileBatch:
+    """
+    A persistent `git cat-file --batch` process, shared by all requests of one
+    event loop. Starting the process and every request/response exchange on
+    its pipes happen under the same lock, so concurrent first reads start it
+    once.
+    """
+
+    def __init__(self, cwd: str = None):
+        self.cwd = cwd or os.getcwd()
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_started(self):
+        """Start the process, or restart it if it died. Called with self._lock held."""
+        if self._proc is not None and self._proc.returncode is None:
+            return
+        self._proc = await asyncio.create_subprocess_exec(
+            "git", "cat-file", "--batch",
+            cwd=self.cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    async def read(self, object_name: str) -> Optional[bytes]:
+        """Return the contents of `object_name` (e.g. `HEAD:path/to/file`), or None if missing."""
+        async with self._lock:
+            await self._ensure_started()
+            proc = self._proc
+            try:
+                proc.stdin.write(object_name.encode("utf-8") + b"\n")
+                await proc.stdin.drain()
+                header = (await proc.stdout.readline()).decode("utf-8").rstrip("\n")
+                if header.endswith(" missing") or header.endswith(" ambiguous"):
+                    return None
+                size = int(header.rsplit(" ", 1)[1])
+                data = await proc.stdout.readexactly(size + 1)
+            except BaseException:
+                # A half-read answer would be taken for the next one: start over
+                if proc.returncode is None:
+                    proc.kill()
+                self._proc = None
+                raise
+            return data[:-1]
+
+    async def close(self):
+        async with self._lock:
+            if self._proc is not None and self._proc.returncode is None:
+                self._proc.stdin.close()
+                await self._proc.wait()
+            self._proc = None
+
+
+_cat_file: Optional[CatFileBatch] = None
+_cat_file_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_cat_file() -> CatFileBatch:
+    """The shared reader for the current directory and event loop (its lock and pipes belong to one loop)."""
+    global _cat_file, _cat_file_loop
+    loop = asyncio.get_running_loop()
+    if _cat_file is None or _cat_file.cwd != os.getcwd() or _cat_file_loop is not loop:
+        _cat_file = CatFileBatch()
+        _cat_file_loop = loop
+    return _cat_file
+
+async def resolve_commit(rev: str = "HEAD") -> str:
+    return await _run_git_command(["rev-parse", "--verify", f"{rev}^{{commit}}"])
+
+async def read_snapshot(commit: str, paths: List[str]) -> Dict[str, Optional[str]]:
+    """Read `paths` at `commit` from the object database. Missing files map to None."""
+    cat_file = _get_cat_file()
+    snapshot = {}
+    for path in paths:
+        data = await cat_file.read(f"{commit}:{path}")
+        snapshot[path] = data.decode("utf-8") if data is not None else None
+    return snapshot
+
+async def _hash_blob(content: str) -> str:
+    return await _run_git_command(["hash-object", "-w", "--stdin"], input_data=content.encode("utf-8"))
+
+async def _ls_tree(tree: str) -> Dict[str, Tuple[str, str, str]]:
+    """Entries of a tree object: name -> (mode, type, sha)."""
+    output = await _run_git_command(["ls-tree", "-z", tree])
+    entries = {}
+    for record in output.split("\0"):
+        if not record:
+            continue
+        meta, name = record.split("\t", 1)
+        mode, obj_type, sha = meta.split(" ")
+        entries[name] = (mode, obj_type, sha)
+    return entries
+
+async def _build_tree(tree: Optional[str], changes: Dict[str, str]) -> str:
+    """Write a new tree equal to `tree` with `changes` (paths relative to it) applied."""
+    entries = await _ls_tree(tree) if tree else {}
+
+    direct = {}
+    nested: Dict[str, Dict[str, str]] = {}
+    for path, content in changes.items():
+        head, _, rest = path.partition("/")
+        if rest:
+            nested.setdefault(head, {})[rest] = content
+        else:
+            direct[head] = content
+
+    for name, content in direct.items():
+        mode = entries[name][0] if name in entries and entries[name][1] == "blob" else "100644"
+        entries[name] = (mode, "blob", await _hash_blob(content))
+
+    for name, sub_changes in nested.items():
+        subtree = entries[name][2] if name in entries and entries[name][1] == "tree" else None
+        entries[name] = ("040000", "tree", await _build_tree(subtree, sub_changes))
+
+    listing = "".join(f"{mode} {obj_type} {sha}\t{name}\0" for name, (mode, obj_type, sha) in entries.items())
+    return await _run_git_command(["mktree", "-z"], input_data=listing.encode("utf-8"))
+
+async def commit_changes(base_commit: str, changes: Dict[str, str], message: str, branch_name: str) -> str:
+    """
+    Create a commit on top of `base_commit` containing `changes` and point
+    `branch_name` at it, without a worktree or index. Returns the commit sha.
+    """
+    base_tree = await _run_git_command(["rev-parse", f"{base_commit}^{{tree}}"])
+    tree = await _build_tree(base_tree, changes)
+    commit = await _run_git_command(["commit-tree", tree, "-p", base_commit, "-m", message])
+    await _run_git_command(["update-ref", f"refs/heads/{branch_name}", commit], lock=True)
+    return commit
@@ -0,0 +1,212 @@
+"""
+Durable job queue for the HTTP service.
+
+Jobs live in the `jobs` table, so submissions survive a restart: a job that
+was running when the process died is queued again (up to JOB_MAX_ATTEMPTS)
+and resumes its task from the last completed stage (core/task_state.py).
+A process on this host is known dead once its pid is gone; one on another
+host once it stops refreshing its jobs' heartbeat for the lease time.
+Workers claim the oldest queued job with a conditional UPDATE, so several
+server processes can share one database. The methods of JobStore block on
+the database and are meant to be called through asyncio.to_thread.
+
+Progress of running jobs is kept in memory by JobEvents, which replays a
+job's events to late subscribers and fans new ones out to every listener.
+"""
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_, select, update
+
+from core.database import SessionLocal, init_db
+from core.git_manager import owner_alive, process_owner
+from models.domain import Job
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+# Events after which a job's stream ends
+TERMINAL_EVENTS = ("done", "failed")
+
+
+def job_to_dict(job: Job) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "target_files": job.target_files,
+        "prompt": job.prompt,
+        "task_id": job.task_id,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobStore:
+    """Queue operations on the jobs table."""
+
+    def __init__(self, max_attempts: int = 3, lease_seconds: float = 60.0):
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+    def enqueue(self, target_files: List[str], prompt: str) -> Dict[str, Any]:
+        init_db()
+        with SessionLocal() as db:
+            job = Job(id=uuid.uuid4().hex, status="queued", target_files=list(target_files), prompt=prompt, attempts=0, created_at=time.time())
+            db.add(job)
+            db.commit()
+            return job_to_dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        init_db()
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            return job_to_dict(job) if job is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        init_db()
+        with SessionLocal() as db:
+            query = select(Job).order_by(Job.created_at.desc()).limit(limit)
+            if status:
+                query = query.where(Job.status == status)
+            return [job_to_dict(job) for job in db.scalars(query)]
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job as running and return it, or None if the queue is empty."""
+        init_db()
+        with SessionLocal() as db:
+            while True:
+                job_id = db.scalars(
+                    select(Job.id).where(Job.status == "queued").order_by(Job.created_at).limit(1)
+                ).first()
+                if job_id is None:
+                    return None
+                # Only one worker (in any process) wins the queued -> running transition
+                now = time.time()
+                claimed = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", owner=process_owner(), started_at=now, heartbeat_at=now, attempts=Job.attempts + 1)
+                ).rowcount
+                db.commit()
+                if claimed:
+                    return job_to_dict(db.get(Job, job_id))
+
+    def assign_task(self, job_id: str, task_id: str):
+        self._update(job_id, task_id=task_id)
+
+    def finish(self, job_id: str, task_id: str, result: Dict[str, Any]):
+        self._update(job_id, status="done", task_id=task_id, result=result, error=None, finished_at=time.time())
+
+    def release(self, job_id: str):
+        """Put a running job back in the queue without counting the attempt."""
+        self._update(job_id, status="queued", owner=None, started_at=None, heartbeat_at=None, attempts=Job.attempts - 1)
+
+    def heartbeat(self, job_ids: List[str]):
+        """Mark the given jobs, still running in this process, as alive."""
+        if not job_ids:
+            return
+        init_db()
+        with SessionLocal() as db:
+            db.execute(
+                update(Job)
+                .where(Job.id.in_(job_ids), Job.status == "running", Job.owner == process_owner())
+                .values(heartbeat_at=time.time())
+            )
+            db.commit()
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, status="failed", error=error, finished_at=time.time())
+
+    def requeue_interrupted(self) -> int:
+        """
+        Queue again the jobs left running by a process that died, or fail them
+        once they have used up their attempts. A process died if owner_alive
+        says so (this host) or its heartbeat is older than the lease (any host).
+        Call before starting workers and then periodically.
+        Returns the number of jobs queued again.
+        """
+        init_db()
+        with SessionLocal() as db:
+            owners = db.scalars(select(Job.owner).where(Job.status == "running").distinct()).all()
+            dead = [owner for owner in owners if owner and not owner_alive(owner)]
+            died_here = or_(Job.owner.in_(dead), Job.owner.is_(None))
+            lease_expired = Job.heartbeat_at < time.time() - self.lease_seconds
+            db.execute(
+                update(Job)
+                .where(Job.status == "running", or_(died_here, lease_expired), Job.attempts >= self.max_attempts)
+                .values(status="failed", error="Interrupted too many times", finished_at=time.time())
+            )
+            requeued = db.execute(
+                update(Job).where(Job.status == "running", died_here).values(status="queued", owner=None, started_at=None, heartbeat_at=None)
+            ).rowcount
+            # The worktrees and branches of another host's task are not here: its task starts over
+            requeued += db.execute(
+                update(Job).where(Job.status == "running", lease_expired).values(status="queued", owner=None, task_id=None, started_at=None, heartbeat_at=None)
+            ).rowcount
+            db.commit()
+            return requeued
+
+    def _update(self, job_id: str, **values):
+        init_db()
+        with SessionLocal() as db:
+            db.execute(update(Job).where(Job.id == job_id).values(**values))
+            db.commit()
+
+
+class JobEvents:
+    """
+    In-memory event streams of the jobs run by this process.
+
+    Every event is kept (progress events only as the latest one per model),
+    so a client that connects late still sees the whole run. A job's history
+    is dropped `keep_seconds` after its terminal event.
+    """
+
+    def __init__(self, keep_seconds: float = 300):
+        self.keep_seconds = keep_seconds
+        self._history: Dict[str, List[Dict[str, Any]]] = {}
+        self._progress: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+
+    def publish(self, job_id: str, event: str, data: Dict[str, Any]):
+        item = {"event": event, "data": data}
+        if event == "progress":
+            self._progress.setdefault(job_id, {})[data.get("model_name", "")] = item
+        else:
+            self._history.setdefault(job_id, []).append(item)
+        for queue in self._listeners.get(job_id, []):
+            queue.put_nowait(item)
+        if event in TERMINAL_EVENTS:
+            asyncio.get_running_loop().call_later(self.keep_seconds, self._forget, job_id)
+
+    def has(self, job_id: str) -> bool:
+        return job_id in self._history
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """A queue receiving the job's past events and then every new one."""
+        queue: asyncio.Queue = asyncio.Queue()
+        history = self._history.get(job_id, [])
+        # The latest progress per model goes before the job's final event
+        replay = [i for i in history if i["event"] not in TERMINAL_EVENTS]
+        replay += list(self._progress.get(job_id, {}).values())
+        replay += [i for i in history if i["event"] in TERMINAL_EVENTS]
+        for item in replay:
+            queue.put_nowait(item)
+        self._listeners.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        listeners = self._listeners.get(job_id, [])
+        if queue in listeners:
+            listeners.remove(queue)
+        if not listeners:
+            self._listeners.pop(job_id, None)
+
+    def _forget(self, job_id: str):
+        self._history.pop(job_id, None)
+        self._progress.pop(job_id, None)
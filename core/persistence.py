@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from core.config import settings
+from core.database import SessionLocal, init_db
+from models.domain import Submission, ModelSuggestion
+
+logger = logging.getLogger("llm_consensus_engine.persistence")
+
+
+class WriteBehindQueue:
+    """
+    Persists finished tasks without making the caller wait for the database.
+
+    enqueue() only puts the record on an asyncio.Queue. A background worker
+    collects up to `batch_size` records (or whatever arrived within
+    `flush_interval` seconds) and inserts them in a single transaction on a
+    worker thread, so the event loop never blocks on the database.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, max_size: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def enqueue(self, task_id: str, prompt: str, target_files: List[str], model_results: List[Dict[str, Any]], report: str):
+        """Queue a finished task for persistence. Waits only if the queue is full."""
+        self._ensure_worker()
+        await self._queue.put({
+            "task_id": task_id,
+            "prompt": prompt,
+            "target_files": list(target_files),
+            "model_results": model_results,
+            "report": report,
+        })
+
+    async def _next_batch(self) -> List[dict]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Failed to persist {len(batch)} task(s): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _write_batch(batch: List[dict]):
+        init_db()
+        with SessionLocal() as db:
+            for item in batch:
+                submission = Submission(
+                    task_id=item["task_id"],
+                    prompt=item["prompt"],
+                    target_files=item["target_files"],
+                    markdown_report=item["report"],
+                )
+                submission.suggestions = [
+                    ModelSuggestion(
+                        model_name=r["model_name"],
+                        branch_name=r.get("branch_name"),
+                        explanation=r.get("explanation"),
+                        diff_text=r.get("diff_text"),
+                    )
+                    for r in item["model_results"]
+                ]
+                db.add(submission)
+            db.commit()
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Flush pending records and stop the background worker."""
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._queue = None
+
+
+persistence_queue = WriteBehindQueue(
+    batch_size=settings.persist_batch_size,
+    flush_interval=settings.persist_flush_interval_seconds,
+    max_size=settings.persist_queue_max_size,
+)
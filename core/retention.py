@@ -0,0 +1,200 @@
+"""
+Retention of task branches.
+
+Every task leaves `task-<id>` and `task-<id>-<model>` branches behind. A
+background collector deletes whole tasks once they are older than
+RETENTION_MAX_AGE_DAYS or beyond the newest RETENTION_MAX_TASKS, keeping
+tasks that are running, checked out in a worktree, or pinned (merged or
+selected results, see pin_branch in core/async_git_manager.py). Deletions
+are batched through `git update-ref --stdin`, followed by `pack-refs` and
+`worktree prune`, so loose refs don't pile up and slow git down. The journal
+rows of failed and interrupted tasks older than RETENTION_MAX_AGE_DAYS are
+deleted at the same time (see prune_task_runs in core/task_state.py).
+
+    python -m core.retention --dry-run
+    python -m core.retention --pin task-1a2b3c4d-zai-glm-4.5-flash
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from core.async_git_manager import (
+    checked_out_branches,
+    delete_refs,
+    list_refs,
+    pack_refs,
+    pin_branch,
+    prune_worktrees,
+    ref_creation_times,
+    unpin_branch,
+)
+from core.config import settings
+from core.git_manager import PINNED_REF_PREFIX
+from core.task_state import prune_task_runs
+
+TASK_REF_PREFIX = "refs/heads/task-"
+
+
+@dataclass
+class TaskRefs:
+    """The branches of one task."""
+    task_id: str
+    # refname -> object id
+    refs: Dict[str, str] = field(default_factory=dict)
+    # Unix time the task's first branch was created
+    created: float = 0.0
+    pinned: bool = False
+
+
+def task_id_of(branch_or_ref: str) -> Optional[str]:
+    """`1a2b3c4d` for task-1a2b3c4d, task-1a2b3c4d-<model> and their refs/heads/ or refs/pinned/ forms."""
+    name = branch_or_ref
+    for prefix in ("refs/heads/", PINNED_REF_PREFIX):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    if not name.startswith("task-"):
+        return None
+    return name[len("task-"):].split("-", 1)[0] or None
+
+
+def plan_retention(tasks: List[TaskRefs], now: float, max_age_seconds: float, max_tasks: int, protected: Set[str]) -> List[TaskRefs]:
+    """
+    Tasks to delete: older than max_age_seconds or beyond the newest max_tasks
+    (0 disables either limit). Pinned and protected tasks are never deleted,
+    but they do count towards max_tasks.
+    """
+    newest_first = sorted(tasks, key=lambda t: t.created, reverse=True)
+    expired = []
+    for rank, task in enumerate(newest_first):
+        if task.pinned or task.task_id in protected:
+            continue
+        too_old = max_age_seconds > 0 and now - task.created > max_age_seconds
+        too_many = max_tasks > 0 and rank >= max_tasks
+        if too_old or too_many:
+            expired.append(task)
+    return expired
+
+
+async def collect_task_refs() -> List[TaskRefs]:
+    """Group the task branches by task, with creation times and pins."""
+    refs = await list_refs([TASK_REF_PREFIX + "*", PINNED_REF_PREFIX])
+    tasks: Dict[str, TaskRefs] = {}
+    pinned: Set[str] = set()
+    committed: Dict[str, int] = {}
+    for refname, oid, commit_time in refs:
+        task_id = task_id_of(refname)
+        if task_id is None:
+            continue
+        if refname.startswith(PINNED_REF_PREFIX):
+            pinned.add(task_id)
+        else:
+            tasks.setdefault(task_id, TaskRefs(task_id)).refs[refname] = oid
+            committed[task_id] = max(committed.get(task_id, 0), commit_time)
+
+    created = await ref_creation_times([refname for task in tasks.values() for refname in task.refs])
+    for task in tasks.values():
+        times = [created[r] for r in task.refs if r in created]
+        # No reflog (e.g. after a clone or an interrupted deletion): fall back to
+        # the newest commit, which is a model's result committed during the task
+        task.created = min(times) if times else committed[task.task_id] or time.time()
+        task.pinned = task.task_id in pinned
+    return list(tasks.values())
+
+
+class RetentionManager:
+    """
+    Runs the branch collector in the background, at most once every
+    `interval_seconds`, after tasks finish. Tasks registered with
+    task_started() are protected until task_finished().
+    """
+
+    def __init__(self, max_age_days: float = 30, max_tasks: int = 1000, interval_seconds: float = 600, enabled: bool = True):
+        self.max_age_days = max_age_days
+        self.max_tasks = max_tasks
+        self.interval_seconds = interval_seconds
+        self.enabled = enabled
+        self.active: Set[str] = set()
+        self._last_run = 0.0
+        self._running: Optional[asyncio.Task] = None
+
+    def task_started(self, task_id: str):
+        self.active.add(task_id)
+
+    def task_finished(self, task_id: str):
+        self.active.discard(task_id)
+        self.schedule()
+
+    def schedule(self):
+        """Start a background run if one is due and none is in progress."""
+        if not self.enabled or (self._running is not None and not self._running.done()):
+            return
+        if self._last_run and time.monotonic() - self._last_run < self.interval_seconds:
+            return
+        self._last_run = time.monotonic()
+        self._running = asyncio.create_task(self._run_quietly())
+
+    async def _run_quietly(self):
+        try:
+            await self.run()
+        except Exception as e:
+            print(f"[RETENTION] Branch collection failed: {type(e).__name__}: {e}")
+
+    async def close(self):
+        """Wait for a background run to finish; cancelling it mid-way could leave git's lock files behind."""
+        if self._running is not None:
+            await self._running
+            self._running = None
+
+    async def run(self, dry_run: bool = False) -> Dict[str, int]:
+        """Delete expired tasks' branches and journals, pack refs and prune worktrees. Returns counts."""
+        tasks = await collect_task_refs()
+        protected = set(self.active)
+        protected.update(filter(None, (task_id_of(ref) for ref in await checked_out_branches())))
+        expired = plan_retention(tasks, time.time(), self.max_age_days * 86400, self.max_tasks, protected)
+
+        summary = {"tasks": len(tasks), "expired_tasks": len(expired), "deleted_refs": 0, "pruned_journals": 0}
+        if dry_run:
+            for task in expired:
+                print(f"[RETENTION] would delete {', '.join(r[len('refs/heads/'):] for r in sorted(task.refs))}")
+            return summary
+
+        if expired:
+            summary["deleted_refs"] = await delete_refs({r: oid for task in expired for r, oid in task.refs.items()})
+            print(f"[RETENTION] Deleted {summary['deleted_refs']} branch(es) of {len(expired)} task(s)")
+        await pack_refs()
+        await prune_worktrees()
+        if self.max_age_days > 0:
+            summary["pruned_journals"] = await asyncio.to_thread(prune_task_runs, self.max_age_days * 86400)
+            if summary["pruned_journals"]:
+                print(f"[RETENTION] Deleted the journals of {summary['pruned_journals']} failed or interrupted task(s)")
+        return summary
+
+
+retention = RetentionManager(
+    max_age_days=settings.retention_max_age_days,
+    max_tasks=settings.retention_max_tasks,
+    interval_seconds=settings.retention_interval_seconds,
+    enabled=settings.retention_enabled,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete old task branches and pack refs")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the branches that would be deleted")
+    parser.add_argument("--pin", metavar="BRANCH", help="Keep this result branch (and its task) forever")
+    parser.add_argument("--unpin", metavar="BRANCH", help="Let retention delete this branch's task again")
+    args = parser.parse_args()
+
+    if args.pin:
+        asyncio.run(pin_branch(args.pin))
+    elif args.unpin:
+        asyncio.run(unpin_branch(args.unpin))
+    else:
+        summary = asyncio.run(retention.run(dry_run=args.dry_run))
+        print(f"{summary['tasks']} task(s), {summary['expired_tasks']} expired, {summary['deleted_refs']} branch(es) deleted, {summary['pruned_journals']} task journal(s) deleted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Crash-safe task stages.
+
+process_submission (engine/dispatcher.py) records each stage of a task in the
+database as soon as it completes:
+
+    task:   started -> branch_created (worktree mode) | snapshot_read (in_memory) -> reported
+    model:  worktree_ready -> responded -> committed -> diffed
+
+Raw model responses are stored as they arrive, under the same key as the
+response cache. If the process dies, its tasks stay `running` with a dead
+owner. Running such a task again with the same task_id resumes it: models
+that were committed or diffed are not run again, the others replay their
+stored responses instead of calling the model, and a reported task just
+returns its stored result. See resume_interrupted_tasks in engine/dispatcher.py.
+
+The journal is best-effort: if the database can't be written, the task
+goes on without it and just can't be resumed. Failed and interrupted tasks'
+rows are deleted by prune_task_runs (run by branch retention).
+
+The blocking methods are meant to be called through asyncio.to_thread; the
+async ones already are.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.database import SessionLocal, init_db
+from core.git_manager import owner_alive, process_owner
+from models.domain import TaskModelRun, TaskResponse, TaskRun
+
+logger = logging.getLogger("llm_consensus_engine.task_state")
+
+TASK_STAGES = ("started", "branch_created", "snapshot_read", "reported")
+MODEL_STAGES = ("worktree_ready", "responded", "committed", "diffed")
+
+# The journal of the task running in this context; run_llm_review replays and
+# records responses through it
+current_journal: contextvars.ContextVar[Optional["TaskJournal"]] = contextvars.ContextVar("current_journal", default=None)
+
+
+def task_run_to_dict(run: TaskRun) -> Dict[str, Any]:
+    return {
+        "task_id": run.task_id,
+        "status": run.status,
+        "stage": run.stage,
+        "target_files": run.target_files,
+        "prompt": run.prompt,
+        "evaluation_mode": run.evaluation_mode,
+        "models": run.models,
+        "base_ref": run.base_ref,
+        "owner": run.owner,
+        "result": run.result,
+        "error": run.error,
+        "created_at": run.created_at,
+        "updated_at": run.updated_at,
+    }
+
+
+def interrupted_tasks() -> List[Dict[str, Any]]:
+    """Running tasks whose process no longer runs, oldest first."""
+    init_db()
+    with SessionLocal() as db:
+        runs = db.scalars(select(TaskRun).where(TaskRun.status == "running").order_by(TaskRun.created_at))
+        return [task_run_to_dict(run) for run in runs if not owner_alive(run.owner)]
+
+
+def prune_task_runs(max_age_seconds: float) -> int:
+    """
+    Delete failed and interrupted tasks (with their model stages and stored
+    responses) not updated for max_age_seconds. Returns the number of tasks deleted.
+    """
+    init_db()
+    with SessionLocal() as db:
+        runs = db.scalars(
+            select(TaskRun).where(TaskRun.status.in_(("failed", "running")), TaskRun.updated_at < time.time() - max_age_seconds)
+        ).all()
+        task_ids = [run.task_id for run in runs if run.status == "failed" or not owner_alive(run.owner)]
+        if not task_ids:
+            return 0
+        for table in (TaskResponse, TaskModelRun, TaskRun):
+            db.execute(delete(table).where(table.task_id.in_(task_ids)))
+        db.commit()
+        return len(task_ids)
+
+
+class TaskJournal:
+    """
+    The stages of one task. Everything is loaded once by open(); each write
+    is committed before the async method returns, so a recorded stage
+    survives a crash right after it. With enabled=False nothing is stored.
+    """
+
+    def __init__(self, task_id: str, enabled: bool = True):
+        self.task_id = task_id
+        self.enabled = enabled
+        self.task: Dict[str, Any] = {}
+        # model name -> {"stage", "branch_name", "worktree_path", "explanation", "diff_text"}
+        self.models: Dict[str, Dict[str, Any]] = {}
+        # model name -> request key -> raw response
+        self.responses: Dict[str, Dict[str, str]] = {}
+
+    @property
+    def resumed(self) -> bool:
+        return self.task.get("stage", "started") != "started" or bool(self.models)
+
+    def open(self, target_files: List[str], prompt: str, evaluation_mode: str, models: List[str]):
+        """
+        Start the task, or take over an earlier run of it, whose submission
+        and stages are loaded instead. Raises RuntimeError if another live
+        process is running it. If the database can't be read or written, the
+        task starts without a journal.
+        """
+        now = time.time()
+        owner = process_owner()
+        new_task = {
+            "task_id": self.task_id, "status": "running", "stage": "started",
+            "target_files": list(target_files), "prompt": prompt,
+            "evaluation_mode": evaluation_mode, "models": list(models), "base_ref": None,
+            "owner": owner, "result": None, "error": None, "created_at": now, "updated_at": now,
+        }
+        if not self.enabled:
+            self.task = new_task
+            return
+        try:
+            self._open(new_task)
+        except SQLAlchemyError as e:
+            self._disable(e)
+            self.task, self.models, self.responses = new_task, {}, {}
+
+    def _open(self, new_task: Dict[str, Any]):
+        owner = new_task["owner"]
+        now = new_task["created_at"]
+        init_db()
+        with SessionLocal() as db:
+            run = db.get(TaskRun, self.task_id)
+            if run is None:
+                db.add(TaskRun(**new_task))
+                db.commit()
+                self.task = new_task
+                return
+
+            if run.status != "done":
+                if run.status == "running" and run.owner != owner and owner_alive(run.owner):
+                    raise RuntimeError(f"Task {self.task_id} is running in {run.owner}")
+                # Only one process takes the task over
+                claimed = db.execute(
+                    update(TaskRun)
+                    .where(TaskRun.task_id == self.task_id, TaskRun.owner == run.owner, TaskRun.status == run.status)
+                    .values(status="running", owner=owner, error=None, updated_at=now)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    raise RuntimeError(f"Task {self.task_id} was taken over by another process")
+                db.refresh(run)
+            self.task = task_run_to_dict(run)
+
+            for row in db.scalars(select(TaskModelRun).where(TaskModelRun.task_id == self.task_id)):
+                self.models[row.model_name] = {
+                    "stage": row.stage,
+                    "branch_name": row.branch_name,
+                    "worktree_path": row.worktree_path,
+                    "explanation": row.explanation,
+                    "diff_text": row.diff_text,
+                }
+            for row in db.scalars(select(TaskResponse).where(TaskResponse.task_id == self.task_id).order_by(TaskResponse.id)):
+                self.responses.setdefault(row.model_name, {})[row.request_key] = row.content
+
+    def model(self, model_name: str) -> Dict[str, Any]:
+        """The recorded state of a model ({} if it never got to worktree_ready)."""
+        return self.models.get(model_name, {})
+
+    def model_stage_reached(self, model_name: str, stage: str) -> bool:
+        recorded = self.model(model_name).get("stage")
+        return recorded in MODEL_STAGES and MODEL_STAGES.index(recorded) >= MODEL_STAGES.index(stage)
+
+    def response(self, model_name: str, request_key: str) -> Optional[str]:
+        """A response stored by an earlier run of this task."""
+        return self.responses.get(model_name, {}).get(request_key)
+
+    async def stage(self, stage: str, **values):
+        """Record a task stage (and e.g. base_ref)."""
+        self.task.update(values, stage=stage)
+        await self._write(self._update_task, stage=stage, **values)
+
+    async def model_stage(self, model_name: str, stage: str, **values):
+        """Record a model's stage, with any of branch_name, worktree_path, explanation, diff_text."""
+        self.models.setdefault(model_name, {}).update(values, stage=stage)
+        await self._write(self._upsert_model, model_name, dict(values, stage=stage))
+
+    async def record_response(self, model_name: str, request_key: str, content: str):
+        if self.response(model_name, request_key) == content:
+            return
+        self.responses.setdefault(model_name, {})[request_key] = content
+        await self._write(self._insert_response, model_name, request_key, content)
+
+    async def finish(self, result: Dict[str, Any]):
+        """Mark the task reported. Its result is kept; per-model stages and responses are dropped."""
+        self.task.update(status="done", stage="reported", result=result)
+        await self._write(self._finish, result)
+
+    async def fail(self, error: str):
+        """A task that failed is not resumed on its own, but running it again (same task_id) still does."""
+        self.task.update(status="failed", error=error)
+        await self._write(self._update_task, status="failed", error=error)
+
+    async def _write(self, write, *args, **kwargs):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(write, *args, **kwargs)
+        except SQLAlchemyError as e:
+            self._disable(e)
+
+    def _disable(self, error: Exception):
+        """Go on without the journal after a database error."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        logger.warning(f"Task journal of {self.task_id} turned off, the task can't be resumed: {error}")
+
+    def _update_task(self, **values):
+        init_db()
+        with SessionLocal() as db:
+            db.execute(update(TaskRun).where(TaskRun.task_id == self.task_id).values(updated_at=time.time(), **values))
+            db.commit()
+
+    def _upsert_model(self, model_name: str, values: Dict[str, Any]):
+        init_db()
+        with SessionLocal() as db:
+            row = db.scalars(
+                select(TaskModelRun).where(TaskModelRun.task_id == self.task_id, TaskModelRun.model_name == model_name)
+            ).first()
+            if row is None:
+                row = TaskModelRun(task_id=self.task_id, model_name=model_name)
+                db.add(row)
+            for key, value in values.items():
+                setattr(row, key, value)
+            row.updated_at = time.time()
+            db.commit()
+
+    def _insert_response(self, model_name: str, request_key: str, content: str):
+        init_db()
+        with SessionLocal() as db:
+            db.add(TaskResponse(task_id=self.task_id, model_name=model_name, request_key=request_key, content=content, created_at=time.time()))
+            db.commit()
+
+    def _finish(self, result: Dict[str, Any]):
+        init_db()
+        with SessionLocal() as db:
+            db.execute(
+                update(TaskRun)
+                .where(TaskRun.task_id == self.task_id)
+                .values(status="done", stage="reported", result=result, error=None, updated_at=time.time())
+            )
+            db.execute(delete(TaskModelRun).where(TaskModelRun.task_id == self.task_id))
+            db.execute(delete(TaskResponse).where(TaskResponse.task_id == self.task_id))
+            db.commit()
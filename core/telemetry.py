@@ -0,0 +1,201 @@
+"""
+Spans and metrics for the stages of a task.
+
+    with span("llm.call", bytes_out=len(prompt)) as s:
+        ...
+        s.attrs["completion_tokens"] = 123
+
+Every span records its wall time plus optional byte and token counts.
+The task id and model name are taken from context variables, so spans
+opened deep inside git or the reviewers are still attributed to the right
+task and model, even across asyncio tasks. Finished spans feed per-stage
+metrics, which can be exported as JSON lines or in Prometheus text format.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger("llm_consensus_engine.telemetry")
+
+current_task_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_task_id", default=None)
+current_model: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_model", default=None)
+
+# Latency histogram buckets in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Numeric span attributes that are summed into counters
+COUNTED_ATTRS = ("bytes_in", "bytes_out", "prompt_tokens", "completion_tokens")
+
+
+@dataclass
+class Span:
+    name: str
+    task_id: Optional[str]
+    model: Optional[str]
+    start: float
+    duration: float = 0.0
+    status: str = "ok"
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _StageMetrics:
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+    counters: Dict[str, float] = field(default_factory=dict)
+
+
+class Telemetry:
+    """Collects finished spans and aggregates them per (stage, model)."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._lock = threading.Lock()
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        # Spans waiting for export_jsonl; the oldest are dropped if exports lag behind
+        self._unexported: Deque[Span] = deque(maxlen=max_spans)
+        self._metrics: Dict[Tuple[str, str], _StageMetrics] = {}
+
+    def record(self, finished: Span):
+        with self._lock:
+            self._spans.append(finished)
+            if settings.telemetry_jsonl_path:
+                self._unexported.append(finished)
+            metrics = self._metrics.setdefault((finished.name, finished.model or ""), _StageMetrics())
+            metrics.count += 1
+            metrics.seconds += finished.duration
+            if finished.status != "ok":
+                metrics.errors += 1
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if finished.duration <= bound:
+                    metrics.buckets[i] += 1
+            for attr in COUNTED_ATTRS:
+                value = finished.attrs.get(attr)
+                if isinstance(value, (int, float)):
+                    metrics.counters[attr] = metrics.counters.get(attr, 0) + value
+
+    def spans(self, task_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            return [s for s in self._spans if task_id is None or s.task_id == task_id]
+
+    def task_breakdown(self, task_id: str) -> List[Tuple[str, str, float, int]]:
+        """(stage, model, total seconds, span count) for one task, slowest first."""
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        for s in self.spans(task_id):
+            entry = totals.setdefault((s.name, s.model or ""), [0.0, 0])
+            entry[0] += s.duration
+            entry[1] += 1
+        rows = [(stage, model, seconds, int(n)) for (stage, model), (seconds, n) in totals.items()]
+        return sorted(rows, key=lambda r: r[2], reverse=True)
+
+    def export_jsonl(self, path: str):
+        """Append spans finished since the last export to `path`, one JSON object per line."""
+        with self._lock:
+            pending = list(self._unexported)
+            self._unexported.clear()
+        if not pending:
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            for s in pending:
+                f.write(json.dumps(asdict(s), default=str) + "\n")
+
+    def prometheus_text(self) -> str:
+        """All stage metrics in the Prometheus text exposition format."""
+        with self._lock:
+            items = sorted((key, _copy(m)) for key, m in self._metrics.items())
+
+        lines = [
+            "# HELP els_stage_duration_seconds Wall time spent per stage and model.",
+            "# TYPE els_stage_duration_seconds histogram",
+        ]
+        for (stage, model), m in items:
+            labels = f'stage="{_escape(stage)}",model="{_escape(model)}"'
+            for bound, n in zip(DURATION_BUCKETS, m.buckets):
+                lines.append(f'els_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'els_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {m.count}')
+            lines.append(f"els_stage_duration_seconds_sum{{{labels}}} {m.seconds:.6f}")
+            lines.append(f"els_stage_duration_seconds_count{{{labels}}} {m.count}")
+
+        lines += [
+            "# HELP els_stage_errors_total Spans that ended with an exception.",
+            "# TYPE els_stage_errors_total counter",
+        ]
+        for (stage, model), m in items:
+            lines.append(f'els_stage_errors_total{{stage="{_escape(stage)}",model="{_escape(model)}"}} {m.errors}')
+
+        for attr in COUNTED_ATTRS:
+            name = f"els_{attr}_total"
+            lines += [f"# HELP {name} Sum of {attr} recorded by spans.", f"# TYPE {name} counter"]
+            for (stage, model), m in items:
+                if attr in m.counters:
+                    lines.append(f'{name}{{stage="{_escape(stage)}",model="{_escape(model)}"}} {m.counters[attr]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the metrics to `path` atomically (node_exporter textfile style)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def export(self):
+        """Write the configured exports; called once a task has finished."""
+        try:
+            if settings.telemetry_jsonl_path:
+                self.export_jsonl(settings.telemetry_jsonl_path)
+            if settings.telemetry_prometheus_path:
+                self.write_prometheus(settings.telemetry_prometheus_path)
+        except OSError as e:
+            logger.warning(f"Failed to export telemetry: {e}")
+
+
+def _copy(m: _StageMetrics) -> _StageMetrics:
+    return _StageMetrics(m.count, m.errors, m.seconds, list(m.buckets), dict(m.counters))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+telemetry = Telemetry(max_spans=settings.telemetry_max_spans)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time the enclosed block as stage `name`; attributes can be added through the yielded span."""
+    current = Span(name=name, task_id=current_task_id.get(), model=current_model.get(), start=time.time(), attrs=attrs)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        if settings.telemetry_enabled:
+            telemetry.record(current)
+
+
+@contextmanager
+def task_context(task_id: Optional[str] = None, model: Optional[str] = None) -> Iterator[None]:
+    """Attribute spans opened inside the block to `task_id` and/or `model`."""
+    tokens = []
+    if task_id is not None:
+        tokens.append((current_task_id, current_task_id.set(task_id)))
+    if model is not None:
+        tokens.append((current_model, current_model.set(model)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
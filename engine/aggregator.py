@@ -1,44 +1,155 @@
-from typing import List, Dict, Any
+import difflib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Tuple
 
+from engine.diff_analyzer import ChangeBlock, parse_change_blocks
 
-def find_common_changes(model_results: List[Dict[str, Any]]) -> str:
+# Regions listed in the report summary; the rest are only counted
+MAX_REPORTED_REGIONS = 25
+
+
+@dataclass
+class ConsensusRegion:
+    """A line range of one file that several models changed."""
+    path: str
+    start: int
+    end: int
+    models: List[str]
+    # How alike the models' replacement text is, 0.0 - 1.0
+    similarity: float
+    # Models whose replacement text is identical to the most common one
+    agreeing_models: List[str] = field(default_factory=list)
+
+
+class IntervalIndex:
+    """
+    Change blocks indexed by file and original line range.
+
+    Intervals are kept sorted by start, so the groups of touching intervals
+    come out of one sweep. Building is O(n log n). Ranges are closed, so
+    adjacent edits count as touching the same region.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[Tuple[int, int, str, ChangeBlock]]] = {}
+        self._files: Dict[str, List[Tuple[int, int, str, ChangeBlock]]] = {}
+
+    def add(self, model_name: str, block: ChangeBlock):
+        self._pending.setdefault(block.path, []).append((block.old_start, block.old_end, model_name, block))
+
+    def _build(self):
+        for path, items in self._pending.items():
+            entries = self._files.setdefault(path, [])
+            entries.extend(items)
+            entries.sort(key=lambda e: (e[0], e[1]))
+        self._pending.clear()
+
+    def clusters(self):
+        """
+        Yield (path, start, end, members) for every maximal group of mutually
+        touching intervals, in file and line order.
+        """
+        if self._pending:
+            self._build()
+        for path in sorted(self._files):
+            members: List[Tuple[str, ChangeBlock]] = []
+            start = end = None
+            for s, e, model_name, block in self._files[path]:
+                if members and s > end:
+                    yield path, start, end, members
+                    members = []
+                if not members:
+                    start, end = s, e
+                end = max(end, e)
+                members.append((model_name, block))
+            if members:
+                yield path, start, end, members
+
+
+def _replacement_similarity(texts: Dict[str, str]) -> Tuple[float, List[str]]:
+    """
+    Score how alike the models' replacement texts are. Identical texts are
+    grouped by value first; each distinct text is then compared once against
+    the most common one, so a region costs O(distinct texts) comparisons
+    instead of all pairs.
+    """
+    counts = Counter(texts.values())
+    reference, _ = counts.most_common(1)[0]
+    agreeing = sorted(m for m, t in texts.items() if t == reference)
+
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(reference)
+    total = 0.0
+    for text, count in counts.items():
+        if text == reference:
+            ratio = 1.0
+        else:
+            matcher.set_seq1(text)
+            ratio = matcher.ratio()
+        total += ratio * count
+    return total / len(texts), agreeing
+
+
+def find_consensus_regions(model_results: List[Dict[str, Any]], min_models: int = 2) -> List[ConsensusRegion]:
+    """
+    Parse each model's diff into change blocks, index them by file and line
+    range, and return the regions edited by at least `min_models` models.
+    """
+    index = IntervalIndex()
+    for result in model_results:
+        for block in parse_change_blocks(result.get("diff_text") or ""):
+            index.add(result["model_name"], block)
+
+    regions = []
+    for path, start, end, members in index.clusters():
+        texts: Dict[str, List[str]] = {}
+        for model_name, block in members:
+            texts.setdefault(model_name, []).extend(block.added)
+        if len(texts) < min_models:
+            continue
+        similarity, agreeing = _replacement_similarity({m: "\n".join(lines) for m, lines in texts.items()})
+        regions.append(ConsensusRegion(
+            path=path,
+            start=start,
+            end=end,
+            models=sorted(texts),
+            similarity=similarity,
+            agreeing_models=agreeing if len(agreeing) > 1 else [],
+        ))
+    return regions
+
+
+def find_common_changes(model_results: List[Dict[str, Any]], max_regions: int = MAX_REPORTED_REGIONS) -> str:
     """
     Analyzes suggestions from multiple models to find common changes.
     Returns a text summary of what changes were agreed upon by multiple models.
+    Only the `max_regions` regions shared by the most models are listed.
     """
-    if len(model_results) == 0:
+    if len(model_results) < 2:
         return "Not enough model responses to compare."
 
-    # Collect all change reasons from each model
-    model_reasons = {}
-    for result in model_results:
-        name = result["model_name"]
-        suggestion = result["suggestion"]
-        reasons = [c.reason.lower().strip() for c in suggestion.changes]
-        model_reasons[name] = reasons
+    regions = find_consensus_regions(model_results)
+    if not regions:
+        return "No region was changed by more than one model."
 
-    # Find themes that appear in multiple models by simple keyword overlap
-    all_reasons = []
-    for result in model_results:
-        suggestion = result["suggestion"]
-        for change in suggestion.changes:
-            all_reasons.append({
-                "model": result["model_name"],
-                "reason": change.reason,
-                "line_range": change.line_range
-            })
-
-    if not all_reasons:
-        return "No specific changes identified."
-
-    # Group by which models suggested similar types of changes
-    model_names = [r["model_name"] for r in model_results]
     summary_parts = []
-    summary_parts.append(f"**{len(model_results)}** model responded with suggestions.\n")
-
-    for result in model_results:
-        suggestion = result["suggestion"]
-        n_changes = len(suggestion.changes)
-        summary_parts.append(f"- **{result['model_name']}**: {n_changes} change(s)")
+    summary_parts.append(f"**{len(regions)}** region(s) changed by more than one model.\n")
+    # Most shared and most alike first, then back in file order
+    listed = sorted(regions, key=lambda r: (-len(r.models), -r.similarity))[:max_regions]
+    listed.sort(key=lambda r: (r.path, r.start))
+    for region in listed:
+        # Report 1-based, inclusive line numbers of the original file
+        first = region.start + 1
+        last = max(region.end, first)
+        line_range = f"line {first}" if first == last else f"lines {first}-{last}"
+        line = f"- `{region.path}` {line_range}: {', '.join(region.models)} (similarity {region.similarity:.0%})"
+        if region.agreeing_models and len(region.agreeing_models) == len(region.models):
+            line += " - identical change"
+        elif region.agreeing_models:
+            line += f" - identical in {', '.join(region.agreeing_models)}"
+        summary_parts.append(line)
+    if len(regions) > len(listed):
+        summary_parts.append(f"- ... and {len(regions) - len(listed)} more region(s)")
 
     return "\n".join(summary_parts)
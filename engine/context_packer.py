@@ -0,0 +1,231 @@
+import ast
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger("llm_consensus_engine.context_packer")
+
+# Lines of context kept around keyword hits in non-Python files
+WINDOW_CONTEXT_LINES = 20
+
+# Rough chars-per-token ratio used when the model's tokenizer is unavailable
+FALLBACK_CHARS_PER_TOKEN = 4
+
+ELIDED_MARKER_RE = re.compile(r"^\s*(?:#\s*)?\[els-elided (\d+):[^\]]*\]\s*$")
+
+ELISION_INSTRUCTIONS = (
+    "\n\nSome files are shown only partially to fit the context window. "
+    "Lines of the form `[els-elided N: ...]` stand for unchanged code that was left out. "
+    "When you output such a file, keep every one of those lines exactly as it is; "
+    "they will be expanded back to the original code."
+)
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "add", "all",
+    "use", "make", "should", "please", "code", "file", "files", "function",
+    "functions", "class", "classes", "method", "methods", "improve", "change",
+}
+
+
+@dataclass
+class PackedFile:
+    path: str
+    text: str
+    # marker id -> original source the marker stands for
+    elided: Dict[int, str] = field(default_factory=dict)
+
+
+def count_tokens(model_name: str, text: str) -> int:
+    """Token count for `text` with the model's tokenizer, or a chars/4 estimate."""
+    try:
+        # Imported here: litellm is slow to import and only needed once a review runs
+        from litellm import token_counter
+        return token_counter(model=model_name, text=text)
+    except Exception:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN
+
+
+def context_budget(model_name: str) -> int:
+    """Tokens available for file contents in one request to `model_name`."""
+    if model_name in settings.context_token_budgets:
+        return settings.context_token_budgets[model_name]
+    if settings.context_token_budget > 0:
+        return settings.context_token_budget
+    try:
+        from litellm import get_max_tokens
+        max_tokens = get_max_tokens(model_name)
+        if max_tokens:
+            # Leave the rest of the window for instructions and the model's answer
+            return int(max_tokens * settings.context_budget_fraction)
+    except Exception:
+        pass
+    return settings.context_fallback_token_budget
+
+
+def instruction_keywords(instruction: str) -> Set[str]:
+    words = re.findall(r"[A-Za-z_][A-Za-z0-9_]{2,}", instruction)
+    return {w.lower() for w in words if w.lower() not in _STOPWORDS}
+
+
+def _mentions(text: str, keywords: Set[str]) -> bool:
+    lowered = text.lower()
+    return any(k in lowered for k in keywords)
+
+
+class _Slicer:
+    """Builds a sliced view of one file, replacing irrelevant regions with markers."""
+
+    def __init__(self, source: str):
+        self.lines = source.splitlines(keepends=True)
+        self.elided: Dict[int, str] = {}
+
+    def marker(self, start: int, end: int, label: str, indent: str = "", comment: str = "") -> str:
+        """Elide lines[start:end] (0-based, end exclusive) and return the marker line."""
+        marker_id = len(self.elided) + 1
+        self.elided[marker_id] = "".join(self.lines[start:end])
+        return f"{indent}{comment}[els-elided {marker_id}: {label} lines {start + 1}-{end}]\n"
+
+    def python(self, keywords: Set[str]) -> str:
+        tree = ast.parse("".join(self.lines))
+        out: List[str] = []
+        cursor = self._python_body(tree.body, keywords, 0, out)
+        out.extend(self.lines[cursor:])
+        return "".join(out)
+
+    def _python_body(self, nodes: List[ast.stmt], keywords: Set[str], cursor: int, out: List[str]) -> int:
+        for node in nodes:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+            end = node.end_lineno
+            out.extend(self.lines[cursor:start])
+            segment = "".join(self.lines[start:end])
+
+            if _mentions(node.name, keywords):
+                # The instruction names this definition: keep it whole
+                out.extend(self.lines[start:end])
+            elif isinstance(node, ast.ClassDef) and _mentions(segment, keywords):
+                # Keep the class shell, slice its methods
+                first = node.body[0]
+                body_start = min([first.lineno] + [d.lineno for d in getattr(first, "decorator_list", [])]) - 1
+                out.extend(self.lines[start:body_start])
+                body_cursor = self._python_body(node.body, keywords, body_start, out)
+                out.extend(self.lines[body_cursor:end])
+            elif _mentions(segment, keywords):
+                out.extend(self.lines[start:end])
+            else:
+                indent = re.match(r"\s*", self.lines[start]).group(0)
+                kind = "class" if isinstance(node, ast.ClassDef) else "def"
+                out.append(self.marker(start, end, f"{kind} {node.name}", indent=indent, comment="# "))
+            cursor = end
+        return cursor
+
+    def windows(self, keywords: Set[str]) -> str:
+        keep = [False] * len(self.lines)
+        for i, line in enumerate(self.lines):
+            if _mentions(line, keywords):
+                for j in range(max(0, i - WINDOW_CONTEXT_LINES), min(len(self.lines), i + WINDOW_CONTEXT_LINES + 1)):
+                    keep[j] = True
+
+        out: List[str] = []
+        i = 0
+        while i < len(self.lines):
+            if keep[i]:
+                out.append(self.lines[i])
+                i += 1
+                continue
+            j = i
+            while j < len(self.lines) and not keep[j]:
+                j += 1
+            out.append(self.marker(i, j, "unchanged"))
+            i = j
+        return "".join(out)
+
+
+def slice_file(path: str, source: str, instruction: str) -> PackedFile:
+    """Cut `source` down to the regions relevant to the instruction."""
+    keywords = instruction_keywords(instruction)
+    slicer = _Slicer(source)
+    text = None
+    if path.endswith(".py"):
+        try:
+            text = slicer.python(keywords)
+        except SyntaxError:
+            slicer = _Slicer(source)
+    if text is None:
+        text = slicer.windows(keywords)
+    return PackedFile(path=path, text=text, elided=slicer.elided)
+
+
+def pack_context(model_name: str, target_files: List[str], file_contents: Dict[str, Optional[str]], instruction: str, token_counts: Optional[Dict[str, int]] = None) -> Tuple[str, Dict[str, PackedFile]]:
+    """
+    Build the files section of the prompt within the model's token budget.
+    Files are sent whole when they fit; otherwise the largest files are sliced
+    first until the payload fits. `token_counts` are the contents' counts if
+    the caller already has them. Returns (files_context, packed files by path).
+    """
+    budget = context_budget(model_name)
+    packed: Dict[str, PackedFile] = {}
+    tokens: Dict[str, int] = {}
+    for path in target_files:
+        content = file_contents.get(path)
+        if content is None:
+            continue
+        packed[path] = PackedFile(path=path, text=content)
+        tokens[path] = token_counts[path] if token_counts and path in token_counts else count_tokens(model_name, content)
+
+    total = sum(tokens.values())
+    for path in sorted(tokens, key=tokens.get, reverse=True):
+        if total <= budget:
+            break
+        sliced = slice_file(path, file_contents[path], instruction)
+        if not sliced.elided:
+            continue
+        sliced_tokens = count_tokens(model_name, sliced.text)
+        logger.info(f"Sliced {path} for {model_name}: {tokens[path]} -> {sliced_tokens} tokens")
+        total += sliced_tokens - tokens[path]
+        tokens[path] = sliced_tokens
+        packed[path] = sliced
+
+    if total > budget:
+        logger.warning(f"Context for {model_name} is {total} tokens, above its budget of {budget}")
+
+    parts = []
+    for path in target_files:
+        parts.append(f"--- {path} ---\n")
+        if path in packed:
+            parts.append(packed[path].text)
+        else:
+            parts.append("(File does not exist yet)")
+        parts.append("\n\n")
+    return "".join(parts), packed
+
+
+def merge_packed_file(packed: PackedFile, new_content: str) -> Optional[str]:
+    """
+    Expand elision markers in a model's output back to the original code.
+    Returns None if the model dropped markers, since writing the result would
+    silently delete code the model never saw.
+    """
+    if not packed.elided:
+        return new_content
+
+    out: List[str] = []
+    seen: Set[int] = set()
+    for line in new_content.splitlines(keepends=True):
+        match = ELIDED_MARKER_RE.match(line)
+        if match and int(match.group(1)) in packed.elided:
+            marker_id = int(match.group(1))
+            seen.add(marker_id)
+            out.append(packed.elided[marker_id])
+        else:
+            out.append(line)
+
+    missing = set(packed.elided) - seen
+    if missing:
+        logger.warning(f"Output for {packed.path} dropped elided regions {sorted(missing)}; not applying it")
+        return None
+    return "".join(out)
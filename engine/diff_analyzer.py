@@ -1,17 +1,148 @@
-import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from engine.line_diff import DEFAULT_ALGORITHM, diff_opcodes, group_opcodes
 
-def generate_unified_diff(original: str, suggested: str) -> str:
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# File and hunk header lines; everything a diff index needs without reading hunk bodies
+_INDEX_LINE_RE = re.compile(r"^(?:diff --git a/(.*) b/.*|--- .*\n\+\+\+ (?:b/)?(.*)|(@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@.*))$", re.MULTILINE)
+# Word-diff tokens: runs of word characters, runs of whitespace, single other characters
+_WORD_RE = re.compile(r"\w+|\s+|[^\w\s]")
+
+# (changed, text) piece of a line in a word diff
+Segment = Tuple[bool, str]
+
+
+@dataclass
+class ChangeBlock:
+    """
+    One contiguous run of removed/added lines in a file.
+    `old_start` is the 0-based index of the first replaced line in the original
+    file; `old_end` is exclusive, so a pure insertion has old_start == old_end.
+    """
+    path: str
+    old_start: int
+    old_end: int
+    removed: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Hunk:
+    """
+    One hunk of a line diff. Starts are 0-based line indexes; `lines` are
+    (tag, text) pairs with tag " " (context), "-" or "+".
+    """
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    lines: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def header(self) -> str:
+        return f"@@ -{_format_range(self.old_start, self.old_count)} +{_format_range(self.new_start, self.new_count)} @@"
+
+    def text(self) -> str:
+        return "\n".join([self.header] + [tag + text for tag, text in self.lines])
+
+    def word_diffs(self, algorithm: str = DEFAULT_ALGORITHM) -> Iterator[Tuple[int, int, List[Segment], List[Segment]]]:
+        """(removed line index, added line index, their word_diff segments) for each changed line pair."""
+        for old, new in pair_changed_lines([tag for tag, _ in self.lines]).items():
+            yield (old, new) + word_diff(self.lines[old][1], self.lines[new][1], algorithm)
+
+
+def _format_range(start: int, count: int) -> str:
+    """A hunk header range the way diff and git print it: "-N" for one line, "-N,0" after line N for none."""
+    if count == 1:
+        return str(start + 1)
+    return f"{start + 1 if count else start},{count}"
+
+
+def iter_hunks(original: str, suggested: str, context: int = 3, algorithm: str = DEFAULT_ALGORITHM) -> Iterator[Hunk]:
+    """
+    Diff two texts line by line (engine/line_diff.py) and yield the hunks
+    one at a time; lines are only copied into a hunk when it is reached.
+    """
+    old_lines = original.splitlines()
+    new_lines = suggested.splitlines()
+    if old_lines == new_lines:
+        return
+    for group in group_opcodes(diff_opcodes(old_lines, new_lines, algorithm), context):
+        _, i1, _, j1, _ = group[0]
+        _, _, i2, _, j2 = group[-1]
+        hunk = Hunk(old_start=i1, old_count=i2 - i1, new_start=j1, new_count=j2 - j1)
+        for tag, a1, a2, b1, b2 in group:
+            if tag == "equal":
+                hunk.lines.extend((" ", line) for line in old_lines[a1:a2])
+                continue
+            hunk.lines.extend(("-", line) for line in old_lines[a1:a2])
+            hunk.lines.extend(("+", line) for line in new_lines[b1:b2])
+        yield hunk
+
+
+def iter_unified_diff(original: str, suggested: str, fromfile: str = 'original', tofile: str = 'improved', context: int = 3, algorithm: str = DEFAULT_ALGORITHM) -> Iterator[str]:
+    """The lines of a unified diff (without line endings), produced hunk by hunk."""
+    started = False
+    for hunk in iter_hunks(original, suggested, context, algorithm):
+        if not started:
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+            started = True
+        yield hunk.header
+        for tag, text in hunk.lines:
+            yield tag + text
+
+
+def generate_unified_diff(original: str, suggested: str, fromfile: str = 'original', tofile: str = 'improved', algorithm: str = DEFAULT_ALGORITHM) -> str:
     """Generates a unified diff string."""
-    diff_lines = list(difflib.unified_diff(
-        original.splitlines(),
-        suggested.splitlines(),
-        fromfile='original',
-        tofile='improved',
-        n=3,
-        lineterm=''
-    ))
-    return "\n".join(diff_lines) if diff_lines else "(No changes)"
+    diff_text = "\n".join(iter_unified_diff(original, suggested, fromfile, tofile, algorithm=algorithm))
+    return diff_text or "(No changes)"
+
+
+def pair_changed_lines(tags: List[str]) -> Dict[int, int]:
+    """
+    Pair each removed line with the added line at the same position in the
+    run of "+" lines that directly follows its run of "-" lines, by index.
+    """
+    pairs: Dict[int, int] = {}
+    index = 0
+    while index < len(tags):
+        if tags[index] != "-":
+            index += 1
+            continue
+        removed_start = index
+        while index < len(tags) and tags[index] == "-":
+            index += 1
+        added_start = index
+        while index < len(tags) and tags[index] == "+":
+            index += 1
+        for offset in range(min(added_start - removed_start, index - added_start)):
+            pairs[removed_start + offset] = added_start + offset
+    return pairs
+
+
+def word_diff(old: str, new: str, algorithm: str = DEFAULT_ALGORITHM) -> Tuple[List[Segment], List[Segment]]:
+    """
+    Intra-line diff of a changed line: both versions as (changed, text)
+    segments, compared word by word (runs of word characters, whitespace
+    and single punctuation marks).
+    """
+    old_tokens = _WORD_RE.findall(old)
+    new_tokens = _WORD_RE.findall(new)
+    old_segments: List[Segment] = []
+    new_segments: List[Segment] = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(old_tokens, new_tokens, algorithm):
+        changed = tag != "equal"
+        for segments, text in ((old_segments, "".join(old_tokens[i1:i2])), (new_segments, "".join(new_tokens[j1:j2]))):
+            if not text:
+                continue
+            if segments and segments[-1][0] == changed:
+                segments[-1] = (changed, segments[-1][1] + text)
+            else:
+                segments.append((changed, text))
+    return old_segments, new_segments
 
 
 def analyze_diff(original_code: str, suggested_code: str) -> str:
@@ -19,3 +150,190 @@ def analyze_diff(original_code: str, suggested_code: str) -> str:
     Returns a unified diff text between original and suggested code.
     """
     return generate_unified_diff(original_code, suggested_code)
+
+
+def generate_snapshot_diff(snapshot: Dict[str, Optional[str]], changes: Dict[str, str], algorithm: str = DEFAULT_ALGORITHM) -> str:
+    """
+    Diff in-memory file changes against the snapshot they were made on,
+    formatted like `git diff` so it reads the same as the worktree mode.
+    """
+    parts = []
+    for path in sorted(changes):
+        original = snapshot.get(path)
+        suggested = changes[path]
+        if original == suggested:
+            continue
+        diff_text = generate_unified_diff(
+            original or "",
+            suggested,
+            fromfile=f"a/{path}" if original is not None else "/dev/null",
+            tofile=f"b/{path}",
+            algorithm=algorithm,
+        )
+        if diff_text == "(No changes)":
+            continue
+        header = f"diff --git a/{path} b/{path}"
+        if original is None:
+            header += "\nnew file mode 100644"
+        parts.append(f"{header}\n{diff_text}")
+    return "\n".join(parts)
+
+
+@dataclass
+class HunkSpan:
+    """Where one hunk lives inside a diff text; the body is only sliced out when needed."""
+    header: str
+    start: int
+    end: int
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+
+    def body(self, diff_text: str) -> str:
+        """The hunk's lines, without the @@ header."""
+        return diff_text[self.start:self.end].split("\n", 1)[1] if "\n" in diff_text[self.start:self.end] else ""
+
+    def counts(self, diff_text: str) -> Tuple[int, int]:
+        """(added, removed) line counts."""
+        chunk = "\n" + diff_text[self.start:self.end]
+        return chunk.count("\n+"), chunk.count("\n-")
+
+
+@dataclass
+class FileSpan:
+    path: str
+    hunks: List[HunkSpan] = field(default_factory=list)
+
+
+def index_diff(diff_text: str) -> List[FileSpan]:
+    """
+    Index a (multi-file) unified diff by file and hunk with a single regex
+    pass over the header lines, so huge diffs can be browsed hunk by hunk.
+    """
+    files: List[FileSpan] = []
+    current: Optional[FileSpan] = None
+    last_hunk: Optional[HunkSpan] = None
+
+    # Offset where the open hunk's line counts run out; None until a header line needs it
+    hunk_end: Optional[int] = None
+
+    for match in _INDEX_LINE_RE.finditer(diff_text):
+        git_path, new_path, header = match.group(1), match.group(2), match.group(3)
+        if new_path is not None and last_hunk is not None:
+            # A removed "-- x" followed by an added "++ y" (SQL, Lua comments) looks like
+            # a file header; it only is one once the hunk has all its lines
+            if hunk_end is None:
+                hunk_end = _hunk_end(diff_text, last_hunk)
+            if match.start() < hunk_end:
+                continue
+        if header is None:
+            if last_hunk is not None:
+                # Anything before the next file header belongs to the previous hunk
+                last_hunk.end = match.start()
+                last_hunk = None
+            if git_path is not None:
+                current = FileSpan(path=git_path)
+                files.append(current)
+            elif new_path is not None and new_path != "/dev/null":
+                if current is None or current.hunks:
+                    current = FileSpan(path=new_path)
+                    files.append(current)
+                else:
+                    current.path = new_path
+            continue
+
+        if current is None:
+            current = FileSpan(path="")
+            files.append(current)
+        if last_hunk is not None:
+            last_hunk.end = match.start()
+        hunk_end = None
+        last_hunk = HunkSpan(
+            header=header,
+            start=match.start(),
+            end=len(diff_text),
+            old_start=int(match.group(4)),
+            old_count=int(match.group(5) or 1),
+            new_start=int(match.group(6)),
+            new_count=int(match.group(7) or 1),
+        )
+        current.hunks.append(last_hunk)
+    return files
+
+
+def _hunk_end(diff_text: str, hunk: HunkSpan) -> int:
+    """Offset just past the last body line of `hunk`, going by its header's line counts."""
+    old_left, new_left = hunk.old_count, hunk.new_count
+    pos = diff_text.find("\n", hunk.start) + 1
+    while pos and pos < len(diff_text) and (old_left > 0 or new_left > 0):
+        tag = diff_text[pos]
+        if tag in " -":
+            old_left -= 1
+        if tag in " +":
+            new_left -= 1
+        pos = diff_text.find("\n", pos) + 1
+    return pos or len(diff_text)
+
+
+def _diff_path(line: str) -> Optional[str]:
+    path = line[4:].split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+
+def parse_change_blocks(diff_text: str) -> List[ChangeBlock]:
+    """
+    Split a (multi-file) unified diff into change blocks, dropping context lines.
+    Works on `git diff` output as well as generate_unified_diff/generate_snapshot_diff.
+    """
+    blocks: List[ChangeBlock] = []
+    old_path = new_path = None
+    current: Optional[ChangeBlock] = None
+    old_line = 0
+    # Lines still expected in the current hunk, taken from its header
+    old_left = new_left = 0
+
+    for line in diff_text.splitlines():
+        if old_left <= 0 and new_left <= 0:
+            current = None
+            if line.startswith("--- "):
+                old_path = _diff_path(line)
+            elif line.startswith("+++ "):
+                new_path = _diff_path(line)
+            else:
+                header = _HUNK_HEADER_RE.match(line)
+                if header:
+                    old_line = int(header.group(1))
+                    old_left = int(header.group(2) or 1)
+                    new_left = int(header.group(4) or 1)
+                    # "-N,0" means the insertion goes after line N
+                    if old_left:
+                        old_line -= 1
+            continue
+
+        if line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        tag, text = (line[0], line[1:]) if line else (" ", "")
+        if tag == " ":
+            current = None
+            old_line += 1
+            old_left -= 1
+            new_left -= 1
+            continue
+        if current is None:
+            current = ChangeBlock(path=new_path or old_path or "", old_start=old_line, old_end=old_line)
+            blocks.append(current)
+        if tag == "-":
+            current.removed.append(text)
+            old_line += 1
+            old_left -= 1
+            current.old_end = old_line
+        else:
+            current.added.append(text)
+            new_left -= 1
+    return blocks
@@ -1,85 +1,420 @@
+import argparse
 import asyncio
+import subprocess
+import time
 import uuid
 import os
-from typing import Dict, Any, List
-from core.config import settings
-from engine.reviewers import run_llm_review
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from core.config import judge_models, settings
+from core.persistence import persistence_queue
+from core.retention import retention
+from core.task_state import TaskJournal, current_journal, interrupted_tasks
+from core.telemetry import span, task_context, telemetry
+from engine.reviewers import ProgressCallback
+from engine.sharding import run_sharded_review
 from engine.reporter import generate_markdown_report
-from core.git_manager import (
+from engine.diff_analyzer import generate_snapshot_diff
+from engine.file_store import MemoryFileStore
+from core.git_manager import SPARSE_MODES, clean_model_name_for_ref, sparse_checkout_args
+from core.git_plumbing import resolve_commit, read_snapshot, commit_changes
+from core.async_git_manager import (
     create_task_branch, 
     create_model_worktree, 
     commit_worktree_changes, 
     get_branch_diff, 
-    cleanup_task_worktrees
+    cleanup_task_worktrees,
+    delete_branches,
+    AsyncWorktreePool
 )
 
-async def _run_model_in_worktree(model_name: str, task_id: str, target_files: List[str], prompt: str) -> Dict[str, Any]:
-    # 1. Create a worktree and isolated branch for this model
-    wt_info = create_model_worktree(task_id, model_name)
+# Called as on_result(event) the moment each model finishes, see _model_event
+ResultCallback = Callable[[Dict[str, Any]], None]
+
+class ModelResponseError(Exception):
+    """A model returned no usable response; it counts as a failed model."""
+
+# Git runs through the async layer so both models' worktree setup, commits and
+# diffs proceed concurrently without freezing the event loop (and the TUI).
+worktree_pool = AsyncWorktreePool(
+    size_per_model=settings.worktree_pool_size_per_model,
+    max_size=settings.worktree_pool_max_size,
+    max_idle_seconds=settings.worktree_pool_max_idle_seconds,
+    sparse=settings.worktree_sparse_mode not in ("off", ""),
+)
+
+async def _release_worktree(worktree_path: str):
+    """
+    Release a worktree even if the model's task is cancelled meanwhile: a
+    cancelled fan-out straggler must not leave its task branch checked out.
+    """
+    release = asyncio.ensure_future(worktree_pool.release(worktree_path))
+    try:
+        await asyncio.shield(release)
+    except asyncio.CancelledError:
+        await release
+        raise
+
+def _sparse_args(target_files: List[str]) -> Optional[List[str]]:
+    """`git sparse-checkout set` arguments for WORKTREE_SPARSE_MODE, or None for a full checkout."""
+    mode = settings.worktree_sparse_mode
+    if mode in ("off", ""):
+        return None
+    if mode not in SPARSE_MODES:
+        print(f"Unknown WORKTREE_SPARSE_MODE {mode!r}, checking out the whole repository")
+        return None
+    return sparse_checkout_args(target_files, settings.worktree_sparse_context_paths, mode)
+
+def new_task_id() -> str:
+    return str(uuid.uuid4())[:8]
+
+async def _run_model_in_worktree(model_name: str, task_id: str, base_task_branch: str, target_files: List[str], prompt: str, on_progress: Optional[ProgressCallback], journal: TaskJournal) -> Dict[str, Any]:
+    record = journal.model(model_name)
+    if journal.model_stage_reached(model_name, "committed"):
+        # An interrupted run already committed this model's result to its branch
+        branch_name = record["branch_name"]
+        diff_text = record.get("diff_text")
+        if diff_text is None:
+            diff_text = await get_branch_diff(base_task_branch, branch_name)
+            await journal.model_stage(model_name, "diffed", diff_text=diff_text)
+        return {
+            "model_name": model_name,
+            "branch_name": branch_name,
+            "worktree_path": None,
+            "explanation": record["explanation"],
+            "diff_text": diff_text
+        }
+
+    # 1. Create (or take from the pool) a worktree and isolated branch for this model,
+    # checking out only the target files' paths in sparse mode
+    sparse_args = _sparse_args(target_files)
+    with span("worktree.acquire", sparse=sparse_args is not None):
+        if settings.worktree_pool_enabled:
+            wt_info = await worktree_pool.acquire(task_id, model_name, base_task_branch, sparse_args)
+        else:
+            wt_info = await create_model_worktree(task_id, model_name, sparse_args, base_task_branch)
     branch_name = wt_info["branch_name"]
     worktree_path = wt_info["worktree_path"]
     
-    # 2. Ask LLM to edit files in that physical directory
-    explanation = await run_llm_review(model_name, worktree_path, target_files, prompt)
-    
-    if not explanation:
-        explanation = "Model failed to return a valid response."
+    try:
+        await journal.model_stage(model_name, "worktree_ready", branch_name=branch_name, worktree_path=worktree_path)
+
+        # 2. Ask LLM to edit files in that physical directory (large submissions in concurrent shards).
+        # After a crash the journal replays the responses stored by the interrupted run.
+        explanation = await run_sharded_review(model_name, worktree_path, target_files, prompt, on_progress=on_progress)
         
-    # 3. Commit the changes
-    commit_worktree_changes(worktree_path, "AI Agent applied solution")
+        if not explanation:
+            raise ModelResponseError(f"{model_name} failed to return a valid response")
+        await journal.model_stage(model_name, "responded", explanation=explanation)
+            
+        # 3. Commit the changes
+        await commit_worktree_changes(worktree_path, "AI Agent applied solution")
+        await journal.model_stage(model_name, "committed")
+
+        # 4. Diff against the base task branch (read-only, runs alongside the other models)
+        diff_text = await get_branch_diff(base_task_branch, branch_name)
+        await journal.model_stage(model_name, "diffed", diff_text=diff_text)
+    finally:
+        # The branch holds the result, so the worktree can go back to the pool
+        with span("worktree.release"):
+            await _release_worktree(worktree_path)
     
     return {
         "model_name": model_name,
         "branch_name": branch_name,
         "worktree_path": worktree_path,
-        "explanation": explanation
+        "explanation": explanation,
+        "diff_text": diff_text
+    }
+
+async def _run_model_in_memory(model_name: str, task_id: str, base_commit: str, snapshot: Dict[str, Optional[str]], target_files: List[str], prompt: str, on_progress: Optional[ProgressCallback], journal: TaskJournal) -> Dict[str, Any]:
+    record = journal.model(model_name)
+    if journal.model_stage_reached(model_name, "diffed"):
+        return {
+            "model_name": model_name,
+            "branch_name": record.get("branch_name") or "",
+            "worktree_path": None,
+            "explanation": record["explanation"],
+            "diff_text": record["diff_text"]
+        }
+
+    # Every model edits its own copy-on-write view of the shared snapshot
+    # (replaying stored responses if an interrupted run got that far)
+    store = MemoryFileStore(snapshot)
+    explanation = await run_sharded_review(model_name, None, target_files, prompt, on_progress=on_progress, files=store)
+
+    if not explanation:
+        raise ModelResponseError(f"{model_name} failed to return a valid response")
+    await journal.model_stage(model_name, "responded", explanation=explanation)
+
+    # A branch is only materialized when asked for, straight from objects (no checkout)
+    branch_name = ""
+    if settings.in_memory_create_branches and store.changes:
+        branch_name = f"task-{task_id}-{clean_model_name_for_ref(model_name)}"
+        await commit_changes(base_commit, store.changes, "AI Agent applied solution", branch_name)
+        await journal.model_stage(model_name, "committed", branch_name=branch_name)
+
+    with span("diff.snapshot") as s:
+        diff_text = generate_snapshot_diff(snapshot, store.changes, settings.diff_algorithm)
+        s.attrs["bytes_out"] = len(diff_text)
+    await journal.model_stage(model_name, "diffed", diff_text=diff_text, branch_name=branch_name)
+
+    return {
+        "model_name": model_name,
+        "branch_name": branch_name,
+        "worktree_path": None,
+        "explanation": explanation,
+        "diff_text": diff_text
+    }
+
+def _required_successes(n_models: int) -> int:
+    """How many successful models satisfy the fan-out policy."""
+    policy = settings.fanout_policy
+    if policy == "first_k":
+        required = settings.fanout_k
+    elif policy == "quorum":
+        required = settings.fanout_quorum or n_models // 2 + 1
+    else:
+        required = n_models
+    return max(1, min(required, n_models))
+
+async def _traced_model(model_name: str, coro) -> Dict[str, Any]:
+    """Attribute every span opened while running `coro` to `model_name`."""
+    with task_context(model=model_name), span("model.total"):
+        return await coro
+
+def _model_result(res: Dict[str, Any]) -> Dict[str, Any]:
+    """The public part of a model run (no worktree paths)."""
+    return {
+        "model_name": res["model_name"],
+        "branch_name": res["branch_name"],
+        "explanation": res["explanation"],
+        "diff_text": res["diff_text"],
+        "seconds": res["seconds"],
     }
 
-async def process_submission(target_files: List[str], prompt: str) -> Dict[str, Any]:
+def _model_event(task_id: str, model_name: str, outcome: Any, seconds: float, pending: List[str]) -> Dict[str, Any]:
+    """
+    A per-model result event:
+    {"task_id", "model_name", "status": "completed" | "failed", "seconds",
+    "pending": models still running, "result": model result or None, "error": message or None}
+    """
+    failed = isinstance(outcome, Exception)
+    return {
+        "task_id": task_id,
+        "model_name": model_name,
+        "status": "failed" if failed else "completed",
+        "seconds": seconds,
+        "pending": pending,
+        "result": None if failed else _model_result(outcome),
+        "error": f"{type(outcome).__name__}: {outcome}" if failed else None,
+    }
+
+async def _fan_out(task_id: str, tasks: Dict[str, "asyncio.Task"], on_result: Optional[ResultCallback] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Wait for the model tasks until the fan-out policy is satisfied or the
+    deadline passes, then cancel the rest. Each model is reported to
+    on_result as soon as it finishes, in completion order.
+    Returns (result or exception per finished model, cancelled model names).
+    Cancelled tasks are awaited so their worktrees are released before returning.
+    """
+    required = _required_successes(len(tasks))
+    started = time.monotonic()
+    deadline = started + settings.fanout_deadline_seconds if settings.fanout_deadline_seconds > 0 else None
+    model_by_task = {task: model for model, task in tasks.items()}
+    pending = set(tasks.values())
+    finished: Dict[str, Any] = {}
+    successes = 0
+
+    while pending and successes < required:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                print(f"Fan-out deadline of {settings.fanout_deadline_seconds}s reached")
+                break
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        # Every model starts with the fan-out, so elapsed time is its run time
+        seconds = time.monotonic() - started
+        for task in done:
+            model = model_by_task[task]
+            try:
+                finished[model] = dict(task.result(), seconds=seconds)
+                successes += 1
+            except Exception as e:
+                finished[model] = e
+            if on_result:
+                still_running = [model_by_task[t] for t in tasks.values() if t in pending]
+                try:
+                    on_result(_model_event(task_id, model, finished[model], seconds, still_running))
+                except Exception as e:
+                    print(f"Result callback failed for {model}: {e}")
+
+    cancelled = [model_by_task[task] for task in pending]
+    for task in pending:
+        task.cancel()
+    if pending:
+        # Let the cancelled runs finish their cleanup (worktree release) right away
+        await asyncio.gather(*pending, return_exceptions=True)
+    return finished, cancelled
+
+async def process_submission(target_files: List[str], prompt: str, on_progress: Optional[ProgressCallback] = None, on_result: Optional[ResultCallback] = None, task_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Main orchestration function.
     Creates Git worktrees, runs models in parallel, commits their changes,
     extracts diffs, and returns the models' states for the user to review.
+    on_progress is forwarded to the reviewers to report streaming progress.
+    on_result receives a per-model event (see _model_event) as each model
+    finishes, before the slower models, cleanup and the report are done.
+
+    With EVALUATION_MODE=in_memory no worktrees are created: the target files
+    are read once from the object database and every model edits an in-memory copy.
+
+    Every stage is recorded as a telemetry span under the returned task_id,
+    and in the task journal (core/task_state.py). Passing the task_id of an
+    interrupted task resumes it from its last completed stage, with its own
+    submission (target_files and prompt are then ignored); the task_id of a
+    finished task returns its stored result.
     """
-    task_id = str(uuid.uuid4())[:8]
-    base_task_branch = create_task_branch(task_id)
+    task_id = task_id or new_task_id()
+    journal = TaskJournal(task_id, enabled=settings.task_journal_enabled)
+    await asyncio.to_thread(journal.open, target_files, prompt, settings.evaluation_mode, judge_models())
+    if journal.task["status"] == "done":
+        return journal.task["result"]
+    if journal.resumed:
+        stages = ", ".join(f"{m}: {r['stage']}" for m, r in journal.models.items()) or "no model finished a stage"
+        print(f"Resuming task {task_id} from {journal.task['stage']} ({stages})")
 
-    models = [settings.primary_model, settings.secondary_model]
+    # Running tasks are never collected; a finished task may trigger a background collection
+    retention.task_started(task_id)
+    # Model tasks inherit the journal, so their reviews store and replay responses
+    journal_token = current_journal.set(journal)
+    try:
+        with task_context(task_id=task_id), span("task.total"):
+            try:
+                return await _process_submission(journal, on_progress, on_result)
+            except Exception as e:
+                await journal.fail(f"{type(e).__name__}: {e}")
+                raise
+    finally:
+        current_journal.reset(journal_token)
+        retention.task_finished(task_id)
+        telemetry.export()
 
-    # 1. Run models concurrently in their own isolated Git worktrees
-    tasks = [
-        _run_model_in_worktree(m, task_id, target_files, prompt)
-        for m in models
-    ]
-    
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+async def _process_submission(journal: TaskJournal, on_progress: Optional[ProgressCallback], on_result: Optional[ResultCallback]) -> Dict[str, Any]:
+    task_id = journal.task_id
+    # A resumed task runs its original submission in its original mode
+    target_files = journal.task["target_files"]
+    prompt = journal.task["prompt"]
+    models = journal.task["models"]
+    in_memory = journal.task["evaluation_mode"] == "in_memory"
+
+    if in_memory:
+        # 1. Read the target files once and share the snapshot with every model
+        with span("snapshot.read") as s:
+            base_commit = journal.task["base_ref"] or await resolve_commit("HEAD")
+            snapshot = await read_snapshot(base_commit, target_files)
+            s.attrs["bytes_out"] = sum(len(c) for c in snapshot.values() if c is not None)
+        if journal.task["base_ref"] is None:
+            await journal.stage("snapshot_read", base_ref=base_commit)
+        tasks = {
+            m: asyncio.create_task(_traced_model(m, _run_model_in_memory(m, task_id, base_commit, snapshot, target_files, prompt, on_progress, journal)))
+            for m in models
+        }
+    else:
+        # Leftovers of crashed runs are cleaned up (once) before this task needs worktrees
+        await worktree_pool.reconcile()
+        base_task_branch = journal.task["base_ref"]
+        if base_task_branch is None:
+            base_task_branch = await create_task_branch(task_id)
+            await journal.stage("branch_created", base_ref=base_task_branch)
+
+        # 1. Run models concurrently in their own isolated Git worktrees
+        tasks = {
+            m: asyncio.create_task(_traced_model(m, _run_model_in_worktree(m, task_id, base_task_branch, target_files, prompt, on_progress, journal)))
+            for m in models
+        }
+
+    # 2. Wait only as long as the fan-out policy requires
+    try:
+        results, cancelled_models = await _fan_out(task_id, tasks, on_result)
+    except asyncio.CancelledError:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
 
     model_results = []
-    for model, res in zip(models, results):
+    for model in models:
+        if model in cancelled_models:
+            print(f"Model {model} cancelled ({settings.fanout_policy} policy or deadline met first)")
+            continue
+        res = results.get(model)
         if isinstance(res, Exception):
             print(f"Model {model} failed with exception: {res}")
-        else:
-            branch_name = res["branch_name"]
-            
-            # Since the model committed its changes to its branch, we diff against the base task branch
-            diff_text = get_branch_diff(base_task_branch, branch_name)
-            
-            model_results.append({
-                "model_name": res["model_name"],
-                "branch_name": branch_name,
-                "explanation": res["explanation"],
-                "diff_text": diff_text,
-            })
+        elif res is not None:
+            model_results.append(_model_result(res))
 
     # Optional: cleanup the physical worktree directories to save disk space
     # The branches containing the AI commits will remain in the repo
-    cleanup_task_worktrees(task_id)
+    if not in_memory:
+        with span("worktree.cleanup"):
+            await cleanup_task_worktrees(task_id)
+
+    # Cancelled models never produced a result, so their branches are dropped
+    if cancelled_models and (not in_memory or settings.in_memory_create_branches):
+        try:
+            await delete_branches([f"task-{task_id}-{clean_model_name_for_ref(m)}" for m in cancelled_models])
+        except subprocess.CalledProcessError:
+            pass
 
     # 3. Generate report
     report = generate_markdown_report(task_id, prompt, model_results)
 
-    return {
+    # 4. Persist in the background; the database write never delays the result
+    if settings.persist_results:
+        await persistence_queue.enqueue(task_id, prompt, target_files, model_results, report)
+
+    result = {
         "task_id": task_id,
         "model_results": model_results,
+        "cancelled_models": cancelled_models,
         "report": report
     }
+    await journal.finish(result)
+    return result
+
+async def resume_interrupted_tasks(on_result: Optional[ResultCallback] = None) -> List[Dict[str, Any]]:
+    """
+    Finish, one after another, the tasks left running by processes that died.
+    Each resumes from its last completed stage (see process_submission).
+    Returns their results; a task that fails again is reported and skipped.
+    """
+    results = []
+    for task in await asyncio.to_thread(interrupted_tasks):
+        try:
+            results.append(await process_submission(task["target_files"], task["prompt"], on_result=on_result, task_id=task["task_id"]))
+        except Exception as e:
+            print(f"Could not resume task {task['task_id']}: {type(e).__name__}: {e}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Resume tasks interrupted by a crash (from the TUI, batch runs or the server)")
+    parser.add_argument("--list", action="store_true", help="Only list the interrupted tasks")
+    args = parser.parse_args()
+
+    if args.list:
+        for task in interrupted_tasks():
+            print(f"{task['task_id']}  {task['stage']:<15} {task['evaluation_mode']:<10} {', '.join(task['target_files'])}")
+        return
+
+    async def run():
+        results = await resume_interrupted_tasks()
+        await persistence_queue.close()
+        await retention.close()
+        return results
+
+    for result in asyncio.run(run()):
+        print(f"Task {result['task_id']}: {len(result['model_results'])} model result(s), {len(result['cancelled_models'])} cancelled")
+
+if __name__ == "__main__":
+    main()
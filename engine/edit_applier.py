@@ -0,0 +1,204 @@
+import difflib
+import re
+from typing import List, Optional, Tuple
+
+# Minimum similarity for a fuzzy anchor match (difflib ratio over the whole block)
+FUZZY_MATCH_THRESHOLD = 0.9
+
+_SEARCH_RE = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[^\n]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class EditApplyError(Exception):
+    """An edit block could not be located in the file it targets."""
+
+
+def _split(text: str) -> List[str]:
+    return text.splitlines(keepends=True)
+
+
+def _indent_of(lines: List[str]) -> str:
+    for line in lines:
+        if line.strip():
+            return line[:len(line) - len(line.lstrip())]
+    return ""
+
+
+def _reindent(lines: List[str], old_indent: str, new_indent: str) -> List[str]:
+    if old_indent == new_indent:
+        return lines
+    out = []
+    for line in lines:
+        if line.startswith(old_indent):
+            out.append(new_indent + line[len(old_indent):])
+        else:
+            out.append(line)
+    return out
+
+
+def find_anchor(haystack: List[str], needle: List[str], hint: int = 0, unique: bool = False) -> Optional[Tuple[int, bool]]:
+    """
+    Locate `needle` (a block of lines) in `haystack`.
+    Tries an exact match, then one that ignores trailing whitespace, then one
+    that ignores indentation, then a fuzzy difflib match. Among several equal
+    candidates the one closest to `hint` wins; with unique=True several equal
+    candidates raise EditApplyError instead.
+    Returns (start_index, reindent_needed) or None.
+    """
+    if not needle:
+        return None
+    n = len(needle)
+    starts = range(len(haystack) - n + 1)
+
+    def closest(candidates: List[int]) -> Optional[int]:
+        return min(candidates, key=lambda i: abs(i - hint)) if candidates else None
+
+    for normalize, reindent in ((lambda s: s, False), (str.rstrip, False), (str.strip, True)):
+        wanted = [normalize(line) for line in needle]
+        first = wanted[0]
+        candidates = [
+            i for i in starts
+            if normalize(haystack[i]) == first and [normalize(line) for line in haystack[i:i + n]] == wanted
+        ]
+        if unique and len(candidates) > 1:
+            preview = "".join(needle[:3]).strip()
+            raise EditApplyError(f"Block matches {len(candidates)} places, expected one: {preview[:120]!r}")
+        match = closest(candidates)
+        if match is not None:
+            return match, reindent
+
+    # Fuzzy: compare whitespace-stripped windows of the same length
+    wanted_text = "\n".join(line.strip() for line in needle)
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(wanted_text)
+    best, best_ratio = None, FUZZY_MATCH_THRESHOLD
+    for i in starts:
+        matcher.set_seq1("\n".join(line.strip() for line in haystack[i:i + n]))
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio or (ratio == best_ratio and best is not None and abs(i - hint) < abs(best - hint)):
+            best, best_ratio = i, ratio
+    if best is not None:
+        return best, True
+    return None
+
+
+def _replace_block(lines: List[str], search: List[str], replace: List[str], hint: int = 0, unique: bool = False) -> Tuple[List[str], int]:
+    """Replace the block matching `search` with `replace`. Returns (new_lines, index after replacement)."""
+    found = find_anchor(lines, search, hint, unique)
+    if found is None:
+        preview = "".join(search[:3]).strip()
+        raise EditApplyError(f"Could not find block starting with: {preview[:120]!r}")
+    start, reindent = found
+    if reindent:
+        replace = _reindent(replace, _indent_of(search), _indent_of(lines[start:start + len(search)]))
+    return lines[:start] + replace + lines[start + len(search):], start + len(replace)
+
+
+def _ensure_newline(lines: List[str]) -> List[str]:
+    if lines and not lines[-1].endswith("\n"):
+        lines = lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def _restore_final_newline(original: str, result: str) -> str:
+    """Matching works on newline-terminated lines; don't add a final newline the file never had."""
+    if original and not original.endswith("\n") and result.endswith("\n"):
+        return result[:-1]
+    return result
+
+
+def apply_search_replace(original: str, body: str) -> str:
+    """
+    Apply SEARCH/REPLACE blocks:
+
+        <<<<<<< SEARCH
+        old lines
+        =======
+        new lines
+        >>>>>>> REPLACE
+
+    An empty SEARCH section appends to the file (or creates it). A SEARCH
+    section that matches more than one place is rejected rather than
+    guessed at.
+    """
+    blocks = _SEARCH_RE.findall(body)
+    if not blocks:
+        raise EditApplyError("No SEARCH/REPLACE blocks found")
+
+    lines = _ensure_newline(_split(original))
+    for search_text, replace_text in blocks:
+        search = _split(search_text)
+        replace = _split(replace_text)
+        if not search:
+            lines = _ensure_newline(lines) + replace
+            continue
+        lines, _ = _replace_block(lines, search, replace, unique=True)
+    return _restore_final_newline(original, "".join(lines))
+
+
+def _parse_hunks(body: str) -> List[Tuple[int, List[str], List[str]]]:
+    """Parse unified diff hunks into (old_start, old_lines, new_lines)."""
+    hunks = []
+    current = None
+    for raw in _split(body):
+        if raw.startswith(("--- ", "+++ ", "diff ", "index ")) and current is None:
+            continue
+        header = _HUNK_HEADER_RE.match(raw)
+        if header:
+            current = (max(int(header.group(1)) - 1, 0), [], [])
+            hunks.append(current)
+            continue
+        if current is None:
+            continue
+        if raw.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        tag, text = (raw[0], raw[1:]) if raw.strip("\n") else (" ", "\n")
+        if tag == " ":
+            current[1].append(text)
+            current[2].append(text)
+        elif tag == "-":
+            current[1].append(text)
+        elif tag == "+":
+            current[2].append(text)
+    return hunks
+
+
+def apply_unified_diff(original: str, body: str) -> str:
+    """
+    Apply unified diff hunks. Line numbers are only used as a hint: hunks are
+    located by their context, so slightly wrong headers still apply.
+    """
+    hunks = _parse_hunks(body)
+    if not hunks:
+        raise EditApplyError("No @@ hunks found")
+
+    lines = _ensure_newline(_split(original))
+    offset = 0
+    for old_start, old_lines, new_lines in hunks:
+        old_lines = _ensure_newline(old_lines)
+        new_lines = _ensure_newline(new_lines)
+        if not old_lines:
+            # Pure insertion (e.g. a new file): insert at the hinted position
+            at = min(old_start + offset, len(lines))
+            lines = lines[:at] + new_lines + lines[at:]
+            offset += len(new_lines)
+            continue
+        before = len(lines)
+        lines, _ = _replace_block(lines, old_lines, new_lines, hint=old_start + offset)
+        offset += len(lines) - before
+    return _restore_final_newline(original, "".join(lines))
+
+
+def apply_edit_block(kind: str, original: str, body: str) -> str:
+    """Apply an `edit` (search/replace) or `patch` (unified diff) block to `original`."""
+    if kind == "edit":
+        return apply_search_replace(original, body)
+    if kind == "patch":
+        return apply_unified_diff(original, body)
+    raise EditApplyError(f"Unknown edit block type: {kind}")
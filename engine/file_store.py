@@ -0,0 +1,91 @@
+import os
+from typing import Dict, List, Optional
+
+
+class WorktreeFileStore:
+    """Reads and writes files in a physical worktree checkout."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def read(self, path: str) -> Optional[str]:
+        full_path = os.path.join(self.root, path)
+        if not os.path.exists(full_path):
+            return None
+        with open(full_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def write(self, path: str, content: str):
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def open_write(self, path: str) -> "PartialFileWrite":
+        """Write a file piece by piece; it only replaces `path` on commit()."""
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return PartialFileWrite(full_path)
+
+
+class PartialFileWrite:
+    """Streams into a temporary file next to the target and renames it over the target on commit."""
+
+    def __init__(self, full_path: str):
+        self.full_path = full_path
+        self.tmp_path = f"{full_path}.els-partial"
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+
+    def write(self, text: str):
+        self._file.write(text)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.full_path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class MemoryFileStore:
+    """
+    Copy-on-write view over a shared, read-only snapshot of file contents.
+    Every model gets its own store over the same snapshot; writes only land
+    in `changes`, so nothing touches the filesystem.
+    """
+
+    def __init__(self, snapshot: Dict[str, Optional[str]]):
+        self.snapshot = snapshot
+        self.changes: Dict[str, str] = {}
+
+    def read(self, path: str) -> Optional[str]:
+        if path in self.changes:
+            return self.changes[path]
+        return self.snapshot.get(path)
+
+    def write(self, path: str, content: str):
+        self.changes[path] = content
+
+    def open_write(self, path: str) -> "PartialMemoryWrite":
+        """Write a file piece by piece; it only lands in `changes` on commit()."""
+        return PartialMemoryWrite(self, path)
+
+
+class PartialMemoryWrite:
+    """Collects the pieces of a file and joins them once on commit."""
+
+    def __init__(self, store: MemoryFileStore, path: str):
+        self.store = store
+        self.path = path
+        self._parts: List[str] = []
+
+    def write(self, text: str):
+        self._parts.append(text)
+
+    def commit(self):
+        self.store.write(self.path, "".join(self._parts))
+
+    def abort(self):
+        self._parts = []
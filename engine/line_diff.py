@@ -0,0 +1,351 @@
+"""
+Sequence diff over interned items.
+
+Both sides are interned to ints first, so every comparison is one int
+compare however long the line (minified or generated files). Each region
+still to be diffed is trimmed of its common prefix and suffix, then split
+by the first step of its algorithm's chain that finds anything:
+
+    histogram  the longest common run around the region's rarest line
+               (git's histogram diff); lines occurring more than MAX_CHAIN
+               times are never used as anchors
+    patience   every line unique to both sides, kept in order (longest
+               increasing subsequence)
+    myers      the shortest edit script; regions needing more than
+               MYERS_MAX_COST edits are left to the next step
+
+The pieces between anchors are diffed the same way. The last step of every
+chain is Myers with a cut-off: past MYERS_MAX_COST edits it keeps the path
+that got furthest and diffs the rest again, like git's xdiff does on
+expensive regions. Regions with nothing in common are plain replacements.
+"""
+from bisect import bisect_left
+from collections import Counter
+from operator import lt
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+ALGORITHMS = ("histogram", "patience", "myers")
+DEFAULT_ALGORITHM = "histogram"
+
+# Lines more frequent than this are not tried as histogram anchors
+MAX_CHAIN = 64
+
+# Edits after which Myers gives up on a region (its time and trace grow with
+# the square)
+MYERS_MAX_COST = 256
+
+# Regions larger than this (lines on both sides) are cut at their unique
+# lines before the histogram step, which rebuilds its index per region
+HISTOGRAM_MAX_REGION = 4096
+
+# (a start, b start, length) of a run of equal items
+Match = Tuple[int, int, int]
+# Matches found in a region, and whether the gaps between them are settled
+# (True) or still to be diffed
+Split = Tuple[List[Match], bool]
+# ("equal" | "replace" | "delete" | "insert", a start, a end, b start, b end)
+Opcode = Tuple[str, int, int, int, int]
+
+
+def intern_lines(*sequences: Sequence[Hashable]) -> List[List[int]]:
+    """The sequences with equal items mapped to the same int."""
+    ids: Dict[Hashable, int] = {}
+    setdefault = ids.setdefault
+    return [[setdefault(item, len(ids)) for item in sequence] for sequence in sequences]
+
+
+def _histogram(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> Optional[Split]:
+    """The longest common run whose rarest line is the rarest in a[alo:ahi]."""
+    occurrences: Dict[int, List[int]] = {}
+    for i in range(alo, ahi):
+        positions = occurrences.get(a[i])
+        if positions is None:
+            occurrences[a[i]] = [i]
+        else:
+            positions.append(i)
+
+    best: Optional[Match] = None
+    best_count = MAX_CHAIN + 1
+    j = blo
+    while j < bhi:
+        positions = occurrences.get(b[j])
+        next_j = j + 1
+        if positions is not None and len(positions) <= best_count:
+            for i in positions:
+                count = len(positions)
+                start_a, start_b = i, j
+                while start_a > alo and start_b > blo and a[start_a - 1] == b[start_b - 1]:
+                    start_a -= 1
+                    start_b -= 1
+                    count = min(count, len(occurrences[a[start_a]]))
+                end_a, end_b = i + 1, j + 1
+                while end_a < ahi and end_b < bhi and a[end_a] == b[end_b]:
+                    count = min(count, len(occurrences[a[end_a]]))
+                    end_a += 1
+                    end_b += 1
+                if best is None or count < best_count or (count == best_count and end_a - start_a > best[2]):
+                    best = (start_a, start_b, end_a - start_a)
+                    best_count = count
+                # The rest of this run can't start a better one
+                next_j = max(next_j, end_b)
+        j = next_j
+    return None if best is None else ([best], False)
+
+
+def _patience(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> Optional[Split]:
+    """The lines unique to both sides, as the longest run of them in the same order."""
+    a_counts = Counter(a[alo:ahi])
+    b_counts = Counter(b[blo:bhi])
+    # Last position in b; the only one for the lines that matter
+    b_positions = {item: j for j, item in enumerate(b[blo:bhi], blo)}
+    pairs = [
+        (i, b_positions[item]) for i, item in enumerate(a[alo:ahi], alo)
+        if a_counts[item] == 1 and b_counts.get(item) == 1
+    ]
+    if not pairs:
+        return None
+
+    b_order = [j for _, j in pairs]
+    if all(map(lt, b_order, b_order[1:])):
+        # Nothing moved: all of them are in order already
+        return _coalesce(a, b, pairs), False
+
+    # Longest increasing subsequence of the b positions, by patience sorting
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile:
+            previous[index] = tail_index[pile - 1]
+        if pile == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pile] = j
+            tail_index[pile] = index
+    chosen: List[Tuple[int, int]] = []
+    index = tail_index[-1]
+    while index >= 0:
+        chosen.append(pairs[index])
+        index = previous[index]
+    chosen.reverse()
+
+    return _coalesce(a, b, chosen), False
+
+
+def _coalesce(a: List[int], b: List[int], pairs: List[Tuple[int, int]]) -> List[Match]:
+    """Anchor lines as matches, merging neighbours whose gap is the same on both sides."""
+    anchors: List[Match] = []
+    for i, j in pairs:
+        if anchors:
+            start_a, start_b, size = anchors[-1]
+            end_a, end_b = start_a + size, start_b + size
+            if i - end_a == j - end_b and a[end_a:i] == b[end_b:j]:
+                anchors[-1] = (start_a, start_b, i + 1 - start_a)
+                continue
+        anchors.append((i, j, 1))
+    return anchors
+
+
+def _myers(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> Optional[Split]:
+    """The equal runs of a shortest edit script, or None if it needs over MYERS_MAX_COST edits."""
+    return _myers_search(a, alo, ahi, b, blo, bhi, cut=False)
+
+
+def _myers_cut(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> Split:
+    """
+    Last resort: the shortest edit script if it takes at most MYERS_MAX_COST
+    edits; otherwise the path that got furthest within them, up to where
+    it got. The rest of the region is diffed again.
+    """
+    return _myers_search(a, alo, ahi, b, blo, bhi, cut=True)
+
+
+def _myers_search(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int, cut: bool) -> Optional[Split]:
+    n, m = ahi - alo, bhi - blo
+    if set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+        return [], True
+    max_cost = min(n + m, MYERS_MAX_COST)
+    offset = max_cost + 1
+    # v[offset + k]: furthest x reached on diagonal k = x - y
+    v = [0] * (2 * max_cost + 3)
+    # v[offset - d - 1:offset + d + 2] as it was before step d
+    trace: List[List[int]] = []
+    for d in range(max_cost + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_matches(trace, n, m, alo, blo), True
+    if not cut:
+        return None
+
+    # The furthest point reached inside the region
+    x, k = max(
+        (v[offset + k], k) for k in range(-max_cost, max_cost + 1, 2)
+        if v[offset + k] <= n and 0 <= v[offset + k] - k <= m
+    )
+    # The zero-length match marks the cut, so both sides of it are diffed again
+    return _myers_matches(trace, x, x - k, alo, blo) + [(alo + x, blo + x - k, 0)], False
+
+
+def _myers_matches(trace: List[List[int]], x: int, y: int, alo: int, blo: int) -> List[Match]:
+    """Walk the trace back from (x, y) to (0, 0), collecting the diagonals (snakes)."""
+    matches: List[Match] = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        # v[d + 1 + k] is diagonal k as it was before step d
+        if k == -d or (k != d and v[d + k] < v[d + k + 2]):
+            prev_k = k + 1
+            prev_x = v[d + 1 + prev_k]
+            mid_x = prev_x
+        else:
+            prev_k = k - 1
+            prev_x = v[d + 1 + prev_k]
+            mid_x = prev_x + 1
+        if x > mid_x:
+            matches.append((alo + mid_x, blo + mid_x - k, x - mid_x))
+        x, y = prev_x, prev_x - prev_k
+    if x:
+        matches.append((alo, blo, x))
+    matches.reverse()
+    return matches
+
+
+def _common_prefix(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> int:
+    """Length of the common prefix, compared in doubling slices so long runs cost C loops."""
+    limit = min(ahi - alo, bhi - blo)
+    length, step = 0, 1
+    while length < limit:
+        step = min(step, limit - length)
+        if a[alo + length:alo + length + step] == b[blo + length:blo + length + step]:
+            length += step
+            step *= 2
+        elif step == 1:
+            break
+        else:
+            step //= 2
+    return length
+
+
+def _common_suffix(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> int:
+    limit = min(ahi - alo, bhi - blo)
+    length, step = 0, 1
+    while length < limit:
+        step = min(step, limit - length)
+        if a[ahi - length - step:ahi - length] == b[bhi - length - step:bhi - length]:
+            length += step
+            step *= 2
+        elif step == 1:
+            break
+        else:
+            step //= 2
+    return length
+
+
+_Step = Callable[[List[int], int, int, List[int], int, int], Optional[Split]]
+
+# Steps tried per region, until one finds something
+_CHAINS: Dict[str, Tuple[_Step, ...]] = {
+    "histogram": (_histogram, _patience, _myers_cut),
+    "patience": (_patience, _histogram, _myers_cut),
+    "myers": (_myers, _patience, _histogram, _myers_cut),
+}
+
+
+def matching_blocks(a: List[int], b: List[int], algorithm: str = DEFAULT_ALGORITHM) -> List[Match]:
+    """The equal runs of two interned sequences, in order and merged."""
+    chain = _CHAINS.get(algorithm, _CHAINS[DEFAULT_ALGORITHM])
+    matches: List[Match] = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        prefix = _common_prefix(a, alo, ahi, b, blo, bhi)
+        if prefix:
+            matches.append((alo, blo, prefix))
+            alo += prefix
+            blo += prefix
+        suffix = _common_suffix(a, alo, ahi, b, blo, bhi)
+        if suffix:
+            ahi -= suffix
+            bhi -= suffix
+            matches.append((ahi, bhi, suffix))
+        if alo == ahi or blo == bhi:
+            continue
+
+        steps = chain
+        if chain[0] is _histogram and (ahi - alo) + (bhi - blo) > HISTOGRAM_MAX_REGION:
+            steps = (_patience,) + chain
+        for step in steps:
+            split = step(a, alo, ahi, b, blo, bhi)
+            if split is None:
+                continue
+            found, settled = split
+            matches.extend(found)
+            if not settled:
+                for i, j, size in found + [(ahi, bhi, 0)]:
+                    if alo < i or blo < j:
+                        regions.append((alo, i, blo, j))
+                    alo, blo = i + size, j + size
+            break
+
+    matches.sort()
+    merged: List[Match] = []
+    for i, j, size in matches:
+        if not size:
+            continue
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def diff_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], algorithm: str = DEFAULT_ALGORITHM) -> List[Opcode]:
+    """How to turn `a` into `b`, in difflib's get_opcodes() form."""
+    a_ids, b_ids = intern_lines(a, b)
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a_ids, b_ids, algorithm) + [(len(a), len(b), 0)]:
+        if i < ai and j < bj:
+            opcodes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], context: int = 3) -> Iterator[List[Opcode]]:
+    """Opcodes cut into hunks with up to `context` equal lines around each change (difflib's get_grouped_opcodes)."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
@@ -1,39 +1,93 @@
 from typing import List, Dict, Any
 
+from core.telemetry import span
+from engine.aggregator import find_common_changes
+from engine.diff_analyzer import index_diff
+
 def generate_markdown_report(
     task_id: str,
     prompt: str,
-    model_results: List[Dict[str, Any]]
+    model_results: List[Dict[str, Any]],
+    include_diffs: bool = True
 ) -> str:
     """
     Generates a markdown report comparing suggestions from multiple AI models.
+    With include_diffs=False each model's diff is summarized instead of
+    inlined (the TUI shows diffs in its own viewer).
     """
-    md = f"# AI Code Improvement Report (Task: {task_id})\n\n"
+    with span("report.render") as s:
+        report = ReportBuilder(task_id, prompt, include_diffs)
+        for result in model_results:
+            report.add(result)
+        md = report.render()
+        s.attrs["bytes_out"] = len(md)
+    return md
 
-    md += "## Request\n"
-    md += f"**Prompt:** {prompt}\n\n"
-    md += "---\n\n"
 
-    if not model_results:
-        md += "## Status\n"
-        md += "No models successfully produced a result. Please check API keys in your `.env` file.\n"
-        return md
+class ReportBuilder:
+    """
+    Builds the report one model at a time, so each model can be shown as soon
+    as it finishes. add() renders and returns that model's section; render()
+    assembles the whole report, including the consensus section, which needs
+    every result and is therefore only computed there.
+    """
+
+    def __init__(self, task_id: str, prompt: str, include_diffs: bool = True):
+        self.task_id = task_id
+        self.prompt = prompt
+        self.include_diffs = include_diffs
+        self.model_results: List[Dict[str, Any]] = []
+        self.sections: List[str] = []
 
-    for result in model_results:
-        model = result.get("model_name", "Unknown")
-        explanation = result.get("explanation", "No explanation provided.")
-        diff_text = result.get("diff_text", "")
-            
-        # Normal markdown, we will style MarkdownH2 in cli.py CSS
-        md += f"## {model.upper()} MODEL\n\n"
-        md += f"**Explanation:** {explanation}\n\n"
-
-        md += "### Full Diff\n"
-        if diff_text.strip():
-            md += f"```diff\n{diff_text}\n```\n\n"
-        else:
-            md += "*No changes detected.*\n\n"
-        
+    def header(self) -> str:
+        md = f"# AI Code Improvement Report (Task: {self.task_id})\n\n"
+        md += "## Request\n"
+        md += f"**Prompt:** {self.prompt}\n\n"
         md += "---\n\n"
+        return md
+
+    def add(self, result: Dict[str, Any]) -> str:
+        section = render_model_section(result, self.include_diffs)
+        self.model_results.append(result)
+        self.sections.append(section)
+        return section
 
+    def render(self) -> str:
+        md = self.header()
+
+        if not self.model_results:
+            md += "## Status\n"
+            md += "No models successfully produced a result. Please check API keys in your `.env` file.\n"
+            return md
+
+        if len(self.model_results) > 1:
+            md += "## Consensus\n"
+            with span("report.consensus"):
+                md += find_common_changes(self.model_results) + "\n\n"
+            md += "---\n\n"
+
+        return md + "".join(self.sections)
+
+
+def render_model_section(result: Dict[str, Any], include_diffs: bool = True) -> str:
+    """One model's part of the report: explanation and diff (or a diff summary)."""
+    model = result.get("model_name", "Unknown")
+    explanation = result.get("explanation", "No explanation provided.")
+    diff_text = result.get("diff_text", "")
+
+    # Normal markdown, we will style MarkdownH2 in cli.py CSS
+    md = f"## {model.upper()} MODEL\n\n"
+    md += f"**Explanation:** {explanation}\n\n"
+
+    md += "### Full Diff\n" if include_diffs else "### Changes\n"
+    if diff_text.strip() and not include_diffs:
+        files = index_diff(diff_text)
+        n_hunks = sum(len(f.hunks) for f in files)
+        md += f"*{len(files)} file(s), {n_hunks} hunk(s) changed - open the diff viewer to browse them.*\n\n"
+    elif diff_text.strip():
+        md += f"```diff\n{diff_text}\n```\n\n"
+    else:
+        md += "*No changes detected.*\n\n"
+
+    md += "---\n\n"
     return md
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.database import SessionLocal, init_db
+from models.domain import LLMResponseCache
+
+logger = logging.getLogger("llm_consensus_engine.response_cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so cosmetic edits to the instruction still hit the cache."""
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+def hash_file_contents(files: Dict[str, Optional[str]]) -> List[Tuple[str, str]]:
+    """Return (path, sha256) pairs for every target file, in a stable order."""
+    hashes = []
+    for file_path in sorted(files):
+        content = files[file_path]
+        if content is None:
+            hashes.append((file_path, "missing"))
+        else:
+            hashes.append((file_path, hashlib.sha256(content.encode("utf-8")).hexdigest()))
+    return hashes
+
+
+def make_cache_key(model_name: str, system_prompt: str, prompt: str, file_hashes: List[Tuple[str, str]]) -> str:
+    """Build a content-addressed key from everything that determines the model's answer."""
+    key = hashlib.sha256()
+    key.update(model_name.encode("utf-8"))
+    key.update(b"\0")
+    key.update(hashlib.sha256(system_prompt.encode("utf-8")).digest())
+    key.update(normalize_prompt(prompt).encode("utf-8"))
+    for path, digest in file_hashes:
+        key.update(b"\0")
+        key.update(path.encode("utf-8"))
+        key.update(b"\0")
+        key.update(digest.encode("ascii"))
+    return key.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-level cache for raw LLM responses.
+    An in-memory LRU bounded by entry count and total bytes sits in front of
+    the `llm_response_cache` table. Both levels honour the same TTL.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, max_bytes: int, max_entry_bytes: int, max_db_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_db_entries = max_db_entries
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Accessed from worker threads (asyncio.to_thread), so guard the LRU
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - stored_at > self.ttl_seconds
+
+    def _remember(self, key: str, content: str, stored_at: float):
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            if key in self._memory:
+                old_content, _ = self._memory.pop(key)
+                self._memory_bytes -= len(old_content.encode("utf-8"))
+            self._memory[key] = (content, stored_at)
+            self._memory_bytes += size
+            while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.encode("utf-8"))
+
+    def _forget(self, key: str):
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry:
+                self._memory_bytes -= len(entry[0].encode("utf-8"))
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss or expiry."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            content, stored_at = entry
+            if not self._expired(stored_at):
+                return content
+            self._forget(key)
+
+        row = self._db_get(key)
+        if row is None:
+            return None
+        content, stored_at = row
+        if self._expired(stored_at):
+            self._db_delete(key)
+            return None
+        self._remember(key, content, stored_at)
+        return content
+
+    def put(self, key: str, model_name: str, content: str):
+        """Store a response in memory and in the database."""
+        if len(content.encode("utf-8")) > self.max_entry_bytes:
+            logger.info(f"Response from {model_name} too large to cache ({len(content)} chars)")
+            return
+        stored_at = time.time()
+        self._remember(key, content, stored_at)
+        self._db_put(key, model_name, content, stored_at)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    # --- Database level ---
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            init_db()
+            with SessionLocal() as db:
+                row = db.get(LLMResponseCache, key)
+                if row is None:
+                    return None
+                return row.content, row.stored_at
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+
+    def _db_delete(self, key: str):
+        try:
+            init_db()
+            with SessionLocal() as db:
+                db.query(LLMResponseCache).filter(LLMResponseCache.cache_key == key).delete()
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Response cache delete failed: {e}")
+
+    def _db_put(self, key: str, model_name: str, content: str, stored_at: float):
+        try:
+            init_db()
+            with SessionLocal() as db:
+                db.merge(LLMResponseCache(
+                    cache_key=key,
+                    model_name=model_name,
+                    content=content,
+                    size_bytes=len(content.encode("utf-8")),
+                    stored_at=stored_at,
+                ))
+                # Drop expired rows and keep the table under its size limit
+                if self.ttl_seconds > 0:
+                    db.query(LLMResponseCache).filter(
+                        LLMResponseCache.stored_at < stored_at - self.ttl_seconds
+                    ).delete()
+                overflow = db.query(LLMResponseCache).count() - self.max_db_entries
+                if overflow > 0:
+                    oldest = (
+                        db.query(LLMResponseCache.cache_key)
+                        .order_by(LLMResponseCache.stored_at.asc())
+                        .limit(overflow)
+                        .all()
+                    )
+                    db.query(LLMResponseCache).filter(
+                        LLMResponseCache.cache_key.in_([k for (k,) in oldest])
+                    ).delete(synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+
+response_cache = ResponseCache(
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+    max_entries=settings.llm_cache_max_entries,
+    max_bytes=settings.llm_cache_max_bytes,
+    max_entry_bytes=settings.llm_cache_max_entry_bytes,
+    max_db_entries=settings.llm_cache_max_db_entries,
+)
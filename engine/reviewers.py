@@ -1,46 +1,441 @@
+import asyncio
+import importlib
 import json
 import logging
 import os
-import re
-from typing import Optional, List
-from litellm import acompletion
+import threading
+from typing import Callable, Dict, Optional, List, Union
 from core.config import settings
+from core.task_state import current_journal
+from core.telemetry import span
+from engine.context_packer import PackedFile, count_tokens, pack_context, merge_packed_file, ELISION_INSTRUCTIONS
+from engine.edit_applier import EditApplyError, apply_edit_block
+from engine.file_store import MemoryFileStore, WorktreeFileStore
+from engine.response_cache import response_cache, hash_file_contents, make_cache_key
+from engine.scheduler import request_scheduler
+from engine.stream_parser import FileBlockStreamParser
+
+# Where a review reads and writes files: a worktree checkout or an in-memory snapshot
+FileStore = Union[WorktreeFileStore, MemoryFileStore]
+
+# Called as on_progress(model_name, tokens_received, files_completed)
+ProgressCallback = Callable[[str, int, int], None]
+
+# Push a progress update at least every N streamed chunks
+PROGRESS_EVERY_CHUNKS = 16
 
 logger = logging.getLogger("llm_consensus_engine.reviewers")
 
-async def run_llm_review(model_name: str, worktree_path: str, target_files: List[str], prompt: str) -> Optional[str]:
+
+# litellm takes seconds to import, so it is only loaded on the first model call
+# (the TUI does that in the background right after startup).
+acompletion: Optional[Callable] = None
+
+
+def completion_backend() -> Callable:
+    """The `acompletion` used for model calls, importing litellm if nothing else was set."""
+    global acompletion
+    if acompletion is None:
+        _import_litellm()
+        from litellm import acompletion as litellm_acompletion
+        acompletion = litellm_acompletion
+    return acompletion
+
+
+_litellm_lock = threading.Lock()
+_litellm_loaded = False
+
+
+def _import_litellm():
+    global _litellm_loaded
+    # One importer at a time: litellm is in sys.modules long before it has finished loading
+    with _litellm_lock:
+        if not _litellm_loaded:
+            importlib.import_module("litellm")
+            _litellm_loaded = True
+
+
+async def load_litellm():
+    """Import litellm on a worker thread so the first review doesn't block the event loop for seconds."""
+    if not _litellm_loaded:
+        await asyncio.to_thread(_import_litellm)
+
+
+def set_completion_backend(backend: Callable):
+    """
+    Replace the LiteLLM `acompletion` used for every model call, e.g. with the
+    stub or replay backends from bench/. The backend must accept the same
+    keyword arguments and return LiteLLM-shaped responses (or stream chunks).
+    """
+    global acompletion
+    acompletion = backend
+
+OUTPUT_PROTOCOLS = ("full", "search_replace", "udiff")
+
+_SYSTEM_PROMPT_INTRO = (
+    "You are an expert software engineer acting as an autonomous agent. "
+    "The user will provide you with the contents of several files and an instruction. "
+    "You must improve or modify the code according to the instruction.\n\n"
+    "OUTPUT FORMAT REQUIRED:\n"
+)
+
+_FULL_FILE_FORMAT = (
+    "For each file you modify, output the FULL new content wrapped in XML tags like this:\n"
+    "```xml\n"
+    '<file path="exact/path/from/input.py">\n'
+    "// FULL NEW CODE HERE\n"
+    "</file>\n"
+    "```\n"
+    "Do NOT output partial diffs. Output the entire file content.\n"
+)
+
+_SEARCH_REPLACE_FORMAT = (
+    "For each file you modify, output only the changed regions as SEARCH/REPLACE blocks wrapped in XML tags:\n"
+    "```xml\n"
+    '<edit path="exact/path/from/input.py">\n'
+    "<<<<<<< SEARCH\n"
+    "exact existing lines, including a few unchanged lines around the change\n"
+    "=======\n"
+    "the lines that replace them\n"
+    ">>>>>>> REPLACE\n"
+    "</edit>\n"
+    "```\n"
+    "The SEARCH part must match the current file exactly and be unique in it. "
+    "Use several blocks for several changes. "
+    'For new files, use <file path="..."> with the full content instead.\n'
+)
+
+_UDIFF_FORMAT = (
+    "For each file you modify, output a unified diff of your changes wrapped in XML tags:\n"
+    "```xml\n"
+    '<patch path="exact/path/from/input.py">\n'
+    "@@ -12,3 +12,4 @@\n"
+    " unchanged context line\n"
+    "-removed line\n"
+    "+added line\n"
+    " unchanged context line\n"
+    "</patch>\n"
+    "```\n"
+    "Include 3 lines of unchanged context around every change. "
+    'For new files, use <file path="..."> with the full content instead.\n'
+)
+
+_SYSTEM_PROMPT_OUTRO = "Outside the XML tags, you can write a brief explanation of what you changed."
+
+
+def output_protocol_for(model_name: str) -> str:
+    """Output protocol configured for a model (OUTPUT_PROTOCOLS), defaulting to full files."""
+    protocol = settings.output_protocols.get(model_name, settings.output_protocol)
+    if protocol not in OUTPUT_PROTOCOLS:
+        logger.warning(f"Unknown output protocol {protocol!r} for {model_name}, using full files")
+        return "full"
+    return protocol
+
+
+def build_system_prompt(protocol: str) -> str:
+    formats = {"full": _FULL_FILE_FORMAT, "search_replace": _SEARCH_REPLACE_FORMAT, "udiff": _UDIFF_FORMAT}
+    return _SYSTEM_PROMPT_INTRO + formats[protocol] + _SYSTEM_PROMPT_OUTRO
+
+
+class ResponseWriter:
+    """
+    Applies the blocks of one model response to the worktree.
+    `file` blocks are written as-is (after expanding elided regions), `edit`
+    and `patch` blocks are applied to the current file content. A file whose
+    edits don't apply, or whose sliced view can't be merged back, is restored
+    and recorded in failed_paths.
+    """
+
+    def __init__(self, model_name: str, files: FileStore, file_contents: Optional[Dict[str, Optional[str]]] = None, packed: Optional[Dict[str, PackedFile]] = None):
+        self.model_name = model_name
+        self.files = files
+        self.packed = packed or {}
+        self._original = dict(file_contents or {})
+        self._current = dict(self._original)
+        self.written: List[str] = []
+        self.failed_paths: List[str] = []
+
+    @property
+    def files_modified(self) -> int:
+        return len(self.written)
+
+    def _read_current(self, clean_path: str) -> Optional[str]:
+        if clean_path not in self._current:
+            content = self.files.read(clean_path)
+            self._original.setdefault(clean_path, content)
+            self._current[clean_path] = content
+        return self._current[clean_path]
+
+    def _write(self, clean_path: str, content: str):
+        self.files.write(clean_path, content)
+        self._current[clean_path] = content
+
+    def _record_written(self, clean_path: str):
+        if clean_path not in self.written:
+            self.written.append(clean_path)
+
+    def open_block(self, kind: str, path_attr: str) -> Optional["StreamedFile"]:
+        """
+        For a `file` block that needs no post-processing, a handle that writes
+        the body into the store while it is parsed. None means the parser should
+        collect the body and pass it to apply() instead.
+        """
+        clean_path = path_attr.strip()
+        if kind != "file" or not _is_safe_path(clean_path) or clean_path in self.packed or clean_path in self.failed_paths:
+            return None
+        return StreamedFile(self, clean_path)
+
+    def apply(self, kind: str, path_attr: str, body: str) -> bool:
+        """Apply one block. Returns True if the file was written."""
+        # Security / sanity check: don't allow absolute paths or escaping worktree
+        clean_path = path_attr.strip()
+        if not _is_safe_path(clean_path):
+            logger.warning(f"Model {self.model_name} tried to write to {clean_path}, ignoring.")
+            return False
+        if clean_path in self.failed_paths:
+            # Already queued for a full-file fallback
+            return False
+
+        if kind == "file":
+            new_content = body
+            # The model may have seen a sliced view of this file: expand it back to the full file
+            if clean_path in self.packed:
+                new_content = merge_packed_file(self.packed[clean_path], body)
+                if new_content is None:
+                    self._fail(clean_path)
+                    return False
+        else:
+            try:
+                new_content = apply_edit_block(kind, self._read_current(clean_path) or "", body)
+            except EditApplyError as e:
+                logger.warning(f"{self.model_name}: {kind} block for {clean_path} did not apply: {e}")
+                self._fail(clean_path)
+                return False
+
+        self._write(clean_path, new_content)
+        self._record_written(clean_path)
+        return True
+
+    def _fail(self, clean_path: str):
+        self.failed_paths.append(clean_path)
+        # Undo earlier blocks for this file so the fallback starts from the original
+        original = self._original.get(clean_path)
+        if clean_path in self.written and original is not None:
+            self._write(clean_path, original)
+            self.written.remove(clean_path)
+
+
+def _is_safe_path(clean_path: str) -> bool:
+    """Don't allow empty or absolute paths, or escaping the worktree."""
+    return bool(clean_path) and ".." not in clean_path and not clean_path.startswith("/")
+
+
+class StreamedFile:
+    """A `file` block written straight into the store as it is parsed; recorded by the ResponseWriter on commit."""
+
+    def __init__(self, writer: ResponseWriter, clean_path: str):
+        self.writer = writer
+        self.clean_path = clean_path
+        self._handle = writer.files.open_write(clean_path)
+
+    def write(self, text: str):
+        self._handle.write(text)
+
+    def commit(self):
+        self._handle.commit()
+        # The content now lives only in the store; read it back if a later block needs it
+        self.writer._current.pop(self.clean_path, None)
+        self.writer._record_written(self.clean_path)
+
+    def abort(self):
+        self._handle.abort()
+
+
+def apply_llm_response(model_name: str, worktree_path: str, content: str, writer: Optional[ResponseWriter] = None) -> str:
+    """
+    Parses the edited files out of a raw model response, writes them
+    into the worktree and returns the explanation text.
+    """
+    if writer is None:
+        writer = ResponseWriter(model_name, WorktreeFileStore(worktree_path))
+
+    # One scan over the response; full-file bodies go straight to the store
+    parser = FileBlockStreamParser(open_block=writer.open_block)
+    for kind, path_attr, body in parser.feed(content):
+        if body is not None:
+            writer.apply(kind, path_attr, body)
+    return _finish_parse(model_name, parser, writer)
+
+
+def _finish_parse(model_name: str, parser: FileBlockStreamParser, writer: ResponseWriter) -> str:
+    """
+    Close the parser and return the explanation. Malformed blocks are logged
+    and listed in the explanation; files whose block was never closed are
+    queued for the full-file fallback like edits that did not apply.
+    """
+    explanation = parser.close()
+    if not explanation:
+        explanation = f"Modified {writer.files_modified} files."
+
+    for issue in parser.issues:
+        logger.warning(f"{model_name}: malformed output at {issue}")
+        clean_path = issue.path.strip()
+        if issue.unterminated and _is_safe_path(clean_path) and clean_path not in writer.written and clean_path not in writer.failed_paths:
+            writer.failed_paths.append(clean_path)
+    if parser.issues:
+        explanation += "\n\nMalformed output: " + "; ".join(str(issue) for issue in parser.issues)
+
+    return explanation
+
+class StreamInterruptedError(Exception):
+    """A streamed response failed after it had already written files (not retried)."""
+
+async def _stream_llm_response(model_name: str, kwargs: dict, on_progress: Optional[ProgressCallback], writer: ResponseWriter):
+    """
+    Streams the completion, writing each file as soon as its closing tag arrives.
+    Tokens received are the provider's usage when it streams one, otherwise
+    counted on the text received since the last progress update.
+    Returns (raw_content, explanation).
+    """
+    parser = FileBlockStreamParser(open_block=writer.open_block)
+    parts = []
+    chunks = 0
+    tokens = 0
+    counted = 0
+    usage_tokens = None
+
+    response = await completion_backend()(stream=True, **kwargs)
+    try:
+        async for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if getattr(usage, "completion_tokens", None):
+                usage_tokens = usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            parts.append(delta)
+            chunks += 1
+
+            completed = parser.feed(delta)
+            for kind, path_attr, body in completed:
+                if body is not None:
+                    writer.apply(kind, path_attr, body)
+
+            if on_progress and (completed or chunks % PROGRESS_EVERY_CHUNKS == 0):
+                tokens += count_tokens(model_name, "".join(parts[counted:]))
+                counted = len(parts)
+                on_progress(model_name, usage_tokens or tokens, writer.files_modified)
+    except Exception as e:
+        # Drop a half-written file; the block never completed
+        parser.abort()
+        if writer.files_modified:
+            # Files from this attempt are already in the worktree; a retry could
+            # mix two different answers, so surface the failure instead.
+            raise StreamInterruptedError(f"{model_name} stream broke after {writer.files_modified} file(s): {e}") from e
+        raise
+
+    if on_progress:
+        tokens += count_tokens(model_name, "".join(parts[counted:]))
+        on_progress(model_name, usage_tokens or tokens, writer.files_modified)
+
+    return "".join(parts), _finish_parse(model_name, parser, writer)
+
+async def _full_file_fallback(model_name: str, worktree_path: Optional[str], prompt: str, use_cache: bool, on_progress: Optional[ProgressCallback], writer: ResponseWriter, explanation: str, related: str = "", retried: bool = False) -> str:
+    """
+    Re-request files whose output could not be applied (edit blocks that did
+    not apply, sliced files that lost elided regions), this time as full
+    files. A retry that fails again is only reported in the explanation.
+    """
+    if not writer.failed_paths:
+        return explanation
+    failed = list(writer.failed_paths)
+    if retried:
+        print(f"[REVIEWER] {model_name}: output for {', '.join(failed)} could not be applied again, leaving them unchanged")
+        return explanation + f"\n\nNot applied (the output for these files could not be applied): {', '.join(failed)}"
+    print(f"[REVIEWER] {model_name}: output for {', '.join(failed)} could not be applied, requesting full files")
+    fallback = await run_llm_review(model_name, worktree_path, failed, prompt, use_cache, on_progress, protocol="full", files=writer.files, related=related, retried=True)
+    if fallback:
+        explanation += f"\n\nFull-file fallback for {', '.join(failed)}: {fallback}"
+    return explanation
+
+async def run_llm_review(model_name: str, worktree_path: Optional[str], target_files: List[str], prompt: str, use_cache: bool = True, on_progress: Optional[ProgressCallback] = None, protocol: Optional[str] = None, files: Optional[FileStore] = None, related: str = "", retried: bool = False, token_counts: Optional[Dict[str, int]] = None) -> Optional[str]:
     """
     Sends file contents from the worktree to an LLM, parses the edited files, 
     and writes them back to the worktree. Returns the explanation.
+
+    Responses are cached by model, normalized prompt and file content hashes.
+    Pass use_cache=False (or set LLM_CACHE_ENABLED=false) to always call the model.
+    With LLM_STREAMING enabled, files are written as soon as each block is complete
+    and on_progress receives (model_name, tokens_received, files_completed).
+
+    The output protocol (full files, search/replace or unified diff) comes from
+    OUTPUT_PROTOCOLS / OUTPUT_PROTOCOL unless given. Files whose output can't
+    be applied are requested again in full-file mode (once: `retried` is set
+    on that request).
+
+    Files are read from and written to `worktree_path`, or to `files` when a
+    store is given (e.g. a MemoryFileStore for worktree-less evaluation).
+    `related` describes other files of the submission that the model sees but
+    should not edit (see engine/sharding.py), and `token_counts` the files'
+    token counts when the caller has already counted them.
+
+    Inside a task with a journal (core/task_state.py), every raw response is
+    stored, and a response stored by an interrupted run is applied again
+    instead of calling the model.
     """
-    
+    if files is None:
+        files = WorktreeFileStore(worktree_path)
+
+    # Token counting and the model call need litellm
+    await load_litellm()
+
     # 1. Read files
-    files_context = ""
-    for file_path in target_files:
-        full_path = os.path.join(worktree_path, file_path)
-        if os.path.exists(full_path):
-            with open(full_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            files_context += f"--- {file_path} ---\n{content}\n\n"
-        else:
-            files_context += f"--- {file_path} ---\n(File does not exist yet)\n\n"
-
-    system_prompt = (
-        "You are an expert software engineer acting as an autonomous agent. "
-        "The user will provide you with the contents of several files and an instruction. "
-        "You must improve or modify the code according to the instruction.\n\n"
-        "OUTPUT FORMAT REQUIRED:\n"
-        "For each file you modify, output the FULL new content wrapped in XML tags like this:\n"
-        "```xml\n"
-        '<file path="exact/path/from/input.py">\n'
-        "// FULL NEW CODE HERE\n"
-        "</file>\n"
-        "```\n"
-        "Do NOT output partial diffs. Output the entire file content.\n"
-        "Outside the XML tags, you can write a brief explanation of what you changed."
-    )
+    with span("review.read_files") as s:
+        file_contents = {file_path: files.read(file_path) for file_path in target_files}
+        s.attrs["bytes_out"] = sum(len(c) for c in file_contents.values() if c is not None)
+
+    # Fit the files into the model's context budget, slicing large ones if needed
+    with span("review.pack_context"):
+        files_context, packed = pack_context(model_name, target_files, file_contents, prompt, token_counts)
+
+    protocol = protocol or output_protocol_for(model_name)
+    system_prompt = build_system_prompt(protocol)
+    if any(p.elided for p in packed.values()):
+        system_prompt += ELISION_INSTRUCTIONS
 
     user_prompt = f"Instruction: {prompt}\n\nFiles:\n{files_context}"
+    if related:
+        user_prompt += f"Other files of this change, edited separately. Only their public interfaces are shown; do not output them:\n\n{related}\n"
+    writer = ResponseWriter(model_name, files, file_contents, packed)
+
+    # A resumed task replays the responses its earlier run already paid for
+    journal = current_journal.get()
+    cache_enabled = use_cache and settings.llm_cache_enabled
+    cache_key = None
+    request_key = None
+    if cache_enabled or journal is not None:
+        request_key = make_cache_key(model_name, system_prompt, f"{prompt}\n\n{related}" if related else prompt, hash_file_contents(file_contents))
+    if journal is not None:
+        stored = journal.response(model_name, request_key)
+        if stored is not None:
+            print(f"[REVIEWER] {model_name} replaying stored response ({len(stored)} chars)")
+            with span("review.parse", bytes_in=len(stored)):
+                explanation = apply_llm_response(model_name, worktree_path, stored, writer)
+            return await _full_file_fallback(model_name, worktree_path, prompt, use_cache, on_progress, writer, explanation, related, retried)
+    if cache_enabled:
+        cache_key = request_key
+        with span("cache.lookup") as s:
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            s.attrs["hit"] = cached is not None
+        if cached is not None:
+            print(f"[REVIEWER] {model_name} cache hit ({len(cached)} chars)")
+            if journal is not None:
+                await journal.record_response(model_name, request_key, cached)
+            with span("review.parse", bytes_in=len(cached)):
+                explanation = apply_llm_response(model_name, worktree_path, cached, writer)
+            return await _full_file_fallback(model_name, worktree_path, prompt, use_cache, on_progress, writer, explanation, related, retried)
 
     # Build kwargs
     kwargs = {
@@ -49,7 +444,7 @@ async def run_llm_review(model_name: str, worktree_path: str, target_files: List
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        "timeout": 120
+        "timeout": settings.llm_timeout_seconds
     }
 
     # Pass API key explicitly for Gemini
@@ -60,37 +455,39 @@ async def run_llm_review(model_name: str, worktree_path: str, target_files: List
 
     try:
         print(f"[REVIEWER] Calling {model_name}...")
-        response = await acompletion(**kwargs)
-        content = response.choices[0].message.content
+        usage = None
+        with span("llm.call", bytes_in=len(system_prompt) + len(user_prompt), streaming=settings.llm_streaming) as llm_span:
+            if settings.llm_streaming:
+                # 2. Files are parsed and written back while the response streams in
+                # The whole stream runs inside the scheduler so the concurrency cap covers it.
+                # No hedging: two streams would write into the same worktree.
+                content, explanation = await request_scheduler.run(
+                    model_name,
+                    lambda: _stream_llm_response(model_name, kwargs, on_progress, writer),
+                    hedge=False,
+                )
+            else:
+                response = await request_scheduler.run(model_name, lambda: completion_backend()(**kwargs))
+                content = response.choices[0].message.content
+                usage = getattr(response, "usage", None)
+            llm_span.attrs["bytes_out"] = len(content)
+            if settings.telemetry_enabled:
+                # Provider-reported usage when available, tokenizer estimate otherwise
+                llm_span.attrs["prompt_tokens"] = getattr(usage, "prompt_tokens", None) or count_tokens(model_name, system_prompt + user_prompt)
+                llm_span.attrs["completion_tokens"] = getattr(usage, "completion_tokens", None) or count_tokens(model_name, content)
         print(f"[REVIEWER] {model_name} responded ({len(content)} chars)")
+        if journal is not None:
+            await journal.record_response(model_name, request_key, content)
 
-        # 2. Parse the files and write them back
-        file_pattern = re.compile(r'<file path="(.*?)">\n?(.*?)\n?</file>', re.DOTALL)
-        matches = file_pattern.findall(content)
-        
-        files_modified = 0
-        for path_attr, new_content in matches:
-            # Security / sanity check: don't allow absolute paths or escaping worktree
-            clean_path = path_attr.strip()
-            if ".." in clean_path or clean_path.startswith("/"):
-                logger.warning(f"Model {model_name} tried to write to {clean_path}, ignoring.")
-                continue
-                
-            write_path = os.path.join(worktree_path, clean_path)
-            os.makedirs(os.path.dirname(write_path), exist_ok=True)
-            
-            with open(write_path, "w", encoding="utf-8") as f:
-                f.write(new_content)
-            files_modified += 1
-            
-        # Clean up the explanation by removing the XML blocks
-        explanation = re.sub(r'<file path=".*?">.*?</file>', '', content, flags=re.DOTALL)
-        explanation = re.sub(r'```xml\s*```', '', explanation).strip()
-        
-        if not explanation:
-            explanation = f"Modified {files_modified} files."
+        if not settings.llm_streaming:
+            # 2. Parse the files and write them back
+            with span("review.parse", bytes_in=len(content)):
+                explanation = apply_llm_response(model_name, worktree_path, content, writer)
 
-        return explanation
+        if cache_key is not None:
+            await asyncio.to_thread(response_cache.put, cache_key, model_name, content)
+
+        return await _full_file_fallback(model_name, worktree_path, prompt, use_cache, on_progress, writer, explanation, related, retried)
 
     except Exception as e:
         print(f"[REVIEWER ERROR] {model_name}: {type(e).__name__}: {e}")
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.config import settings
+
+logger = logging.getLogger("llm_consensus_engine.scheduler")
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# LiteLLM exception classes that are transient. Matched by name so this module
+# does not need to import litellm.
+RETRYABLE_EXCEPTION_NAMES = {
+    "RateLimitError",
+    "Timeout",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+}
+
+
+def provider_for(model_name: str) -> str:
+    """Provider prefix of a LiteLLM model name (`zai/glm-4.5-flash` -> `zai`)."""
+    return model_name.split("/", 1)[0] if "/" in model_name else "default"
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_EXCEPTION_NAMES
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _ProviderState:
+    def __init__(self, rate: float, max_concurrency: int):
+        self.bucket = TokenBucket(rate, capacity=max(1.0, rate))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Recent successful call latencies, used to decide when to hedge
+        self.latencies: deque = deque(maxlen=200)
+
+    def latency_percentile(self, percentile: float) -> float:
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class RequestScheduler:
+    """
+    Schedules LLM calls per provider prefix (`zai/`, `gemini/`, ...):
+    token-bucket rate limits and concurrency caps, jittered exponential
+    backoff on retryable errors, and optional hedged requests that fire a
+    second call when the first is slower than the provider's latency percentile.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Dict[str, float],
+        max_concurrency: Dict[str, int],
+        default_rate: float,
+        default_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+    ):
+        self.rate_limits = rate_limits
+        self.max_concurrency = max_concurrency
+        self.default_rate = default_rate
+        self.default_concurrency = default_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._providers: Dict[str, _ProviderState] = {}
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            state = _ProviderState(
+                self.rate_limits.get(provider, self.default_rate),
+                self.max_concurrency.get(provider, self.default_concurrency),
+            )
+            self._providers[provider] = state
+        return state
+
+    def _backoff_delay(self, attempt: int, error: BaseException) -> float:
+        # Honour Retry-After when the provider sends one
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _call_once(self, state: _ProviderState, call: Callable[[], Awaitable[Any]]) -> Any:
+        async with state.semaphore:
+            await state.bucket.acquire()
+            start = time.monotonic()
+            result = await call()
+            state.latencies.append(time.monotonic() - start)
+            return result
+
+    async def _hedged(self, model_name: str, state: _ProviderState, call: Callable[[], Awaitable[Any]]) -> Any:
+        threshold = state.latency_percentile(self.hedge_percentile)
+        primary = asyncio.create_task(self._call_once(state, call))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if not done:
+                logger.info(f"Hedging {model_name}: no response after {threshold:.1f}s")
+                tasks.add(asyncio.create_task(self._call_once(state, call)))
+
+            last_error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # Whichever request lost (or all of them, if we were cancelled) is cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def run(self, model_name: str, call: Callable[[], Awaitable[Any]], hedge: bool = True) -> Any:
+        """
+        Run `call` (a factory returning a fresh awaitable per attempt) under the
+        provider's limits, retrying transient failures.
+        Pass hedge=False for calls with side effects that must not run twice at once.
+        """
+        state = self._state(provider_for(model_name))
+        attempt = 0
+        while True:
+            try:
+                if hedge and self.hedge_enabled and len(state.latencies) >= self.hedge_min_samples:
+                    return await self._hedged(model_name, state, call)
+                return await self._call_once(state, call)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                print(f"[SCHEDULER] {model_name}: {type(e).__name__}, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+request_scheduler = RequestScheduler(
+    rate_limits=settings.provider_rate_limits,
+    max_concurrency=settings.provider_max_concurrency,
+    default_rate=settings.default_provider_rate_limit,
+    default_concurrency=settings.default_provider_max_concurrency,
+    max_retries=settings.llm_max_retries,
+    backoff_base=settings.llm_backoff_base_seconds,
+    backoff_max=settings.llm_backoff_max_seconds,
+    hedge_enabled=settings.llm_hedge_enabled,
+    hedge_percentile=settings.llm_hedge_percentile,
+    hedge_min_samples=settings.llm_hedge_min_samples,
+)
@@ -0,0 +1,326 @@
+"""
+Map-reduce review of large submissions.
+
+A submission with many target files is split into shards (by size, directory
+or import graph). Every shard is reviewed by its own model call, concurrently,
+against a private MemoryFileStore; each call also sees the public interfaces
+of the files in the other shards. The shards' edits are then merged into the
+task's store, so the model's result is still a single commit, and edits that
+disagree are reported as conflicts.
+"""
+import ast
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.config import settings
+from core.telemetry import span
+from engine.context_packer import context_budget, count_tokens
+from engine.file_store import MemoryFileStore, WorktreeFileStore
+from engine.reviewers import FileStore, ProgressCallback, load_litellm, run_llm_review
+
+logger = logging.getLogger("llm_consensus_engine.sharding")
+
+SHARD_STRATEGIES = ("size", "directory", "imports")
+
+# Lines of interface summary shown per file of the other shards
+MAX_SUMMARY_LINES = 40
+
+
+@dataclass
+class ShardConflict:
+    """A file written by more than one shard with different contents."""
+    path: str
+    # Shard whose version was kept (the one the file belongs to, or the first writer)
+    kept: int
+    dropped: List[int] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        others = ", ".join(str(i + 1) for i in self.dropped)
+        return f"{self.path} (kept shard {self.kept + 1}, dropped shard {others})"
+
+
+def _module_names(path: str) -> List[str]:
+    """Dotted module names a Python file can be imported as (with and without a src/ prefix)."""
+    module = path[:-len(".py")].replace("/", ".")
+    if module.endswith(".__init__"):
+        module = module[:-len(".__init__")]
+    names = [module]
+    if module.startswith("src."):
+        names.append(module[len("src."):])
+    return names
+
+
+def import_graph(file_contents: Dict[str, Optional[str]]) -> Dict[str, Set[str]]:
+    """For each target Python file, the other target files it imports."""
+    modules: Dict[str, str] = {}
+    for path in file_contents:
+        if path.endswith(".py"):
+            for name in _module_names(path):
+                modules[name] = path
+
+    graph: Dict[str, Set[str]] = {path: set() for path in file_contents}
+    for path, content in file_contents.items():
+        if not path.endswith(".py") or not content:
+            continue
+        try:
+            tree = ast.parse(content)
+        except SyntaxError:
+            continue
+        package = _module_names(path)[0].split(".")
+        if not path.endswith("__init__.py"):
+            package = package[:-1]
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                candidates = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                if node.level:
+                    parent = package[:len(package) - node.level + 1]
+                    base = ".".join(parent + ([base] if base else []))
+                # `from pkg import mod` imports a module, `from mod import name` a name
+                candidates = [f"{base}.{alias.name}" for alias in node.names] + [base]
+            else:
+                continue
+            for name in candidates:
+                target = modules.get(name)
+                if target is not None and target != path:
+                    graph[path].add(target)
+    return graph
+
+
+def _units(target_files: List[str], file_contents: Dict[str, Optional[str]], strategy: str) -> List[List[str]]:
+    """Groups of files that should stay in the same shard."""
+    if strategy == "directory":
+        groups: Dict[str, List[str]] = {}
+        for path in target_files:
+            groups.setdefault(os.path.dirname(path), []).append(path)
+        return list(groups.values())
+    if strategy == "imports":
+        # Connected components of the import graph (union-find)
+        parent = {path: path for path in target_files}
+
+        def find(path: str) -> str:
+            while parent[path] != path:
+                parent[path] = parent[parent[path]]
+                path = parent[path]
+            return path
+
+        for path, imported in import_graph(file_contents).items():
+            for other in imported:
+                parent[find(path)] = find(other)
+        components: Dict[str, List[str]] = {}
+        for path in target_files:
+            components.setdefault(find(path), []).append(path)
+        return list(components.values())
+    return [[path] for path in target_files]
+
+
+def plan_shards(target_files: List[str], file_contents: Dict[str, Optional[str]], sizes: Dict[str, int], strategy: str, max_files: int, max_tokens: int) -> List[List[str]]:
+    """
+    Split the target files into shards of at most max_files files and about
+    max_tokens tokens (0 disables either limit).
+
+    "size" places the largest files first to balance the shards. "directory"
+    and "imports" keep a directory, or a group of files importing each other,
+    together where the limits allow and place the groups in path order.
+    """
+    def fits(shard: List[str], tokens: int, unit: List[str], unit_tokens: int) -> bool:
+        if not shard:
+            return True
+        if max_files > 0 and len(shard) + len(unit) > max_files:
+            return False
+        return max_tokens <= 0 or tokens + unit_tokens <= max_tokens
+
+    units = []
+    for unit in _units(target_files, file_contents, strategy):
+        # A group larger than a whole shard is split up in path order
+        unit = sorted(unit)
+        step = max_files if max_files > 0 else len(unit)
+        units.extend(unit[i:i + step] for i in range(0, len(unit), step))
+
+    if strategy == "size":
+        units.sort(key=lambda u: -sum(sizes.get(p, 0) for p in u))
+    else:
+        units.sort(key=lambda u: u[0])
+
+    # First fit: each group goes into the first shard with room for it
+    shards: List[List[str]] = []
+    shard_tokens: List[int] = []
+    for unit in units:
+        unit_tokens = sum(sizes.get(p, 0) for p in unit)
+        for i, shard in enumerate(shards):
+            if fits(shard, shard_tokens[i], unit, unit_tokens):
+                shard.extend(unit)
+                shard_tokens[i] += unit_tokens
+                break
+        else:
+            shards.append(list(unit))
+            shard_tokens.append(unit_tokens)
+
+    # Keep the submission's file order inside every shard
+    order = {path: i for i, path in enumerate(target_files)}
+    return [sorted(shard, key=order.get) for shard in shards]
+
+
+def _signature(node) -> str:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _first_doc_line(node) -> str:
+    doc = ast.get_docstring(node)
+    return f"  # {doc.strip().splitlines()[0]}" if doc and doc.strip() else ""
+
+
+def public_interface(path: str, content: Optional[str]) -> str:
+    """
+    A compact summary of what other files can use from this one: public
+    classes (with their public methods), functions and constants for Python,
+    or just the size for other files.
+    """
+    if content is None:
+        return "(new file)"
+    if not path.endswith(".py"):
+        return f"({len(content.splitlines())} lines, not shown)"
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return f"({len(content.splitlines())} lines, not parseable)"
+
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            lines.append(_signature(node) + _first_doc_line(node))
+        elif isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            bases = f"({', '.join(ast.unparse(b) for b in node.bases)})" if node.bases else ""
+            lines.append(f"class {node.name}{bases}:" + _first_doc_line(node))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and (not item.name.startswith("_") or item.name == "__init__"):
+                    lines.append("    " + _signature(item))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    lines.append(f"{target.id} = ...")
+    if len(lines) > MAX_SUMMARY_LINES:
+        lines = lines[:MAX_SUMMARY_LINES] + [f"... {len(lines) - MAX_SUMMARY_LINES} more"]
+    return "\n".join(lines) or "(no public names)"
+
+
+def related_context(paths: List[str], file_contents: Dict[str, Optional[str]]) -> str:
+    """The interface summaries of the files in the other shards, as one prompt section."""
+    parts = []
+    for path in paths:
+        summary = public_interface(path, file_contents.get(path))
+        parts.append(f"{path}:\n" + "\n".join(f"    {line}" for line in summary.split("\n")))
+    return "\n\n".join(parts)
+
+
+def merge_shard_changes(shards: List[List[str]], changes: List[Dict[str, str]], snapshot: Dict[str, Optional[str]]) -> Tuple[Dict[str, str], List[ShardConflict]]:
+    """
+    Merge the files written by every shard. A file written by several shards
+    with different contents is a conflict: the version of the shard the file
+    belongs to wins, otherwise the first shard's. Rewrites that leave a file
+    unchanged are dropped.
+    """
+    owner = {path: i for i, shard in enumerate(shards) for path in shard}
+    writers: Dict[str, List[int]] = {}
+    for i, shard_changes in enumerate(changes):
+        for path, content in shard_changes.items():
+            if content != snapshot.get(path):
+                writers.setdefault(path, []).append(i)
+
+    merged: Dict[str, str] = {}
+    conflicts: List[ShardConflict] = []
+    for path, shard_ids in writers.items():
+        kept = owner[path] if owner.get(path) in shard_ids else shard_ids[0]
+        merged[path] = changes[kept][path]
+        dropped = [i for i in shard_ids if i != kept and changes[i][path] != merged[path]]
+        if dropped:
+            conflicts.append(ShardConflict(path, kept, dropped))
+    return merged, conflicts
+
+
+def _shard_progress(model_name: str, n_shards: int, on_progress: Optional[ProgressCallback]):
+    """Per-shard progress callbacks that report the shards' combined tokens and files."""
+    tokens = [0] * n_shards
+    files = [0] * n_shards
+
+    def make(i: int) -> Optional[ProgressCallback]:
+        if on_progress is None:
+            return None
+
+        def report(_model: str, shard_tokens: int, shard_files: int):
+            tokens[i], files[i] = shard_tokens, shard_files
+            on_progress(model_name, sum(tokens), sum(files))
+        return report
+    return make
+
+
+def _read_and_count(model_name: str, files: FileStore, target_files: List[str]) -> Tuple[Dict[str, Optional[str]], Dict[str, int]]:
+    """(content, token count) of the target files; blocking."""
+    snapshot = {path: files.read(path) for path in target_files}
+    sizes = {path: count_tokens(model_name, content) for path, content in snapshot.items() if content is not None}
+    return snapshot, sizes
+
+
+async def run_sharded_review(model_name: str, worktree_path: Optional[str], target_files: List[str], prompt: str, use_cache: bool = True, on_progress: Optional[ProgressCallback] = None, files: Optional[FileStore] = None) -> Optional[str]:
+    """
+    Review `target_files` like run_llm_review, splitting them into shards
+    first when there are more than SHARD_MAX_FILES files or more than
+    SHARD_MAX_TOKENS tokens. Every shard is one concurrent model call; the
+    merged edits are written to the worktree (or `files`). Returns the
+    combined explanation, or None if every shard failed.
+    """
+    if files is None:
+        files = WorktreeFileStore(worktree_path)
+    if not settings.shard_enabled or len(target_files) < 2:
+        return await run_llm_review(model_name, worktree_path, target_files, prompt, use_cache, on_progress, files=files)
+
+    await load_litellm()
+    # Reading and tokenizing a large submission takes a while: keep it off the event loop
+    snapshot, sizes = await asyncio.to_thread(_read_and_count, model_name, files, target_files)
+    max_tokens = settings.shard_max_tokens or context_budget(model_name)
+    if len(target_files) <= settings.shard_max_files and sum(sizes.values()) <= max_tokens:
+        return await run_llm_review(model_name, worktree_path, target_files, prompt, use_cache, on_progress, files=files, token_counts=sizes)
+
+    strategy = settings.shard_strategy if settings.shard_strategy in SHARD_STRATEGIES else "imports"
+    shards = plan_shards(target_files, snapshot, sizes, strategy, settings.shard_max_files, max_tokens)
+    if len(shards) < 2:
+        return await run_llm_review(model_name, worktree_path, target_files, prompt, use_cache, on_progress, files=files, token_counts=sizes)
+
+    print(f"[REVIEWER] {model_name}: {len(target_files)} files in {len(shards)} shards ({strategy})")
+    progress = _shard_progress(model_name, len(shards), on_progress)
+    stores = [MemoryFileStore(snapshot) for _ in shards]
+    with span("review.shards", shards=len(shards), strategy=strategy):
+        explanations = await asyncio.gather(*(
+            run_llm_review(
+                model_name, None, shard, prompt, use_cache, progress(i), files=stores[i],
+                related=related_context([p for p in target_files if p not in shard], snapshot),
+                token_counts={p: sizes[p] for p in shard if p in sizes},
+            )
+            for i, shard in enumerate(shards)
+        ))
+
+    with span("review.shard_merge") as s:
+        merged, conflicts = merge_shard_changes(shards, [store.changes for store in stores], snapshot)
+        for path, content in merged.items():
+            files.write(path, content)
+        s.attrs["bytes_out"] = sum(len(c) for c in merged.values())
+        s.attrs["conflicts"] = len(conflicts)
+
+    if not any(explanations):
+        return None
+    parts = []
+    for i, (shard, explanation) in enumerate(zip(shards, explanations)):
+        parts.append(f"Shard {i + 1}/{len(shards)} ({', '.join(shard)}): {explanation or 'Model failed to return a valid response.'}")
+    explanation = "\n\n".join(parts)
+    if conflicts:
+        for conflict in conflicts:
+            logger.warning(f"{model_name}: shard conflict on {conflict}")
+        explanation += "\n\nShard conflicts: " + "; ".join(str(c) for c in conflicts)
+    return explanation
@@ -0,0 +1,221 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+# Block types of the output protocols: full files, search/replace edits, unified diff patches
+BLOCK_TAGS = ("file", "edit", "patch")
+
+_OPEN_PREFIXES = tuple((tag, f'<{tag} path="') for tag in BLOCK_TAGS)
+_CLOSE_TAGS = tuple((tag, f"</{tag}>") for tag in BLOCK_TAGS)
+_LONGEST_TAG = max(len(markup) for _, markup in _OPEN_PREFIXES + _CLOSE_TAGS)
+
+# An opening tag whose path runs longer than this (or over a newline) is malformed
+MAX_PATH_CHARS = 1024
+
+_EMPTY_XML_FENCE_RE = re.compile(r'```xml\s*```')
+
+
+def clean_explanation(text: str) -> str:
+    """Drop the empty ```xml fences that remain once the blocks are cut out."""
+    return _EMPTY_XML_FENCE_RE.sub('', text).strip()
+
+
+@dataclass
+class MalformedBlock:
+    """A problem found in the model output, with the 1-based line it starts on."""
+    line: int
+    message: str
+    kind: str = ""
+    path: str = ""
+    # The block was opened but never closed, so its file was not written
+    unterminated: bool = False
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+class FileBlockStreamParser:
+    """
+    Single-pass tokenizer for the `<file|edit|patch path="...">...</...>` output protocols.
+
+    Feed it chunks as they arrive from the model (or the whole response at
+    once); every call returns the blocks whose closing tag has been seen so
+    far, as (kind, path, body). Text outside the blocks is collected as the
+    explanation. Each character is scanned once: only a tail that could be
+    the start of a tag is held back until the next chunk.
+
+    `open_block(kind, path)` may return a handle with write/commit/abort; the
+    block's body is then written to it piece by piece instead of being
+    collected, and the block is returned with body None after commit.
+    Malformed and unterminated blocks are listed in `issues`.
+    """
+
+    def __init__(self, open_block: Optional[Callable[[str, str], Optional[object]]] = None):
+        self.open_block = open_block
+        self.issues: List[MalformedBlock] = []
+        self._explanation_parts: List[str] = []
+        # Unscanned tail of the previous chunk
+        self._pending = ""
+        # The block being read, if any
+        self._kind: Optional[str] = None
+        self._path = ""
+        self._block_line = 0
+        self._handle = None
+        self._body_parts: List[str] = []
+        self._skip_newline = False
+        # Line number at offset self._counted of the current text
+        self._line = 1
+        self._counted = 0
+
+    def _line_at(self, text: str, offset: int) -> int:
+        self._line += text.count("\n", self._counted, offset)
+        self._counted = offset
+        return self._line
+
+    def _issue(self, text: str, offset: int, message: str, **fields):
+        self.issues.append(MalformedBlock(self._line_at(text, offset), message, **fields))
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Optional[str]]]:
+        """Consume a chunk and return the (kind, path, body) blocks completed by it."""
+        text = self._pending + chunk if self._pending else chunk
+        self._pending = ""
+        self._counted = 0
+        completed = []
+        pos, n = 0, len(text)
+
+        while pos < n:
+            if self._kind is not None:
+                pos, closed, block = self._scan_body(text, pos)
+                if not closed:
+                    break
+                if block is not None:
+                    completed.append(block)
+                continue
+
+            lt = text.find("<", pos)
+            if lt == -1:
+                self._explanation_parts.append(text[pos:])
+                pos = n
+                break
+            self._explanation_parts.append(text[pos:lt])
+            pos = self._scan_tag(text, lt)
+            if pos == n and self._pending:
+                break
+
+        # The held-back tail is counted when it is scanned with the next chunk
+        self._line_at(text, n - len(self._pending))
+        return completed
+
+    def _scan_tag(self, text: str, lt: int) -> int:
+        """Handle the '<' at `lt` outside a block. Returns where scanning continues."""
+        n = len(text)
+        if n - lt < _LONGEST_TAG and any(len(markup) > n - lt and markup.startswith(text[lt:]) for _, markup in _OPEN_PREFIXES + _CLOSE_TAGS):
+            # Could be the start of a tag: decide once more text arrives
+            self._pending = text[lt:]
+            return n
+
+        for tag, close_tag in _CLOSE_TAGS:
+            if text.startswith(close_tag, lt):
+                self._issue(text, lt, f"stray {close_tag} outside any block (a block may have ended early)", kind=tag)
+                self._explanation_parts.append(close_tag)
+                return lt + len(close_tag)
+
+        for tag, prefix in _OPEN_PREFIXES:
+            if text.startswith(prefix, lt):
+                break
+        else:
+            self._explanation_parts.append("<")
+            return lt + 1
+
+        path_start = lt + len(prefix)
+        path_end = text.find('">', path_start, path_start + MAX_PATH_CHARS + 2)
+        newline = text.find("\n", path_start, path_end if path_end != -1 else path_start + MAX_PATH_CHARS)
+        if path_end == -1 and newline == -1 and n - path_start <= MAX_PATH_CHARS:
+            # Opening tag not complete yet
+            self._pending = text[lt:]
+            return n
+        if path_end == -1 or newline != -1:
+            self._issue(text, lt, f'{prefix}... opening tag is not closed by ">" on the same line', kind=tag)
+            self._explanation_parts.append("<")
+            return lt + 1
+
+        self._kind = tag
+        self._path = text[path_start:path_end]
+        self._block_line = self._line_at(text, lt)
+        self._body_parts = []
+        self._skip_newline = True
+        self._handle = None
+        if not self._path.strip():
+            self._issue(text, lt, f"<{tag}> block has an empty path and was ignored", kind=tag)
+        elif self.open_block is not None:
+            self._handle = self.open_block(tag, self._path)
+        return path_end + 2
+
+    def _scan_body(self, text: str, pos: int):
+        """
+        Read the current block's body from `pos`. Returns (next position,
+        whether the closing tag was reached, the completed block or None if it
+        was ignored).
+        """
+        n = len(text)
+        # Same trimming as the non-streaming protocol: one newline after the
+        # opening tag and one before the closing tag belong to the markup
+        if self._skip_newline and pos < n:
+            if text[pos] == "\n":
+                pos += 1
+            self._skip_newline = False
+
+        close_tag = f"</{self._kind}>"
+        end = text.find(close_tag, pos)
+        if end == -1:
+            # Hold back what could be the closing tag and the newline before it
+            keep_from = max(pos, n - len(close_tag))
+            self._write_body(text[pos:keep_from])
+            self._pending = text[keep_from:]
+            return n, False, None
+
+        piece = text[pos:end]
+        if piece.endswith("\n"):
+            piece = piece[:-1]
+        self._write_body(piece)
+
+        kind, path, handle = self._kind, self._path, self._handle
+        self._kind, self._handle = None, None
+        body = None
+        if handle is not None:
+            handle.commit()
+        else:
+            body = "".join(self._body_parts)
+        self._body_parts = []
+        if not path.strip():
+            return end + len(close_tag), True, None
+        return end + len(close_tag), True, (kind, path, body)
+
+    def _write_body(self, piece: str):
+        if not piece:
+            return
+        if self._handle is not None:
+            self._handle.write(piece)
+        elif self._path.strip():
+            self._body_parts.append(piece)
+
+    def abort(self):
+        """Discard a partially written block, e.g. when the stream breaks."""
+        if self._handle is not None:
+            self._handle.abort()
+            self._handle = None
+
+    def close(self) -> str:
+        """Finish parsing and return the explanation text. An unterminated block is reported and dropped."""
+        if self._kind is not None:
+            self.issues.append(MalformedBlock(
+                self._block_line,
+                f'<{self._kind} path="{self._path}"> block is never closed (missing </{self._kind}>), the file was not written',
+                kind=self._kind, path=self._path, unterminated=True,
+            ))
+            self.abort()
+            self._kind = None
+        else:
+            self._explanation_parts.append(self._pending)
+        self._pending = ""
+        return clean_explanation("".join(self._explanation_parts))
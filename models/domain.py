@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, Float, JSON, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
@@ -6,21 +6,122 @@ from core.database import Base
 class Submission(Base):
     __tablename__ = "submissions"
     id = Column(Integer, primary_key=True, index=True)
-    code = Column(Text, nullable=False)
+    task_id = Column(String(32), nullable=True, index=True)
+    target_files = Column(JSON, nullable=True)
+    code = Column(Text, nullable=True)
     prompt = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    markdown_report = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     suggestions = relationship("ModelSuggestion", back_populates="submission", cascade="all, delete-orphan")
 
 class ModelSuggestion(Base):
     __tablename__ = "model_suggestions"
     id = Column(Integer, primary_key=True, index=True)
-    submission_id = Column(Integer, ForeignKey("submissions.id"))
-    model_name = Column(String(100), nullable=False)
-    improved_code = Column(Text, nullable=False)
+    submission_id = Column(Integer, ForeignKey("submissions.id"), index=True)
+    model_name = Column(String(100), nullable=False, index=True)
+    branch_name = Column(String(255), nullable=True)
+    improved_code = Column(Text, nullable=True)
     explanation = Column(Text, nullable=True)
     changes = Column(JSON, nullable=True)
     diff_text = Column(Text, nullable=True)
     markdown_report = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     submission = relationship("Submission", back_populates="suggestions")
+
+    # "History of model X" queries filter on the model and sort by time
+    __table_args__ = (
+        Index("ix_model_suggestions_model_created", "model_name", "created_at"),
+    )
+
+class LLMResponseCache(Base):
+    __tablename__ = "llm_response_cache"
+    cache_key = Column(String(64), primary_key=True)
+    model_name = Column(String(100), nullable=False)
+    content = Column(Text, nullable=False)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    # Unix timestamp, kept as a float so TTL checks don't depend on DB timezone handling
+    stored_at = Column(Float, nullable=False, index=True)
+
+class Job(Base):
+    """A submission queued through the HTTP service (server.py)."""
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)
+    # queued -> running -> done | failed
+    status = Column(String(16), nullable=False, default="queued")
+    target_files = Column(JSON, nullable=False)
+    prompt = Column(Text, nullable=False)
+    task_id = Column(String(32), nullable=True, index=True)
+    # FinalVerdictResponse as JSON once done
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # <host>:<pid> of the process that claimed the job
+    owner = Column(String(255), nullable=True)
+    # Refreshed by the worker while the job runs (see JobStore.heartbeat)
+    heartbeat_at = Column(Float, nullable=True)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+
+    # Workers claim the oldest queued job
+    __table_args__ = (
+        Index("ix_jobs_status_created", "status", "created_at"),
+    )
+
+class TaskRun(Base):
+    """Durable stage of a dispatcher task, so an interrupted task can be resumed (core/task_state.py)."""
+    __tablename__ = "task_runs"
+    task_id = Column(String(32), primary_key=True)
+    # running -> done | failed
+    status = Column(String(16), nullable=False, default="running")
+    # started -> branch_created | snapshot_read -> reported
+    stage = Column(String(32), nullable=False, default="started")
+    target_files = Column(JSON, nullable=False)
+    prompt = Column(Text, nullable=False)
+    evaluation_mode = Column(String(16), nullable=False)
+    models = Column(JSON, nullable=False)
+    # Task branch (worktree mode) or commit (in-memory mode) the models start from
+    base_ref = Column(String(255), nullable=True)
+    # <host>:<pid> of the process running the task
+    owner = Column(String(255), nullable=True)
+    # process_submission's return value once reported
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+    # Startup looks for running tasks of dead processes
+    __table_args__ = (
+        Index("ix_task_runs_status_created", "status", "created_at"),
+    )
+
+class TaskModelRun(Base):
+    """Stage of one model within a TaskRun."""
+    __tablename__ = "task_model_runs"
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(32), nullable=False, index=True)
+    model_name = Column(String(100), nullable=False)
+    # worktree_ready -> responded -> committed -> diffed
+    stage = Column(String(32), nullable=False)
+    branch_name = Column(String(255), nullable=True)
+    worktree_path = Column(Text, nullable=True)
+    explanation = Column(Text, nullable=True)
+    diff_text = Column(Text, nullable=True)
+    updated_at = Column(Float, nullable=False)
+
+class TaskResponse(Base):
+    """A raw model response received during a TaskRun, replayed when the task is resumed."""
+    __tablename__ = "task_responses"
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(32), nullable=False)
+    model_name = Column(String(100), nullable=False)
+    # Same key as the response cache (engine/response_cache.py make_cache_key)
+    request_key = Column(String(64), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_responses_task_model", "task_id", "model_name"),
+    )
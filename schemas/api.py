@@ -1,6 +1,6 @@
 import uuid
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 # --- API Input ---
 class SubmissionRequest(BaseModel):
@@ -24,3 +24,40 @@ class FinalVerdictResponse(BaseModel):
     task_id: str
     model_results: List[ModelResult]
     markdown_report: str
+
+
+def verdict_from_result(result: Dict[str, Any]) -> FinalVerdictResponse:
+    """Build the API response from a process_submission result."""
+    return FinalVerdictResponse(
+        task_id=result["task_id"],
+        model_results=[
+            ModelResult(
+                model_name=r["model_name"],
+                branch_name=r["branch_name"],
+                explanation=r["explanation"],
+                diff_text=r["diff_text"],
+            )
+            for r in result["model_results"]
+        ],
+        markdown_report=result["report"],
+    )
+
+# --- Job queue (server.py) ---
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, done or failed")
+    target_files: List[str]
+    prompt: str
+    task_id: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[FinalVerdictResponse] = None
@@ -0,0 +1,291 @@
+"""
+HTTP service for ELS JUDGE.
+
+Submissions are stored in the `jobs` table and processed by a pool of
+workers, so several developers and CI jobs can share one judge instance.
+Per-model progress is streamed as Server-Sent Events.
+
+    python server.py --port 8000 --workers 4
+
+    POST /api/jobs                  {"target_files": [...], "prompt": "..."} -> 202 + job id
+    GET  /api/jobs                  recent jobs (?status=queued|running|done|failed)
+    GET  /api/jobs/{job_id}         status, and the FinalVerdictResponse once done
+    GET  /api/jobs/{job_id}/events  SSE: started, progress, model, done | failed
+    POST /api/submit-code           queue a job and wait for its FinalVerdictResponse
+
+Run it from the repository the models should work on, like the TUI.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from core.config import settings
+from core.job_queue import JOB_STATUSES, TERMINAL_EVENTS, JobEvents, JobStore
+from core.persistence import persistence_queue
+from core.retention import retention
+from engine.dispatcher import new_task_id, process_submission, worktree_pool
+from engine.reviewers import load_litellm
+from schemas.api import FinalVerdictResponse, JobStatus, JobSubmitted, SubmissionRequest, verdict_from_result
+
+logger = logging.getLogger("llm_consensus_engine.server")
+
+
+class WorkerPool:
+    """Workers that claim queued jobs from the store and run them through the dispatcher."""
+
+    def __init__(self, store: JobStore, events: JobEvents, size: int = 2, poll_interval: float = 2.0):
+        self.store = store
+        self.events = events
+        self.size = max(1, size)
+        self.poll_interval = poll_interval
+        # job id -> worker task running it
+        self.running: Dict[str, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.size)]
+        self._heartbeat = asyncio.create_task(self._keep_alive())
+
+    def notify(self):
+        """A job was queued: wake an idle worker instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running go back to the queue."""
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat = None
+
+    async def _keep_alive(self):
+        """Refresh this process's running jobs and queue again those of dead processes, on any host."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, list(self.running))
+                requeued = await asyncio.to_thread(self.store.requeue_interrupted)
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+                continue
+            if requeued:
+                print(f"[SERVER] {requeued} job(s) of a dead server queued again")
+                self.notify()
+
+    async def _work(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                # Jobs queued by this process wake us; other processes' jobs are polled for
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running[job["job_id"]] = asyncio.current_task()
+            try:
+                await self._run(job)
+            except Exception as e:
+                # A store or verdict error must not end the worker (cancellation still does)
+                logger.error(f"Worker error on job {job['job_id']}: {type(e).__name__}: {e}")
+                await self._abandon(job["job_id"], f"{type(e).__name__}: {e}")
+            finally:
+                self.running.pop(job["job_id"], None)
+
+    async def _abandon(self, job_id: str, error: str):
+        """Mark a job whose run broke down as failed, so it does not stay running."""
+        try:
+            await asyncio.to_thread(self.store.fail, job_id, error)
+        except Exception as e:
+            logger.error(f"Could not mark job {job_id} as failed: {e}")
+        self.events.publish(job_id, "failed", {"job_id": job_id, "error": error})
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        publish = self.events.publish
+
+        def on_progress(model_name: str, tokens: int, files_completed: int):
+            publish(job_id, "progress", {"job_id": job_id, "model_name": model_name, "tokens": tokens, "files_completed": files_completed})
+
+        def on_result(event: Dict[str, Any]):
+            publish(job_id, "model", dict(event, job_id=job_id))
+
+        # The task id is stored before the task starts, so a retry after a crash
+        # resumes the task instead of paying for its model calls again
+        task_id = job["task_id"]
+        if task_id is None:
+            task_id = new_task_id()
+            await asyncio.to_thread(self.store.assign_task, job_id, task_id)
+
+        print(f"[SERVER] job {job_id} started (attempt {job['attempts']}, task {task_id})")
+        publish(job_id, "started", {"job_id": job_id, "attempt": job["attempts"], "task_id": task_id})
+        try:
+            result = await process_submission(job["target_files"], job["prompt"], on_progress=on_progress, on_result=on_result, task_id=task_id)
+            verdict = verdict_from_result(result).model_dump()
+            await asyncio.to_thread(self.store.finish, job_id, result["task_id"], verdict)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next start (or another process)
+            await asyncio.to_thread(self.store.release, job_id)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Job {job_id} failed: {error}")
+            await asyncio.to_thread(self.store.fail, job_id, error)
+            publish(job_id, "failed", {"job_id": job_id, "error": error})
+            return
+        print(f"[SERVER] job {job_id} done (task {result['task_id']})")
+        publish(job_id, "done", {"job_id": job_id, "task_id": result["task_id"], "result": verdict})
+
+
+store = JobStore(max_attempts=settings.job_max_attempts, lease_seconds=settings.job_lease_seconds)
+events = JobEvents()
+pool: Optional[WorkerPool] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global pool
+    requeued = await asyncio.to_thread(store.requeue_interrupted)
+    if requeued:
+        print(f"[SERVER] {requeued} interrupted job(s) queued again")
+    await load_litellm()
+    pool = WorkerPool(store, events, settings.server_workers, settings.server_poll_interval_seconds)
+    pool.start()
+    try:
+        yield
+    finally:
+        await pool.stop()
+        await worktree_pool.shutdown()
+        await persistence_queue.close()
+        await retention.close()
+
+
+app = FastAPI(title=settings.project_name, lifespan=lifespan)
+
+
+async def _get_job(job_id: str) -> Dict[str, Any]:
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _final_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    """The terminal event of a finished job, rebuilt from the table."""
+    if job["status"] == "done":
+        return {"event": "done", "data": {"job_id": job["job_id"], "task_id": job["task_id"], "result": job["result"]}}
+    return {"event": "failed", "data": {"job_id": job["job_id"], "error": job["error"]}}
+
+
+async def _job_events(job_id: str):
+    """Yield a job's events until it finishes (from memory, or from the table for other processes' jobs)."""
+    queue = events.subscribe(job_id)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), settings.server_keepalive_seconds)
+            except asyncio.TimeoutError:
+                job = await asyncio.to_thread(store.get, job_id)
+                if job is not None and job["status"] in TERMINAL_EVENTS and not events.has(job_id):
+                    yield _final_event(job)
+                    return
+                # Keeps proxies from closing an idle stream
+                yield None
+                continue
+            yield item
+            if item["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        events.unsubscribe(job_id, queue)
+
+
+@app.post("/api/jobs", status_code=202, response_model=JobSubmitted)
+async def submit_job(request: SubmissionRequest):
+    job = await asyncio.to_thread(store.enqueue, request.target_files, request.prompt)
+    if pool is not None:
+        pool.notify()
+    job_id = job["job_id"]
+    return JobSubmitted(job_id=job_id, status=job["status"], status_url=f"/api/jobs/{job_id}", events_url=f"/api/jobs/{job_id}/events")
+
+
+@app.get("/api/jobs", response_model=List[JobStatus])
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(JOB_STATUSES)}")
+    return await asyncio.to_thread(store.list, status, min(max(limit, 1), 500))
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    return await _get_job(job_id)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    job = await _get_job(job_id)
+
+    async def stream():
+        if job["status"] in TERMINAL_EVENTS and not events.has(job_id):
+            final = _final_event(job)
+            yield _sse(final["event"], final["data"])
+            return
+        async for item in _job_events(job_id):
+            if await request.is_disconnected():
+                return
+            yield ": keepalive\n\n" if item is None else _sse(item["event"], item["data"])
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/submit-code", response_model=FinalVerdictResponse)
+async def submit_code(request: SubmissionRequest):
+    """Queue a job and wait for it: the synchronous API of earlier versions."""
+    job = await asyncio.to_thread(store.enqueue, request.target_files, request.prompt)
+    if pool is not None:
+        pool.notify()
+    async for item in _job_events(job["job_id"]):
+        if item is None:
+            continue
+        if item["event"] == "done":
+            return item["data"]["result"]
+        if item["event"] == "failed":
+            raise HTTPException(status_code=500, detail=item["data"]["error"])
+
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok", "workers": pool.size if pool else 0, "running": len(pool.running) if pool else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ELS JUDGE over HTTP with a persistent job queue.")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("-w", "--workers", type=int, default=settings.server_workers, help="Jobs processed at the same time")
+    args = parser.parse_args()
+    settings.server_workers = args.workers
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Diff viewer for the TUI.
+
+Diffs are indexed by file and hunk (engine.diff_analyzer.index_diff) without
+rendering anything. The tree lists models and files; a file's hunks are
+added when it is expanded, and only the highlighted hunk is sliced out of
+the diff and rendered. Side-by-side mode shows, for the same file region,
+what every model changed there.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from rich.text import Text
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Horizontal, VerticalScroll
+from textual.widgets import Static, Tree
+
+from engine.diff_analyzer import FileSpan, HunkSpan, Segment, index_diff, pair_changed_lines, word_diff
+
+# Lines rendered per hunk before asking for more
+RENDER_LINE_LIMIT = 400
+
+# Longer lines are not word-diffed (e.g. minified code)
+WORD_DIFF_MAX_CHARS = 2000
+
+# Share of a line's text that must be unchanged for its changed words to be highlighted
+WORD_DIFF_MIN_KEPT = 0.3
+
+_LINE_STYLES = {"+": "green", "-": "red", "@": "bold magenta", "\\": "dim"}
+_CHANGED_WORD_STYLE = "bold reverse"
+
+
+def render_hunk(hunk: HunkSpan, diff_text: str, limit: int = RENDER_LINE_LIMIT) -> Text:
+    """Colourize one hunk, cut off after `limit` lines. Changed words of edited lines are highlighted."""
+    text = Text()
+    text.append(hunk.header + "\n", style=_LINE_STYLES["@"])
+    lines = hunk.body(diff_text).split("\n")
+    shown = lines[:limit]
+    # line index -> its word diff segments, for removed/added line pairs
+    segments: Dict[int, List[Segment]] = {}
+    for old, new in pair_changed_lines([line[:1] for line in shown]).items():
+        if max(len(shown[old]), len(shown[new])) > WORD_DIFF_MAX_CHARS:
+            continue
+        old_segments, new_segments = word_diff(shown[old][1:], shown[new][1:])
+        if _worth_highlighting(old_segments) and _worth_highlighting(new_segments):
+            segments[old], segments[new] = old_segments, new_segments
+
+    for index, line in enumerate(shown):
+        style = _LINE_STYLES.get(line[:1], "")
+        if index not in segments:
+            text.append(line + "\n", style=style)
+            continue
+        text.append(line[:1], style=style)
+        for changed, piece in segments[index]:
+            text.append(piece, style=f"{style} {_CHANGED_WORD_STYLE}" if changed else style)
+        text.append("\n")
+    if len(lines) > limit:
+        text.append(f"... {len(lines) - limit} more line(s), press m to show more\n", style="italic dim")
+    return text
+
+
+def _worth_highlighting(segments: List[Segment]) -> bool:
+    """Only lines that kept enough of their text; a rewritten line is just shown as removed/added."""
+    kept = sum(len(piece.strip()) for changed, piece in segments if not changed)
+    total = sum(len(piece.strip()) for _, piece in segments)
+    return 0 < kept and kept >= total * WORD_DIFF_MIN_KEPT
+
+
+def _overlaps(a: HunkSpan, b: HunkSpan) -> bool:
+    """Whether two hunks touch the same lines of the original file."""
+    return a.old_start <= b.old_start + b.old_count and b.old_start <= a.old_start + a.old_count
+
+
+class DiffViewer(Horizontal):
+    """File/hunk tree on the left, the highlighted hunk (or all models' versions of it) on the right."""
+
+    BINDINGS = [
+        Binding("s", "toggle_side_by_side", "Side by side"),
+        Binding("n", "next_hunk", "Next hunk"),
+        Binding("p", "previous_hunk", "Previous hunk"),
+        Binding("m", "show_more", "More lines"),
+    ]
+
+    DEFAULT_CSS = """
+    DiffViewer {
+        height: 100%;
+    }
+    DiffViewer #diff_tree {
+        width: 35%;
+        border-right: solid #d6336c;
+    }
+    DiffViewer #diff_content {
+        width: 65%;
+        padding: 0 1;
+    }
+    DiffViewer #diff_columns {
+        height: auto;
+    }
+    DiffViewer .diff_column {
+        width: 1fr;
+        height: auto;
+        padding: 0 1;
+        border-left: solid #f06595;
+    }
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # model -> (diff text, file index)
+        self._diffs: Dict[str, Tuple[str, List[FileSpan]]] = {}
+        self._selected: Optional[Tuple[str, int, int]] = None
+        self._side_by_side = False
+        self._limit = RENDER_LINE_LIMIT
+
+    def compose(self) -> ComposeResult:
+        tree: Tree = Tree("Diffs", id="diff_tree")
+        tree.show_root = False
+        yield tree
+        with VerticalScroll(id="diff_content"):
+            yield Static("Select a hunk to view it.", id="diff_single")
+            yield Horizontal(id="diff_columns")
+
+    def load(self, model_results: List[Dict[str, Any]]) -> None:
+        """Index every model's diff and list models and files. Hunks are added on expand."""
+        self._diffs = {}
+        self._selected = None
+        self.query_one("#diff_tree", Tree).clear()
+        for result in model_results:
+            self.add(result)
+        if not self._diffs:
+            self._show_message("No diffs.")
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Index and list one more model's diff, e.g. as soon as that model finishes."""
+        tree = self.query_one("#diff_tree", Tree)
+        diff_text = result.get("diff_text") or ""
+        files = index_diff(diff_text)
+        model = result.get("model_name", "Unknown")
+        self._diffs[model] = (diff_text, files)
+
+        n_hunks = sum(len(f.hunks) for f in files)
+        model_node = tree.root.add(f"{model} ({len(files)} files, {n_hunks} hunks)", data=("model", model), expand=True)
+        for file_index, file_span in enumerate(files):
+            model_node.add(f"{file_span.path} [{len(file_span.hunks)}]", data=("file", model, file_index), allow_expand=bool(file_span.hunks))
+        if self._selected is None:
+            self._show_message("Select a hunk to view it.")
+        elif self._side_by_side:
+            # The new model may have changed the region being compared
+            self._render_selection()
+
+    # --- Tree events ---
+
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+        node = event.node
+        if not node.data or node.data[0] != "file" or node.children:
+            return
+        _, model, file_index = node.data
+        diff_text, files = self._diffs[model]
+        for hunk_index, hunk in enumerate(files[file_index].hunks):
+            added, removed = hunk.counts(diff_text)
+            node.add_leaf(f"{hunk.header} +{added} -{removed}", data=("hunk", model, file_index, hunk_index))
+
+    def on_tree_node_highlighted(self, event: Tree.NodeHighlighted) -> None:
+        data = event.node.data
+        if not data:
+            return
+        if data[0] == "hunk":
+            self._select(data[1], data[2], data[3])
+        elif data[0] == "file":
+            _, model, file_index = data
+            if self._diffs[model][1][file_index].hunks:
+                self._select(model, file_index, 0)
+
+    # --- Actions ---
+
+    def action_toggle_side_by_side(self) -> None:
+        self._side_by_side = not self._side_by_side
+        self._render_selection()
+
+    def action_next_hunk(self) -> None:
+        self._step(1)
+
+    def action_previous_hunk(self) -> None:
+        self._step(-1)
+
+    def action_show_more(self) -> None:
+        self._limit += RENDER_LINE_LIMIT
+        self._render_selection()
+
+    # --- Rendering ---
+
+    def _step(self, delta: int) -> None:
+        """Move to the next/previous hunk of the current model, across files."""
+        if self._selected is None:
+            return
+        model, file_index, hunk_index = self._selected
+        files = self._diffs[model][1]
+        positions = [(f, h) for f, file_span in enumerate(files) for h in range(len(file_span.hunks))]
+        current = positions.index((file_index, hunk_index))
+        target = current + delta
+        if 0 <= target < len(positions):
+            self._select(model, *positions[target])
+
+    def _select(self, model: str, file_index: int, hunk_index: int) -> None:
+        if self._selected != (model, file_index, hunk_index):
+            self._limit = RENDER_LINE_LIMIT
+        self._selected = (model, file_index, hunk_index)
+        self._render_selection()
+
+    def _show_message(self, message: str) -> None:
+        single = self.query_one("#diff_single", Static)
+        single.update(message)
+        single.display = True
+        self.query_one("#diff_columns").remove_children()
+
+    def _render_selection(self) -> None:
+        if self._selected is None:
+            return
+        model, file_index, hunk_index = self._selected
+        diff_text, files = self._diffs[model]
+        file_span = files[file_index]
+        hunk = file_span.hunks[hunk_index]
+
+        single = self.query_one("#diff_single", Static)
+        columns = self.query_one("#diff_columns", Horizontal)
+        columns.remove_children()
+
+        if not self._side_by_side:
+            title = Text(f"{model}: {file_span.path} (hunk {hunk_index + 1}/{len(file_span.hunks)})\n", style="bold")
+            single.update(title + render_hunk(hunk, diff_text, self._limit))
+            single.display = True
+            return
+
+        # Side by side: every model's hunks touching the same lines of this file
+        single.update(Text(f"{file_span.path}, original lines {hunk.old_start}-{hunk.old_start + max(hunk.old_count - 1, 0)}", style="bold"))
+        single.display = True
+        panels = []
+        for other_model, (other_text, other_files) in self._diffs.items():
+            column = Text(f"{other_model}\n", style="bold")
+            matching = [
+                h for f in other_files if f.path == file_span.path
+                for h in f.hunks if _overlaps(h, hunk)
+            ]
+            if not matching:
+                column.append("No changes here.\n", style="italic dim")
+            for other_hunk in matching:
+                column.append_text(render_hunk(other_hunk, other_text, self._limit))
+            panels.append(Static(column, classes="diff_column"))
+        columns.mount_all(panels)
@@ -0,0 +1,173 @@
+"""
+Target-files input for the TUI.
+
+Paths, directories (`engine/`) and globs (`core/*.py`) are checked against a
+FileCatalog of the repository's tracked files as they are typed. The path
+being typed completes inline up to where the candidates diverge (right
+arrow accepts). When it doesn't start any path, the best fuzzy matches are
+listed below the input and tab takes the first one. The same line shows how
+many files the input expands to and flags paths the repository doesn't
+track, before anything is submitted.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from rich.markup import escape
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.suggester import Suggester
+from textual.widgets import Input, Static
+
+from core.file_catalog import GLOB_CHARS, FileCatalog, FileSelection
+
+# Seconds between checks whether HEAD or the index changed (a few stat calls)
+REFRESH_INTERVAL = 2.0
+
+# Fuzzy matches listed below the input
+HINT_MATCHES = 3
+
+# Typing pause before the hint is looked up again
+HINT_DELAY = 0.08
+
+
+def split_last_token(value: str) -> Tuple[str, str]:
+    """("engine/a.py ", "cor") for "engine/a.py cor": everything before the path being typed, and that path."""
+    head, sep, token = value.rpartition(" ")
+    return head + sep, token
+
+
+def _is_pattern(token: str) -> bool:
+    return any(c in token for c in GLOB_CHARS)
+
+
+class CatalogSuggester(Suggester):
+    """Inline completion of the path being typed, up to where the catalog's candidates diverge."""
+
+    def __init__(self, catalog: FileCatalog):
+        # The catalog changes under it, so suggestions are not cached
+        super().__init__(use_cache=False, case_sensitive=True)
+        self.catalog = catalog
+
+    async def get_suggestion(self, value: str) -> Optional[str]:
+        head, token = split_last_token(value)
+        if not token or _is_pattern(token):
+            return None
+        completion = self.catalog.complete(token)
+        if completion is None or len(completion) <= len(token):
+            return None
+        return head + completion
+
+
+class FileSetField(Vertical):
+    """The #files_input Input with catalog-backed completion, and a hint line below it."""
+
+    BINDINGS = [
+        Binding("tab", "take_match", "Complete path", show=False),
+    ]
+
+    DEFAULT_CSS = """
+    FileSetField {
+        height: auto;
+    }
+    FileSetField #files_hint {
+        height: auto;
+        color: $text-muted;
+        padding: 0 1;
+    }
+    """
+
+    def __init__(self, catalog: FileCatalog, placeholder: str = "", **kwargs):
+        super().__init__(**kwargs)
+        self.catalog = catalog
+        self.placeholder = placeholder
+        # Fuzzy matches for the path being typed, best first
+        self.matches: List[str] = []
+        self._refreshing = False
+
+    def compose(self) -> ComposeResult:
+        yield Input(id="files_input", placeholder=self.placeholder, suggester=CatalogSuggester(self.catalog))
+        yield Static("", id="files_hint")
+
+    def on_mount(self) -> None:
+        self.query_one("#files_hint").display = False
+        # List the files once the first frame is up; afterwards git is only asked
+        # again when HEAD or the index changed
+        self.call_after_refresh(self._refresh)
+        self.set_interval(REFRESH_INTERVAL, self._refresh)
+
+    def _refresh(self) -> None:
+        if not self._refreshing:
+            self._refreshing = True
+            self.run_worker(self._refresh_catalog(), group="file_catalog")
+
+    async def _refresh_catalog(self) -> None:
+        try:
+            changed = await asyncio.to_thread(self.catalog.refresh)
+        finally:
+            self._refreshing = False
+        if changed:
+            self._schedule_hint()
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id == "files_input":
+            self._schedule_hint()
+
+    def _schedule_hint(self) -> None:
+        value = self.query_one("#files_input", Input).value
+        self.run_worker(self._update_hint(value), group="files_hint", exclusive=True)
+
+    async def _update_hint(self, value: str) -> None:
+        await asyncio.sleep(HINT_DELAY)
+        hint = self.query_one("#files_hint", Static)
+        if not value.strip() or not self.catalog.ready:
+            self.matches = []
+            hint.display = False
+            return
+        selection, matches = await asyncio.to_thread(self._lookup, value)
+        self.matches = matches
+        hint.update(self._describe(selection, matches))
+        hint.display = True
+
+    def _lookup(self, value: str) -> Tuple[FileSelection, List[str]]:
+        """Expand the input and find fuzzy matches for the path being typed. Runs in a worker thread."""
+        selection = self.catalog.expand(value.split())
+        _, token = split_last_token(value)
+        matches = []
+        # Paths the inline completion already covers need no fuzzy matches
+        if token and not _is_pattern(token) and token not in self.catalog and self.catalog.complete(token) is None:
+            matches = self.catalog.fuzzy(token, HINT_MATCHES)
+        return selection, matches
+
+    @staticmethod
+    def _describe(selection: FileSelection, matches: List[str]) -> str:
+        parts = [f"{len(selection.files) - len(selection.unknown)} file(s)"]
+        if selection.unknown:
+            parts.append("[red]not tracked:[/] " + ", ".join(escape(p) for p in selection.unknown))
+        if selection.empty:
+            parts.append("[red]no match:[/] " + ", ".join(escape(p) for p in selection.empty))
+        if matches:
+            parts.append("tab: " + "  ".join(escape(m) for m in matches))
+        return " · ".join(parts)
+
+    def action_take_match(self) -> None:
+        """Replace the path being typed with the best fuzzy match, or move focus on as usual."""
+        files_input = self.query_one("#files_input", Input)
+        if not self.matches or not files_input.has_focus:
+            self.screen.focus_next()
+            return
+        head, _ = split_last_token(files_input.value)
+        files_input.value = head + self.matches[0] + " "
+        files_input.cursor_position = len(files_input.value)
+        self.matches = []
+
+    async def selection(self) -> Optional[FileSelection]:
+        """
+        What the input expands to, against an up-to-date catalog. None when
+        there is no catalog (e.g. not a git repository).
+        """
+        await asyncio.to_thread(self.catalog.refresh)
+        if not self.catalog.ready:
+            return None
+        value = self.query_one("#files_input", Input).value
+        return await asyncio.to_thread(self.catalog.expand, value.split())